@@ -3,10 +3,40 @@ import json
 import logging
 import hmac
 import hashlib
-import requests
+import re
 import time
+import threading
+import functools
+import socket
+import itertools
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote
 import jwt
-from flask import Flask, request, jsonify
+import requests
+from cryptography.hazmat.primitives import serialization
+import click
+from flask import Flask, Response, request, jsonify
+import metrics
+import deadline
+from deadline import DeadlineExceeded
+from profiling import DeliveryProfiler
+from journal import DeliveryJournal, read_journal, replay
+from cache import TTLCache, LRUCache
+from clients import ApiClient
+from ratelimit import TokenBucket, RateBudgetTracker
+from resilience import CircuitBreaker, Bulkhead, Dependency, UpstreamUnavailable
+from notion_schema import NotionSchema
+import tenants
+from tenants import Tenant, TenantDirectory
+from commands import CommandRegistry, parse_commands
+from webhook_body import SignedBody, BodyTooLarge
+from notion_blocks import markdown_to_blocks, iter_lines, batched, block_hash, BlockDiff
+from storage import (
+    JobQueue, QueueWorkerPool, backoff_delay, IdempotencyStore, IssuePageIndex, BackfillCheckpoints, NotionSyncState, PageSnapshots,
+    TenantStore
+)
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -23,84 +53,646 @@ app = Flask(__name__)
 GITHUB_SECRET = os.environ.get('GITHUB_SECRET')
 GITHUB_APP_ID = os.environ.get('GITHUB_APP_ID')
 GITHUB_PRIVATE_KEY = os.environ.get('GITHUB_PRIVATE_KEY', '').replace('\\n', '\n')
+# Notion workspace of installations without their own tenant settings (see `flask tenants`)
 NOTION_TOKEN = os.environ.get('NOTION_TOKEN')
 NOTION_DATABASE_ID = os.environ.get('NOTION_DATABASE_ID')
 
+# Upstream APIs and the shared keep-alive connection pools used to reach them
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+NOTION_API_URL = os.environ.get('NOTION_API_URL', 'https://api.notion.com/v1')
+NOTION_VERSION = os.environ.get('NOTION_VERSION', '2022-06-28')
+GITHUB_POOL_SIZE = int(os.environ.get('GITHUB_POOL_SIZE', 10))
+NOTION_POOL_SIZE = int(os.environ.get('NOTION_POOL_SIZE', 10))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+# Notion allows about 3 requests per second per integration; calls beyond that are queued
+NOTION_RATE_LIMIT = float(os.environ.get('NOTION_RATE_LIMIT', 3))
+NOTION_BURST = float(os.environ.get('NOTION_BURST', 3))
+NOTION_MAX_RETRIES = int(os.environ.get('NOTION_MAX_RETRIES', 3))
+# Non-urgent GitHub calls slow down once an installation has fewer requests than this left
+GITHUB_RATE_LOW_WATERMARK = int(os.environ.get('GITHUB_RATE_LOW_WATERMARK', 100))
+# Longest a GitHub call waits for its rate limit before failing instead
+GITHUB_RATE_MAX_DELAY = float(os.environ.get('GITHUB_RATE_MAX_DELAY', 30))
+GITHUB_MAX_RETRIES = int(os.environ.get('GITHUB_MAX_RETRIES', 2))
+# A delivery gets this many seconds (GitHub waits about 10) before the rest of its work is queued; 0 for no limit
+DELIVERY_DEADLINE = float(os.environ.get('DELIVERY_DEADLINE', 8))
+# Seconds that must be left to start writing the Notion ticket and to start the confirmation comment
+DEADLINE_NOTION_MIN = float(os.environ.get('DEADLINE_NOTION_MIN', 2))
+DEADLINE_COMMENT_MIN = float(os.environ.get('DEADLINE_COMMENT_MIN', 1))
+# Calls in flight per upstream (0 for no cap) and how long a call waits for a slot
+GITHUB_TOKEN_MAX_CONCURRENT = int(os.environ.get('GITHUB_TOKEN_MAX_CONCURRENT', 2))
+GITHUB_MAX_CONCURRENT = int(os.environ.get('GITHUB_MAX_CONCURRENT', 3))
+NOTION_MAX_CONCURRENT = int(os.environ.get('NOTION_MAX_CONCURRENT', 3))
+BULKHEAD_MAX_WAIT = float(os.environ.get('BULKHEAD_MAX_WAIT', 1))
+# A breaker opens when this share of the calls in its window failed, then probes after BREAKER_OPEN_SECONDS
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+BREAKER_MINIMUM_CALLS = int(os.environ.get('BREAKER_MINIMUM_CALLS', 10))
+BREAKER_WINDOW = float(os.environ.get('BREAKER_WINDOW', 60))
+BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 30))
+
+# Installation tokens are refreshed in the background once they are this close to expiry
+GITHUB_TOKEN_REFRESH_MARGIN = int(os.environ.get('GITHUB_TOKEN_REFRESH_MARGIN', 300))
+# The signed app JWT is reused until it is this close to its 10 minute expiry
+GITHUB_JWT_REUSE_MARGIN = int(os.environ.get('GITHUB_JWT_REUSE_MARGIN', 60))
+# Acknowledge webhooks with 202 and do the Notion/GitHub work on background workers
+WEBHOOK_ASYNC = os.environ.get('WEBHOOK_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+QUEUE_WORKERS = int(os.environ.get('QUEUE_WORKERS', 4))
+QUEUE_MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', 5))
+QUEUE_RETRY_DELAY = float(os.environ.get('QUEUE_RETRY_DELAY', 5))
+# Local state (job queue and other stores) lives in this SQLite database
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(DATA_DIR, 'gittion.db'))
+# Redelivered webhooks and repeated `!send` comments are answered from memory
+DELIVERY_DEDUPE_TTL = int(os.environ.get('DELIVERY_DEDUPE_TTL', 24 * 60 * 60))
+ISSUE_DEDUPE_TTL = int(os.environ.get('ISSUE_DEDUPE_TTL', 10 * 60))
+# Backfills sync this many issues at once; a checkpoint untouched this long is considered abandoned
+BACKFILL_CONCURRENCY = int(os.environ.get('BACKFILL_CONCURRENCY', 4))
+BACKFILL_STALE_AFTER = int(os.environ.get('BACKFILL_STALE_AFTER', 600))
+# Page payloads are checked against a cached copy of the database schema before writing
+NOTION_VALIDATE_SCHEMA = os.environ.get('NOTION_VALIDATE_SCHEMA', 'true').lower() in ('1', 'true', 'yes')
+NOTION_SCHEMA_TTL = int(os.environ.get('NOTION_SCHEMA_TTL', 300))
+# GitHub caps webhook payloads at 25 MB
+WEBHOOK_MAX_BODY = int(os.environ.get('WEBHOOK_MAX_BODY', 25 * 1024 * 1024))
+WEBHOOK_CHUNK_SIZE = int(os.environ.get('WEBHOOK_CHUNK_SIZE', 64 * 1024))
+# Bodies larger than this are spooled to a temporary file while they are read
+WEBHOOK_SPOOL_SIZE = int(os.environ.get('WEBHOOK_SPOOL_SIZE', 1024 * 1024))
+
+# multi_select property that mirrors the issue's labels; empty to leave labels out
+NOTION_LABELS_PROPERTY = os.environ.get('NOTION_LABELS_PROPERTY', '')
+
+# Status given to new tickets, and the one `!close` sets
+NOTION_DEFAULT_STATUS = os.environ.get('NOTION_DEFAULT_STATUS', 'Icebox')
+NOTION_DONE_STATUS = os.environ.get('NOTION_DONE_STATUS', 'Done')
+
+# Seconds between runs of the Notion to GitHub status sync; 0 turns it off
+NOTION_SYNC_INTERVAL = float(os.environ.get('NOTION_SYNC_INTERVAL', 0))
+# Label added to the issue for its Notion status; empty to add no labels
+NOTION_STATUS_LABEL_PREFIX = os.environ.get('NOTION_STATUS_LABEL_PREFIX', 'notion: ')
+# Statuses that close the GitHub issue; moving out of them reopens it
+NOTION_CLOSE_STATUSES = [
+    name.strip() for name in os.environ.get('NOTION_CLOSE_STATUSES', NOTION_DONE_STATUS).split(',') if name.strip()
+]
+NOTION_STATUS_COMMENTS = os.environ.get('NOTION_STATUS_COMMENTS', 'true').lower() in ('1', 'true', 'yes')
+
+# Profile every Nth delivery, and/or keep the profile of any delivery slower than the threshold
+PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SLOW_THRESHOLD = float(os.environ.get('PROFILE_SLOW_THRESHOLD', 0))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+
+# Verified deliveries are recorded here for replaying later; empty turns the journal off
+WEBHOOK_JOURNAL_DIR = os.environ.get('WEBHOOK_JOURNAL_DIR', '')
+JOURNAL_SEGMENT_SIZE = int(os.environ.get('JOURNAL_SEGMENT_SIZE', 64 * 1024 * 1024))
+JOURNAL_MAX_SEGMENTS = int(os.environ.get('JOURNAL_MAX_SEGMENTS', 32))
+
+# Tenants kept in memory per process; changes are picked up without a restart
+TENANT_CACHE_SIZE = int(os.environ.get('TENANT_CACHE_SIZE', 1024))
+
+# Admin endpoints are disabled unless a bearer token is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+def new_dependency(name, max_concurrent):
+    """A circuit breaker and bulkhead for one upstream, with the configured thresholds"""
+    breaker = CircuitBreaker(
+        failure_rate=BREAKER_FAILURE_RATE,
+        minimum_calls=BREAKER_MINIMUM_CALLS,
+        window=BREAKER_WINDOW,
+        open_for=BREAKER_OPEN_SECONDS
+    )
+    return Dependency(name, breaker, Bulkhead(max_concurrent, BULKHEAD_MAX_WAIT))
+
+# The token endpoint gets its own breaker: without tokens no other GitHub call can be made
+upstreams = {
+    'github_token': new_dependency('github_token', GITHUB_TOKEN_MAX_CONCURRENT),
+    'github': new_dependency('github', GITHUB_MAX_CONCURRENT),
+    'notion': new_dependency('notion', NOTION_MAX_CONCURRENT)
+}
+
+def github_dependency(method, url):
+    if url.endswith('/access_tokens'):
+        return upstreams['github_token']
+    return upstreams['github']
+
+github_rate_budget = RateBudgetTracker(
+    low_watermark=GITHUB_RATE_LOW_WATERMARK,
+    max_delay=GITHUB_RATE_MAX_DELAY
+)
+github_client = ApiClient(
+    GITHUB_API_URL,
+    headers={
+        "Accept": "application/vnd.github.v3+json",
+        "User-Agent": "git-tion"
+    },
+    pool_size=GITHUB_POOL_SIZE,
+    timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    limiter=github_rate_budget,
+    max_retries=GITHUB_MAX_RETRIES,
+    observer=metrics.UpstreamObserver('github'),
+    guard=github_dependency
+)
+notion_rate_limiter = TokenBucket(NOTION_RATE_LIMIT, NOTION_BURST)
+notion_client = ApiClient(
+    NOTION_API_URL,
+    headers={
+        "Content-Type": "application/json",
+        "Notion-Version": NOTION_VERSION
+    },
+    pool_size=NOTION_POOL_SIZE,
+    timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    limiter=notion_rate_limiter,
+    max_retries=NOTION_MAX_RETRIES,
+    observer=metrics.UpstreamObserver('notion'),
+    guard=lambda method, url: upstreams['notion']
+)
+
+# Installation ids of repositories, for work that doesn't start from a webhook
+installation_ids = TTLCache(max_entries=1000, ttl=3600)
+
+# Used for installations without tenant settings and for work outside any tenant scope
+default_tenant = Tenant(None, NOTION_TOKEN, NOTION_DATABASE_ID, {'labels': NOTION_LABELS_PROPERTY})
+
+def current_tenant():
+    """The tenant whose work runs on this thread, or the default tenant"""
+    return tenants.current() or default_tenant
+
+# Commands addressed to the bot, e.g. `@git-tion !send`
+COMMAND_PREFIX = '@git-tion'
+command_registry = CommandRegistry()
+
+
+
+class InstallationTokenCache:
+    """Per-installation cache of GitHub App installation tokens.
+
+    Tokens are served until they expire, refreshed in a background thread once
+    they come within `refresh_margin` seconds of `expires_at`, and concurrent
+    misses for the same installation share a single fetch.
+    """
+
+    def __init__(self, fetch, refresh_margin=300):
+        self._fetch = fetch
+        self._refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def get(self, installation_id):
+        """Return a valid token for the installation, fetching it if needed"""
+        now = time.time()
+        with self._lock:
+            entry = self._tokens.get(installation_id)
+            if entry and entry[1] > now:
+                self.hits += 1
+                if entry[1] - now < self._refresh_margin and installation_id not in self._inflight:
+                    self._inflight[installation_id] = _PendingFetch()
+                    threading.Thread(
+                        target=self._refresh, args=(installation_id,), daemon=True
+                    ).start()
+                return entry[0]
+
+            self.misses += 1
+            pending = self._inflight.get(installation_id)
+            leader = pending is None
+            if leader:
+                pending = _PendingFetch()
+                self._inflight[installation_id] = pending
+
+        if not leader:
+            return pending.wait()
+        return self._run_fetch(installation_id, pending)
+
+    def invalidate(self, installation_id=None):
+        """Drop one cached token, or all of them"""
+        with self._lock:
+            if installation_id is None:
+                self._tokens.clear()
+            else:
+                self._tokens.pop(installation_id, None)
+
+    def stats(self):
+        """Return hit/miss counters for the admin endpoint"""
+        with self._lock:
+            return {
+                "cached_installations": len(self._tokens),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "errors": self.errors
+            }
+
+    def _refresh(self, installation_id):
+        with self._lock:
+            self.refreshes += 1
+            pending = self._inflight[installation_id]
+        try:
+            self._run_fetch(installation_id, pending)
+        except Exception as e:
+            # The current token is still valid, so the next call will try again
+            logger.warning(f"Background token refresh failed for installation {installation_id}: {str(e)}")
+
+    def _run_fetch(self, installation_id, pending):
+        try:
+            token, expires_at = self._fetch(installation_id)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self._inflight.pop(installation_id, None)
+            pending.fail(e)
+            raise
+
+        with self._lock:
+            self._tokens[installation_id] = (token, expires_at)
+            self._inflight.pop(installation_id, None)
+        pending.resolve(token)
+        return token
+
+
+class _PendingFetch:
+    """A token fetch that other threads can wait on"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._token = None
+        self._error = None
+
+    def resolve(self, token):
+        self._token = token
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._token
+
+
+def require_admin(view):
+    """Protect an admin endpoint with the ADMIN_TOKEN bearer token"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Not found"}), 404
+        auth_header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(auth_header, f"Bearer {ADMIN_TOKEN}"):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+# Page ids at the end of a Notion URL (after the title slug) or on their own
+NOTION_PAGE_ID_PATTERN = re.compile(
+    r'(?:^|[/-])([0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12})(?:[?#]|$)'
+)
+
+# Matches the issue URLs stored in the "GitHub Issue" property
+ISSUE_URL_PATTERN = re.compile(r'^https://github\.com/([^/]+/[^/]+)/issues/(\d+)')
+
+# `issues` actions that are carried over to the Notion ticket of a linked issue
+ISSUE_SYNC_ACTIONS = ('edited', 'labeled', 'unlabeled', 'closed', 'reopened')
+# Events with a handler, the actions it acts on and the answer for other
+# actions; every other event is answered without parsing the body
+HANDLED_EVENTS = {
+    'issue_comment': ((b'created',), "not a new comment"),
+    'issues': (tuple(action.encode() for action in ISSUE_SYNC_ACTIONS), "ignored")
+}
+COMMAND_MENTION = COMMAND_PREFIX.encode()
+# GitHub serializes "action" as the first key of the payload
+PAYLOAD_ACTION = re.compile(rb'\s*\{\s*"action"\s*:\s*"([^"\\]*)"')
+
+profiler = DeliveryProfiler(
+    PROFILE_DIR,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    slow_threshold=PROFILE_SLOW_THRESHOLD,
+    interval=PROFILE_INTERVAL,
+    keep=PROFILE_KEEP,
+    # Shared by all workers, so the admin endpoint reaches every one of them
+    settings_path=f"{DATABASE_PATH}.profiling"
+)
+
+delivery_journal = DeliveryJournal(
+    WEBHOOK_JOURNAL_DIR,
+    segment_size=JOURNAL_SEGMENT_SIZE,
+    max_segments=JOURNAL_MAX_SEGMENTS
+) if WEBHOOK_JOURNAL_DIR else None
+
+PAYLOAD_TOO_LARGE = ({"error": "Payload too large"}, 413)
+# Label given to a delivery in the request counter, by response status
+DELIVERY_OUTCOMES = {
+    200: 'handled',
+    202: 'queued',
+    400: 'invalid',
+    401: 'unauthorized',
+    413: 'too_large'
+}
+
+_filter_lock = threading.Lock()
+filtered_events: Counter[str] = Counter()
+
 # Webhook route to receive GitHub events
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    # Verify webhook signature
+    event = request.headers.get('X-GitHub-Event')
+    with metrics.in_flight.labels(kind='webhook').track_inprogress(), \
+            profiler.trace(request.headers.get('X-GitHub-Delivery'), event), \
+            deadline.scope(DELIVERY_DEADLINE):
+        response, status = receive_webhook(event)
+    count_delivery(event, status)
+    return response, status
+
+def receive_webhook(event):
     signature = request.headers.get('X-Hub-Signature-256')
-    if not verify_signature(request.data, signature):
-        logger.warning("Invalid webhook signature")
-        return jsonify({"error": "Invalid signature"}), 401
-    
-    # Parse the payload
-    payload = request.json
+    rejected = reject_before_reading(signature, request.content_length)
+    if rejected is not None:
+        return jsonify(rejected[0]), rejected[1]
     
-    # Check if this is an issue comment event
-    if request.headers.get('X-GitHub-Event') == 'issue_comment':
-        return handle_issue_comment(payload)
+    with new_webhook_body() as body:
+        try:
+            body.read_from(request.stream, WEBHOOK_CHUNK_SIZE)
+        except BodyTooLarge:
+            return jsonify(PAYLOAD_TOO_LARGE[0]), PAYLOAD_TOO_LARGE[1]
+        
+        # Verify the signature and skip deliveries no handler would act on
+        screened = screen_delivery(body, signature, event, request.headers)
+        if screened is not None:
+            return jsonify(screened[0]), screened[1]
+        
+        # Parse the payload only once it is known to come from GitHub
+        try:
+            payload = parse_webhook_body(body)
+        except ValueError:
+            return jsonify({"error": "Invalid JSON payload"}), 400
     
-    return jsonify({"status": "ignored"}), 200
+    result = dispatch_event(event, payload, delivery_id=request.headers.get('X-GitHub-Delivery'))
+    return result if isinstance(result, tuple) else (result, 200)
+
+def parse_webhook_body(body):
+    with metrics.stage('parse_json'):
+        return body.json()
+
+def count_delivery(event, status):
+    """Count a delivery by event and by the outcome its response status stands for"""
+    if event not in HANDLED_EVENTS:
+        event = 'other'
+    outcome = DELIVERY_OUTCOMES.get(status, 'error' if status >= 500 else 'rejected')
+    metrics.webhook_requests.labels(event=event, outcome=outcome).inc()
+
+def reject_before_reading(signature, content_length):
+    """Return an (error, status) for deliveries that can be refused without reading the body"""
+    if not signature:
+        logger.warning("Webhook without a signature")
+        return {"error": "Invalid signature"}, 401
+    if content_length is not None and content_length > WEBHOOK_MAX_BODY:
+        logger.warning(f"Webhook body of {content_length} bytes is over WEBHOOK_MAX_BODY")
+        return PAYLOAD_TOO_LARGE
+    return None
+
+def new_webhook_body():
+    """Start a body that is signed and scanned for the command as it is read"""
+    return SignedBody(GITHUB_SECRET, WEBHOOK_MAX_BODY, needle=COMMAND_MENTION,
+                      spool_size=WEBHOOK_SPOOL_SIZE)
+
+def screen_delivery(body, signature, event, headers=None):
+    """Verify a read body and apply the pre-parse filter.
+
+    Returns the (response, status) to answer with, or None if the payload
+    should be parsed and dispatched. Verified deliveries are recorded in
+    the journal, if it is on, before any are filtered out.
+    """
+    rejected = reject_unsigned(body, signature)
+    if rejected is not None:
+        return rejected
+    if delivery_journal is not None and headers is not None:
+        journal_delivery(headers, body)
+    return skip_irrelevant(body, event)
+
+def reject_unsigned(body, signature):
+    """The (response, status) for a body whose signature doesn't match, or None"""
+    if not verify_signature(body, signature):
+        logger.warning("Invalid webhook signature")
+        return {"error": "Invalid signature"}, 401
+    return None
+
+def skip_irrelevant(body, event):
+    """The (response, status) for a delivery no handler would act on, or None"""
+    skipped = prefilter_delivery(event, body.head, body.found)
+    if skipped is not None:
+        return skipped, 200
+    return None
+
+def journal_delivery(headers, body):
+    """Append a delivery to the journal; a failure to record it doesn't fail the webhook"""
+    try:
+        delivery_journal.append(headers, body.chunks())
+    except OSError as e:
+        logger.warning(f"Could not journal delivery: {e}")
+
+def dispatch_event(event, payload, delivery_id=None, received_at=None):
+    """Route a verified, parsed delivery to the handler for its event.
+
+    `received_at` is the `time.monotonic()` reading when the request
+    arrived, which the delivery's deadline counts from.
+    """
+    installation_id = payload.get('installation', {}).get('id')
+    with profiler.trace(delivery_id, event), deadline.scope(DELIVERY_DEADLINE, received_at), \
+            tenants.scope(tenant_for(installation_id)):
+        # Check if this is an issue comment event
+        if event == 'issue_comment':
+            return handle_issue_comment(payload, delivery_id=delivery_id)
+        if event == 'issues':
+            return handle_issues_event(payload, delivery_id=delivery_id)
+        
+        return jsonify({"status": "ignored"}), 200
+
+def prefilter_delivery(event, head, mentioned):
+    """Decide from the event header and the raw body whether a delivery can be skipped.
 
+    `head` is the start of the body and `mentioned` whether the command
+    mention occurs in it anywhere. Returns the response for a skipped
+    delivery, or None if the payload has to be parsed and handled.
+    Anything that can't be ruled out cheaply is left to the handler, which
+    applies the same checks to the parsed payload.
+    """
+    if event not in HANDLED_EVENTS:
+        return _filtered('event', {"status": "ignored"})
+    actions, skipped_status = HANDLED_EVENTS[event]
+    action = PAYLOAD_ACTION.match(head)
+    if action is not None and action.group(1) not in actions:
+        return _filtered('action', {"status": skipped_status})
+    if event == 'issue_comment' and not mentioned:
+        return _filtered('no_mention', {"status": "no command found"})
+    return None
+
+def _filtered(reason, response):
+    with _filter_lock:
+        filtered_events[reason] += 1
+    metrics.webhook_filtered.labels(reason=reason).inc()
+    return response
+
+@metrics.timed('verify_signature')
 def verify_signature(payload_body, signature_header):
-    """Verify that the webhook is from GitHub by checking the signature"""
+    """Verify that the webhook is from GitHub by checking the signature.
+
+    `payload_body` is either the raw bytes or a SignedBody that computed
+    its HMAC while it was read.
+    """
     if not signature_header:
         return False
     
-    expected_signature = 'sha256=' + hmac.new(
-        key=GITHUB_SECRET.encode(),
-        msg=payload_body,
-        digestmod=hashlib.sha256
-    ).hexdigest()
+    if isinstance(payload_body, SignedBody):
+        expected_signature = payload_body.signature()
+    else:
+        expected_signature = 'sha256=' + hmac.new(
+            key=GITHUB_SECRET.encode(),
+            msg=payload_body,
+            digestmod=hashlib.sha256
+        ).hexdigest()
     
     return hmac.compare_digest(expected_signature, signature_header)
 
+@metrics.timed('get_github_app_token')
 def get_github_app_token(installation_id):
     """Get an access token for a GitHub App installation"""
+    return token_cache.get(installation_id)
+
+def check_token_rejected(response, installation_id):
+    """Drop the cached token when GitHub rejects it (revoked, or the installation suspended)"""
+    if response.status_code == 401:
+        logger.warning(f"GitHub rejected the token for installation {installation_id}, fetching a new one next time")
+        token_cache.invalidate(installation_id)
+
+@functools.lru_cache(maxsize=4)
+def load_private_key(pem):
+    """Parse the GitHub App private key once instead of on every signature"""
+    try:
+        return serialization.load_pem_private_key(pem.encode(), password=None)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Could not parse GITHUB_PRIVATE_KEY: {str(e)}")
+        return None
+
+_app_jwt_lock = threading.Lock()
+_app_jwt: dict = {}
+
+def get_app_jwt():
+    """Get a signed JWT for the GitHub App, reusing it until shortly before it expires"""
+    cache_key = (GITHUB_APP_ID, GITHUB_PRIVATE_KEY)
     now = int(time.time())
-    payload = {
-        'iat': now,
-        'exp': now + (10 * 60),  # 10 minutes expiration
-        'iss': GITHUB_APP_ID
-    }
-    
+    with _app_jwt_lock:
+        if _app_jwt.get('key') == cache_key and _app_jwt['exp'] - GITHUB_JWT_REUSE_MARGIN > now:
+            return _app_jwt['token']
+        
+        payload = {
+            'iat': now,
+            'exp': now + (10 * 60),  # 10 minutes expiration
+            'iss': GITHUB_APP_ID
+        }
+        
+        # Fall back to the raw PEM so jwt reports the real problem with the key
+        private_key = load_private_key(GITHUB_PRIVATE_KEY) or GITHUB_PRIVATE_KEY
+        jwt_token = jwt.encode(payload, private_key, algorithm='RS256')
+        
+        _app_jwt.update(key=cache_key, token=jwt_token, exp=payload['exp'])
+        return jwt_token
+
+def invalidate_app_jwt():
+    """Forget the cached app JWT so the next call signs a new one"""
+    with _app_jwt_lock:
+        _app_jwt.clear()
+
+def fetch_installation_token(installation_id):
+    """Mint a new installation token, returning the token and its expiry timestamp"""
     # Create JWT for GitHub App
-    jwt_token = jwt.encode(payload, GITHUB_PRIVATE_KEY, algorithm='RS256')
+    jwt_token = get_app_jwt()
     
     # Get installation token
-    url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
+    url = f"{GITHUB_API_URL}/app/installations/{installation_id}/access_tokens"
     headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/vnd.github.v3+json"
+        "Authorization": f"Bearer {jwt_token}"
     }
     
-    response = requests.post(url, headers=headers)
+    # App-level calls are authenticated with the JWT and have their own budget
+    response = github_client.post(url, headers=headers, rate_key='app')
+    
+    if response.status_code == 401:
+        # GitHub rejected the JWT, so don't keep reusing it
+        invalidate_app_jwt()
     
     if response.status_code != 201:
         logger.error(f"Failed to get installation token: {response.text}")
         raise Exception(f"Failed to get installation token: {response.status_code}")
     
-    return response.json()['token']
+    data = response.json()
+    return data['token'], parse_github_timestamp(data.get('expires_at'))
+
+def parse_github_timestamp(value):
+    """Convert a GitHub ISO 8601 timestamp to epoch seconds (0 if missing)"""
+    if not value:
+        return 0
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+# Parse the private key when the worker boots rather than on the first webhook
+if GITHUB_PRIVATE_KEY:
+    load_private_key(GITHUB_PRIVATE_KEY)
+
+notion_schema = NotionSchema(
+    lambda: fetch_database_properties(),
+    ttl=NOTION_SCHEMA_TTL
+)
+# Schemas of the tenants' databases, by database id
+tenant_schemas = LRUCache(max_entries=TENANT_CACHE_SIZE)
+
+def current_notion_schema():
+    """The cached schema of the current tenant's database"""
+    tenant = current_tenant()
+    if tenant is default_tenant:
+        return notion_schema
+    schema = tenant_schemas.get(tenant.notion_database_id)
+    if schema is None:
+        # Fetched on the thread that validates, which runs in the tenant's scope
+        schema = NotionSchema(lambda: fetch_database_properties(), ttl=NOTION_SCHEMA_TTL)
+        tenant_schemas.set(tenant.notion_database_id, schema)
+    return schema
+
+token_cache = InstallationTokenCache(
+    lambda installation_id: fetch_installation_token(installation_id),
+    refresh_margin=GITHUB_TOKEN_REFRESH_MARGIN
+)
 
 def inspect_database():
     """Inspect the Notion database structure for debugging"""
-    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}"
+    try:
+        properties = current_notion_schema().properties(refresh=True)
+    except Exception as e:
+        logger.error(f"Error inspecting database: {str(e)}")
+        return
+    for name, prop in properties.items():
+        logger.info(f"Property: {name}, Type: {prop.get('type')}")
+
+def fetch_database_properties():
+    """Fetch the property definitions of the Notion database"""
+    url = f"{NOTION_API_URL}/databases/{current_tenant().notion_database_id}"
     headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28"
+        "Authorization": f"Bearer {current_tenant().notion_token}"
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        database = response.json()
-        properties = database.get('properties', {})
-        for name, prop in properties.items():
-            logger.info(f"Property: {name}, Type: {prop.get('type')}")
-    else:
-        logger.error(f"Error inspecting database: {response.status_code}, {response.text}")
+    response = notion_client.get(url, headers=headers)
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch Notion database: {response.text}")
+        raise Exception(f"Failed to fetch Notion database: {response.status_code}")
+    return response.json().get('properties', {})
 
-def handle_issue_comment(payload):
+def validate_ticket_properties(properties):
+    """Check page properties against the cached database schema before writing"""
+    if NOTION_VALIDATE_SCHEMA:
+        current_notion_schema().validate(properties)
+
+def handle_issue_comment(payload, delivery_id=None):
     """Handle issue comment events"""
     # Check if this is a new comment
     if payload.get('action') != 'created':
@@ -109,52 +701,448 @@ def handle_issue_comment(payload):
     # Get the comment body
     comment_body = payload.get('comment', {}).get('body', '')
     
-    # Check if the command is in the comment
-    if '@git-tion !send' not in comment_body:
+    # Find every command in the comment in one pass
+    commands = [
+        command for command in parse_commands(comment_body, COMMAND_PREFIX)
+        if command.name in command_registry
+    ]
+    if not commands:
         return jsonify({"status": "no command found"}), 200
     
+    results = [command_registry.dispatch(command, payload, delivery_id) for command in commands]
+    if len(results) == 1:
+        return jsonify(results[0][0]), results[0][1]
+    return jsonify({
+        "status": "multiple",
+        "results": [dict(result, command=command.name) for command, (result, _) in zip(commands, results)]
+    }), max(status for _, status in results)
+
+def run_once(dedupe_keys, work):
+    """Run a command unless one of its keys was seen recently.
+
+    `work` returns a (result, status) pair. The result is remembered so a
+    duplicate gets the same answer, and forgotten again after a failure
+    (an exception or a 5xx status) so the command can be retried.
+    """
+    dedupe_store = get_dedupe_store()
+    previous = dedupe_store.claim(dedupe_keys)
+    if previous is not None:
+        logger.info(f"Duplicate command {dedupe_keys}")
+        return {"status": "duplicate", "original": previous}, 200
+    
+    try:
+        result, status = work()
+    except Exception as e:
+        dedupe_store.release(dedupe_keys)
+        logger.error(f"Error processing issue: {str(e)}")
+        return {"status": "error", "message": str(e)}, 500
+    
+    if status >= 500:
+        dedupe_store.release(dedupe_keys)
+    else:
+        dedupe_store.finish(dedupe_keys, result)
+    return result, status
+
+def delivery_key(delivery_id, command):
+    """Dedupe key for one command of one delivery"""
+    return f"{delivery_id}:{command.name}" if delivery_id else None
+
+@command_registry.command('send', '`!send [status=<status>]`: create or update the Notion ticket for this issue')
+def send_command(command, payload, delivery_id=None):
     # Get issue details
-    issue = payload.get('issue', {})
-    issue_number = issue.get('number')
-    issue_title = issue.get('title')
-    issue_body = issue.get('body', '')
-    issue_url = issue.get('html_url')
-    repo_full_name = payload.get('repository', {}).get('full_name')
-    installation_id = payload.get('installation', {}).get('id')
+    job = send_job_from_payload(payload)
+    if command.options.get('status'):
+        job['status'] = command.options['status']
     
-    logger.info(f"Processing command for issue #{issue_number} in {repo_full_name}")
+    # Answer redeliveries and repeated commands without touching Notion or GitHub; a
+    # `!send` after the issue was edited has a new content hash and goes through
+    content_hash = ticket_content_hash(job['title'], job['body'], job['issue_url'], job['repo'], job.get('labels'))
+    dedupe_keys = (delivery_key(delivery_id, command), (job['repo'], job['issue_number'], content_hash))
+    return run_once(dedupe_keys, lambda: run_send_job(job))
+
+@command_registry.command('sync', '`!sync`: rewrite the Notion ticket from the issue, even if nothing changed')
+def sync_command(command, payload, delivery_id=None):
+    job = send_job_from_payload(payload)
+    job['force'] = True
+    return run_once((delivery_key(delivery_id, command), None), lambda: run_send_job(job))
+
+def run_send_job(job):
+    """Queue a send job, or run it now when webhooks are handled synchronously"""
+    logger.info(f"Processing command for issue #{job['issue_number']} in {job['repo']}")
+    if WEBHOOK_ASYNC:
+        # Acknowledge now and let the queue workers talk to Notion and GitHub
+        job_id = get_job_queue().enqueue('send', job)
+        return {"status": "queued", "job_id": job_id}, 202
     
     try:
-        # Create a ticket in Notion
-        notion_page_id = create_notion_ticket(
-            title=issue_title,
-            description=issue_body,
-            issue_number=issue_number,
-            issue_url=issue_url,
-            repo=repo_full_name
-        )
-        
-        # Add a comment to the GitHub issue
-        add_github_comment(
-            repo_full_name=repo_full_name,
-            issue_number=issue_number,
-            notion_page_id=notion_page_id,
-            installation_id=installation_id
+        notion_page_id = process_send_job(job)
+    except Exception as e:
+        return hand_off_job('send', job, e)
+    return {"status": "success", "notion_page_id": notion_page_id, "action": job['notion_action']}, 200
+
+def hand_off_job(kind, job, error):
+    """Pass a job that didn't finish during its delivery to the queue workers.
+
+    The job carries the stages it already finished, so the workers pick up
+    at the one that was cut short or failed. Work the deadline cut short is
+    deferred, and so is work turned away by an open breaker or a full
+    bulkhead, until the breaker is due to probe again; anything else failed
+    and is retried after a backoff.
+    """
+    budget = deadline.current()
+    if isinstance(error, DeadlineExceeded) or \
+            (isinstance(error, requests.Timeout) and budget is not None and budget.expired):
+        return defer_job(kind, job, error, budget)
+    if isinstance(error, UpstreamUnavailable):
+        return defer_job(kind, job, error, budget, delay=BREAKER_OPEN_SECONDS)
+    return retry_job_later(kind, job, error)
+
+def defer_job(kind, job, error, budget, delay=0):
+    stage = (budget.interrupted if budget is not None else None) or job.get('stage') or 'start'
+    job_id = get_job_queue().enqueue(kind, job, delay=delay)
+    start_queue_workers()
+    metrics.deferred_jobs.labels(kind=kind, stage=stage).inc()
+    logger.warning(f"Deferred {kind} job {job_id} for {job['repo']}#{job['issue_number']}: {error}")
+    return {"status": "deferred", "job_id": job_id, "stage": stage}, 202
+
+def retry_job_later(kind, job, error):
+    """Persist a job that failed during its delivery, counting that as its first attempt.
+
+    The queue owns the work from here, so the delivery is answered 202 and
+    stays claimed; a redelivery is a duplicate rather than a second job.
+    """
+    job_id = get_job_queue().enqueue(
+        kind, job, delay=backoff_delay(QUEUE_RETRY_DELAY, 1), attempts=1, error=error
+    )
+    start_queue_workers()
+    logger.error(f"Error processing {kind} job for {job['repo']}#{job['issue_number']} "
+                 f"at stage {job.get('stage')}, queued as job {job_id}: {error}")
+    return {"status": "retrying", "message": str(error), "stage": job.get('stage'), "job_id": job_id}, 202
+
+@command_registry.command('send-all', '`!send-all`: send every open issue of the repository to Notion')
+def send_all_command(command, payload, delivery_id=None):
+    """Start a backfill of every open issue in the repository"""
+    repo = payload.get('repository', {}).get('full_name')
+    job = {
+        "repo": repo,
+        "issue_number": payload.get('issue', {}).get('number'),
+        "installation_id": payload.get('installation', {}).get('id')
+    }
+    
+    def start():
+        # A backfill can take far longer than a delivery or a queue lease, so it gets its own thread
+        logger.info(f"Starting backfill of {repo}")
+        threading.Thread(target=process_backfill_job, args=(job,), name=f"backfill-{repo}", daemon=True).start()
+        return {"status": "backfill started", "repo": repo}, 202
+    
+    return run_once((delivery_key(delivery_id, command), None), start)
+
+@command_registry.command('status', '`!status [<status>]`: show the ticket\'s Notion status, or set it')
+def status_command(command, payload, delivery_id=None):
+    if command.text:
+        return set_status_command(command, payload, delivery_id, command.text)
+    
+    def report():
+        issue = issue_from_payload(payload)
+        entry = get_issue_index().get(issue['repo'], issue['issue_number'])
+        if entry is None:
+            return reply_not_linked(issue)
+        notion_status = get_notion_status(entry['page_id'])
+        post_github_comment(issue['repo'], issue['issue_number'], issue['installation_id'],
+                            f"📋 [Notion ticket]({notion_page_url(entry['page_id'])}) status: **{notion_status}**")
+        return {"status": "success", "notion_page_id": entry['page_id'], "notion_status": notion_status}, 200
+    
+    return run_once((delivery_key(delivery_id, command), None), report)
+
+def reply_not_linked(issue):
+    """Tell the issue that a command needs a linked Notion ticket and how to create one"""
+    post_github_comment(issue['repo'], issue['issue_number'], issue['installation_id'],
+                        "No Notion ticket is linked to this issue yet. Comment `@git-tion !send` to create one.")
+    return {"status": "not linked"}, 200
+
+@command_registry.command('close', '`!close`: set the Notion ticket\'s status to NOTION_DONE_STATUS')
+def close_command(command, payload, delivery_id=None):
+    return set_status_command(command, payload, delivery_id, NOTION_DONE_STATUS)
+
+def set_status_command(command, payload, delivery_id, notion_status):
+    """Set the Status of the issue's Notion ticket and confirm it on the issue"""
+    def update():
+        issue = issue_from_payload(payload)
+        entry = get_issue_index().get(issue['repo'], issue['issue_number'])
+        if entry is None:
+            return reply_not_linked(issue)
+        set_notion_status(entry['page_id'], notion_status)
+        # Already on GitHub, so the status sync doesn't need to report it back
+        get_notion_sync_state().record_status(entry['page_id'], notion_status)
+        post_github_comment(issue['repo'], issue['issue_number'], issue['installation_id'],
+                            f"✅ Set [Notion ticket]({notion_page_url(entry['page_id'])}) status to **{notion_status}**")
+        return {"status": "success", "notion_page_id": entry['page_id'], "notion_status": notion_status}, 200
+    
+    return run_once((delivery_key(delivery_id, command), None), update)
+
+@command_registry.command('link', '`!link <page>`: link this issue to an existing Notion page (URL or id)')
+def link_command(command, payload, delivery_id=None):
+    def link():
+        issue = issue_from_payload(payload)
+        page_id = parse_notion_page_id(command.text)
+        if page_id is None:
+            return {"status": "error", "message": "Give a Notion page URL or id to link"}, 400
+        link_notion_page(page_id, issue['issue_url'])
+        get_page_snapshots().discard(page_id)
+        # No content hash yet, so the next `!send` rewrites the page from the issue
+        get_issue_index().upsert(issue['repo'], issue['issue_number'], page_id, None)
+        post_github_comment(issue['repo'], issue['issue_number'], issue['installation_id'],
+                            f"🔗 Linked [Notion ticket]({notion_page_url(page_id)})")
+        return {"status": "success", "notion_page_id": page_id, "action": "linked"}, 200
+    
+    return run_once((delivery_key(delivery_id, command), None), link)
+
+def handle_issues_event(payload, delivery_id=None):
+    """Carry edits, label changes and closing or reopening of a linked issue over to Notion"""
+    action = payload.get('action')
+    if action not in ISSUE_SYNC_ACTIONS:
+        return jsonify({"status": "ignored"}), 200
+    
+    job = send_job_from_payload(payload)
+    job['event_action'] = action
+    if get_issue_index().get(job['repo'], job['issue_number']) is None:
+        return jsonify({"status": "not linked"}), 200
+    
+    def sync():
+        if WEBHOOK_ASYNC:
+            job_id = get_job_queue().enqueue('issue', job)
+            return {"status": "queued", "job_id": job_id}, 202
+        try:
+            return process_issue_job(job), 200
+        except Exception as e:
+            return hand_off_job('issue', job, e)
+    
+    result, status = run_once((f"{delivery_id}:issues" if delivery_id else None, None), sync)
+    return jsonify(result), status
+
+def process_issue_job(job):
+    """Apply an `issues` event to the Notion ticket of the issue"""
+    job['stage'] = 'notion'
+    with deadline.stage('notion', DEADLINE_NOTION_MIN):
+        return apply_issue_job(job)
+
+def apply_issue_job(job):
+    entry = get_issue_index().get(job['repo'], job['issue_number'])
+    if job['event_action'] in ('closed', 'reopened'):
+        notion_status = issue_state_status(entry['page_id'], job['event_action'])
+        if notion_status is None:
+            return {"status": "success", "notion_page_id": entry['page_id'], "action": "unchanged"}
+        set_notion_status(entry['page_id'], notion_status)
+        get_notion_sync_state().record_status(entry['page_id'], notion_status)
+        return {"status": "success", "notion_page_id": entry['page_id'], "action": "updated",
+                "notion_status": notion_status}
+    
+    page_id, action = sync_issue_to_notion(
+        title=job['title'],
+        description=job['body'],
+        issue_number=job['issue_number'],
+        issue_url=job['issue_url'],
+        repo=job['repo'],
+        labels=job.get('labels')
+    )
+    return {"status": "success", "notion_page_id": page_id, "action": action}
+
+def issue_state_status(page_id, event_action):
+    """The Notion status for a closed or reopened issue, or None if the ticket already agrees"""
+    current = get_notion_sync_state().get_status(page_id)
+    if event_action == 'closed':
+        return None if current in NOTION_CLOSE_STATUSES else NOTION_DONE_STATUS
+    if current is None:
+        current = get_notion_status(page_id)
+    return NOTION_DEFAULT_STATUS if current in NOTION_CLOSE_STATUSES else None
+
+def process_backfill_job(job):
+    """Run a backfill requested with `!send-all` and report back on the issue"""
+    try:
+        progress = run_backfill(job['repo'], job['installation_id'])
+        comment_body = (
+            f"✅ Sent {progress['processed']} issues to Notion "
+            f"({progress['failed']} failed, {progress['rate']} issues/sec)"
         )
-        
-        return jsonify({"status": "success", "notion_page_id": notion_page_id}), 200
+    except Exception as e:
+        logger.error(f"Backfill of {job['repo']} failed: {str(e)}")
+        comment_body = f"❌ Backfill stopped: {str(e)}. Comment `@git-tion !send-all` again to resume."
     
+    try:
+        post_github_comment(job['repo'], job['issue_number'], job['installation_id'], comment_body)
     except Exception as e:
-        logger.error(f"Error processing issue: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        logger.error(f"Could not report backfill result: {str(e)}")
+
+def issue_from_payload(payload):
+    """Extract the repository, issue number and installation from an issue_comment payload"""
+    return {
+        "issue_number": payload.get('issue', {}).get('number'),
+        "issue_url": payload.get('issue', {}).get('html_url'),
+        "repo": payload.get('repository', {}).get('full_name'),
+        "installation_id": payload.get('installation', {}).get('id')
+    }
+
+def send_job_from_payload(payload):
+    """Extract the issue details a `!send` needs from an issue_comment payload"""
+    issue = payload.get('issue', {})
+    return {
+        "issue_number": issue.get('number'),
+        "title": issue.get('title'),
+        "body": issue.get('body', ''),
+        "issue_url": issue.get('html_url'),
+        "repo": payload.get('repository', {}).get('full_name'),
+        "installation_id": payload.get('installation', {}).get('id'),
+        "labels": [label.get('name') for label in issue.get('labels', [])]
+    }
+
+def process_send_job(job):
+    """Create the Notion ticket and confirm it on GitHub, skipping stages already done.
+
+    Progress is recorded on the job itself so a retried job doesn't create a
+    second Notion page when only the GitHub comment, or appending the rest
+    of a new page's content, failed.
+    """
+    if job.get('blocks_written') is not None:
+        # The page exists but its content was cut short; append the rest
+        job['stage'] = 'notion'
+        with deadline.stage('notion', DEADLINE_NOTION_MIN):
+            finish_notion_ticket(job)
+    elif not job.get('notion_page_id'):
+        # Create or update the ticket in Notion
+        job['stage'] = 'notion'
+        progress = {}
+        try:
+            with deadline.stage('notion', DEADLINE_NOTION_MIN):
+                job['notion_page_id'], job['notion_action'] = sync_issue_to_notion(
+                    title=job['title'],
+                    description=job['body'],
+                    issue_number=job['issue_number'],
+                    issue_url=job['issue_url'],
+                    repo=job['repo'],
+                    status=job.get('status'),
+                    force=job.get('force', False),
+                    labels=job.get('labels'),
+                    progress=progress
+                )
+        except Exception:
+            if 'page_id' in progress:
+                job['notion_page_id'], job['notion_action'] = progress['page_id'], 'created'
+                job['blocks_written'] = progress['blocks_written']
+            raise
+    
+    if not job.get('commented') and job.get('notion_action') != 'unchanged':
+        # Add a comment to the GitHub issue
+        job['stage'] = 'comment'
+        with deadline.stage('comment', DEADLINE_COMMENT_MIN):
+            add_github_comment(
+                repo_full_name=job['repo'],
+                issue_number=job['issue_number'],
+                notion_page_id=job['notion_page_id'],
+                installation_id=job['installation_id'],
+                action=job.get('notion_action', 'created')
+            )
+        job['commented'] = True
+    
+    return job['notion_page_id']
 
-def create_notion_ticket(title, description, issue_number, issue_url, repo):
-    """Create a new ticket in the Notion database"""
+def finish_notion_ticket(job):
+    """Append the blocks a new ticket is missing because its creation was cut short"""
+    blocks = list(build_ticket_children(job['body'], job['issue_number'], job['issue_url']))
+    for batch in batched(itertools.islice(blocks, job['blocks_written'], None)):
+        append_notion_blocks(job['notion_page_id'], [batch])
+        job['blocks_written'] += len(batch)
+    properties = build_ticket_properties(job['title'], job['issue_number'], job['issue_url'], job['repo'],
+                                         job.get('labels'))
+    save_new_page_snapshot(job['notion_page_id'], properties, blocks)
+    content_hash = ticket_content_hash(job['title'], job['body'], job['issue_url'], job['repo'], job.get('labels'))
+    get_issue_index().upsert(job['repo'], job['issue_number'], job['notion_page_id'], content_hash)
+    del job['blocks_written']
+
+@metrics.timed('create_notion_ticket')
+def create_notion_ticket(title, description, issue_number, issue_url, repo, status=None, labels=None,
+                         progress=None):
+    """Create a new ticket in the Notion database.
+
+    With a `progress` dict, the new page's id and the number of blocks
+    written so far are kept in it, so a caller can tell how far a failed
+    call got.
+    """
+    progress = {} if progress is None else progress
     logger.info(f"Creating Notion ticket for issue #{issue_number}")
     
     # Prepare the properties for the Notion page
+    properties = build_ticket_properties(title, issue_number, issue_url, repo, labels)
+    properties[current_tenant().property('status')] = {
+        "status": {
+            "name": status or NOTION_DEFAULT_STATUS
+        }
+    }
+    
+    validate_ticket_properties(properties)
+    
+    # Prepare the content for the page; Notion takes at most 100 blocks per request
+    batches = batched(build_ticket_children(description, issue_number, issue_url))
+    children = next(batches)
+    blocks = list(children)
+    
+    # Create the page in Notion
+    url = f"{NOTION_API_URL}/pages"
+    headers = {
+        "Authorization": f"Bearer {current_tenant().notion_token}"
+    }
+    data = {
+        "parent": {"database_id": current_tenant().notion_database_id},
+        "properties": properties,
+        "children": children
+    }
+    
+    response = notion_client.post(url, headers=headers, json=data)
+    
+    if response.status_code != 200:
+        logger.error(f"Failed to create Notion page: {response.text}")
+        raise Exception(f"Failed to create Notion page: {response.status_code}")
+    
+    notion_data = response.json()
+    notion_page_id = notion_data.get('id')
+    notion_url = notion_page_url(notion_page_id)
+    progress['page_id'] = notion_page_id
+    progress['blocks_written'] = len(children)
+    
+    # Append whatever didn't fit in the first request
+    for batch in batches:
+        append_notion_blocks(notion_page_id, [batch])
+        progress['blocks_written'] += len(batch)
+        blocks.extend(batch)
+    
+    save_new_page_snapshot(notion_page_id, build_ticket_properties(title, issue_number, issue_url, repo, labels),
+                           blocks)
+    logger.info(f"Created Notion ticket: {notion_url}")
+    return notion_page_id
+
+def save_new_page_snapshot(page_id, properties, blocks):
+    """Record what a new page was created with, so its first update only sends the differences.
+
+    Notion doesn't return the ids of the blocks a page is created with, so
+    they are listed once; without them only the properties are recorded
+    and the first update rewrites the content.
+    """
+    try:
+        block_ids = list_notion_block_ids(page_id)
+    except Exception as e:
+        logger.warning(f"Could not list the blocks of new Notion page {page_id}: {str(e)}")
+        block_ids = []
+    get_page_snapshots().save(
+        page_id,
+        {name: block_hash(value) for name, value in properties.items()},
+        [[block_id, block_hash(block), block['type']] for block_id, block in zip(block_ids, blocks)]
+        if len(block_ids) == len(blocks) else None
+    )
+
+def build_ticket_properties(title, issue_number, issue_url, repo, labels=None):
+    """Build the Notion properties that mirror the GitHub issue"""
+    tenant = current_tenant()
     properties = {
-        "Task name": {
+        tenant.property('title'): {
             "title": [
                 {
                     "text": {
@@ -163,15 +1151,10 @@ def create_notion_ticket(title, description, issue_number, issue_url, repo):
                 }
             ]
         },
-        "Status": {
-            "status": { 
-                "name": "Icebox"
-            }
-        },
-        "GitHub Issue": {
+        tenant.property('issue_url'): {
             "url": issue_url
         },
-        "Repository": {
+        tenant.property('repository'): {
             "rich_text": [
                 {
                     "text": {
@@ -181,24 +1164,37 @@ def create_notion_ticket(title, description, issue_number, issue_url, repo):
             ]
         }
     }
-    
-    # Prepare the content for the page
-    children = [
-        {
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": [
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": "Imported from GitHub Issue #" + str(issue_number)
-                        }
+    if tenant.property('labels') and labels is not None:
+        properties[tenant.property('labels')] = {
+            "multi_select": [{"name": label} for label in sorted(labels)]
+        }
+    return properties
+
+def build_ticket_children(description, issue_number, issue_url):
+    """Yield the page content blocks for a GitHub issue.
+
+    The description is converted from Markdown as it is read, so long
+    issues never exist as one big list of blocks.
+    """
+    yield {
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {
+            "rich_text": [
+                {
+                    "type": "text",
+                    "text": {
+                        "content": "Imported from GitHub Issue #" + str(issue_number)
                     }
-                ]
-            }
-        },
-        {
+                }
+            ]
+        }
+    }
+    
+    if description:
+        yield from markdown_to_blocks(iter_lines(description))
+    else:
+        yield {
             "object": "block",
             "type": "paragraph",
             "paragraph": {
@@ -206,91 +1202,960 @@ def create_notion_ticket(title, description, issue_number, issue_url, repo):
                     {
                         "type": "text",
                         "text": {
-                            "content": description if description else "No description provided."
+                            "content": "No description provided."
                         }
                     }
                 ]
             }
-        },
-        {
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": [
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": f"GitHub Issue: {issue_url}"
-                        },
-                        "href": issue_url
-                    }
-                ]
-            }
         }
-    ]
     
-    # Create the page in Notion
-    url = "https://api.notion.com/v1/pages"
+    yield {
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {
+            "rich_text": [
+                {
+                    "type": "text",
+                    "text": {
+                        "content": f"GitHub Issue: {issue_url}"
+                    },
+                    "href": issue_url
+                }
+            ]
+        }
+    }
+
+def append_notion_blocks(block_id, batches, after=None):
+    """Append batches of up to 100 child blocks to a page or block.
+
+    With `after`, the blocks are inserted after that child instead of at
+    the end. Returns the ids of the new blocks, or None if Notion didn't
+    report all of them.
+    """
     headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28"
+        "Authorization": f"Bearer {current_tenant().notion_token}"
     }
-    data = {
-        "parent": {"database_id": NOTION_DATABASE_ID},
-        "properties": properties,
-        "children": children
+    block_ids = []
+    for batch in batches:
+        data = {"children": batch}
+        if after is not None:
+            data["after"] = after
+        response = notion_client.patch(
+            f"{NOTION_API_URL}/blocks/{block_id}/children",
+            headers=headers,
+            json=data
+        )
+        if response.status_code != 200:
+            logger.error(f"Failed to append Notion blocks: {response.text}")
+            raise Exception(f"Failed to append Notion blocks: {response.status_code}")
+        created = [block['id'] for block in response.json().get('results', [])]
+        block_ids = block_ids + created if block_ids is not None and len(created) == len(batch) else None
+        if after is not None:
+            # The next batch goes after this one
+            if block_ids is None:
+                raise Exception("Notion didn't return the inserted blocks, so the rest can't be placed")
+            after = block_ids[-1]
+    return block_ids
+
+def update_notion_ticket(page_id, title, description, issue_number, issue_url, repo, labels=None):
+    """Bring an existing Notion ticket in line with the GitHub issue.
+
+    Only the properties and blocks that differ from what was last written
+    are sent. Without a record of that, the whole page is rewritten.
+    The Status property is left alone so changes made in Notion survive.
+    """
+    logger.info(f"Updating Notion ticket {page_id} for issue #{issue_number}")
+    snapshots = get_page_snapshots()
+    snapshot = snapshots.get(page_id)
+    
+    properties = build_ticket_properties(title, issue_number, issue_url, repo, labels)
+    property_hashes = {name: block_hash(value) for name, value in properties.items()}
+    written = snapshot['properties'] if snapshot else {}
+    changed = {name: value for name, value in properties.items() if written.get(name) != property_hashes[name]}
+    if changed:
+        update_notion_properties(page_id, changed)
+    
+    blocks = list(build_ticket_children(description, issue_number, issue_url))
+    diff = BlockDiff(snapshot['blocks'], blocks) if snapshot and snapshot['blocks'] else None
+    if diff is None or (diff.inserts and diff.after is None):
+        block_ids = rewrite_notion_blocks(page_id, blocks)
+    else:
+        block_ids = apply_block_diff(page_id, diff)
+    
+    snapshots.save(page_id, property_hashes, None if block_ids is None else [
+        [block_id, block_hash(block), block['type']] for block_id, block in zip(block_ids, blocks)
+    ])
+
+def rewrite_notion_blocks(page_id, blocks):
+    """Replace all of a page's content; returns the new block ids if known"""
+    headers = {
+        "Authorization": f"Bearer {current_tenant().notion_token}"
+    }
+    for block_id in list_notion_block_ids(page_id):
+        delete_notion_block(block_id, headers)
+    return append_notion_blocks(page_id, batched(blocks))
+
+def apply_block_diff(page_id, diff):
+    """Send the block updates, deletions and insertions of a BlockDiff; returns the page's block ids"""
+    headers = {
+        "Authorization": f"Bearer {current_tenant().notion_token}"
+    }
+    for block_id, block in diff.updates:
+        response = notion_client.patch(
+            f"{NOTION_API_URL}/blocks/{block_id}",
+            headers=headers,
+            json={block['type']: block[block['type']]}
+        )
+        if response.status_code != 200:
+            logger.error(f"Failed to update Notion block: {response.text}")
+            raise Exception(f"Failed to update Notion block: {response.status_code}")
+    for block_id in diff.deletes:
+        delete_notion_block(block_id, headers)
+    inserted = append_notion_blocks(page_id, batched(diff.inserts), after=diff.after) if diff.inserts else []
+    logger.info(f"Notion ticket {page_id}: {len(diff.updates)} blocks updated, "
+                f"{len(diff.deletes)} deleted, {len(diff.inserts)} inserted")
+    return diff.kept_before + [block_id for block_id, _ in diff.updates] + inserted + diff.kept_after
+
+def delete_notion_block(block_id, headers):
+    response = notion_client.delete(f"{NOTION_API_URL}/blocks/{block_id}", headers=headers)
+    if response.status_code != 200:
+        logger.error(f"Failed to delete Notion block: {response.text}")
+        raise Exception(f"Failed to delete Notion block: {response.status_code}")
+
+def list_notion_block_ids(page_id):
+    """List the ids of a page's top-level blocks, following pagination"""
+    headers = {
+        "Authorization": f"Bearer {current_tenant().notion_token}"
     }
+    params = {"page_size": 100}
+    block_ids = []
+    while True:
+        response = notion_client.get(
+            f"{NOTION_API_URL}/blocks/{page_id}/children",
+            headers=headers,
+            params=params
+        )
+        if response.status_code != 200:
+            logger.error(f"Failed to list Notion blocks: {response.text}")
+            raise Exception(f"Failed to list Notion blocks: {response.status_code}")
+        data = response.json()
+        block_ids.extend(block['id'] for block in data.get('results', []))
+        if not data.get('has_more'):
+            return block_ids
+        params["start_cursor"] = data.get('next_cursor')
+
+def get_notion_status(page_id):
+    """Read the Status of a Notion page"""
+    response = notion_client.get(
+        f"{NOTION_API_URL}/pages/{page_id}",
+        headers={"Authorization": f"Bearer {current_tenant().notion_token}"}
+    )
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch Notion page: {response.text}")
+        raise Exception(f"Failed to fetch Notion page: {response.status_code}")
+    status = response.json().get('properties', {}).get(current_tenant().property('status'), {}).get('status') or {}
+    return status.get('name', 'No status')
+
+def set_notion_status(page_id, status):
+    """Set the Status of a Notion page"""
+    update_notion_properties(page_id, {current_tenant().property('status'): {"status": {"name": status}}})
+
+def link_notion_page(page_id, issue_url):
+    """Point an existing Notion page at a GitHub issue"""
+    update_notion_properties(page_id, {current_tenant().property('issue_url'): {"url": issue_url}})
+
+def update_notion_properties(page_id, properties):
+    """Validate and write some properties of a Notion page"""
+    validate_ticket_properties(properties)
+    response = notion_client.patch(
+        f"{NOTION_API_URL}/pages/{page_id}",
+        headers={"Authorization": f"Bearer {current_tenant().notion_token}"},
+        json={"properties": properties}
+    )
+    if response.status_code != 200:
+        logger.error(f"Failed to update Notion page: {response.text}")
+        raise Exception(f"Failed to update Notion page: {response.status_code}")
+
+def notion_page_url(page_id):
+    return f"https://notion.so/{page_id.replace('-', '')}"
+
+def parse_notion_page_id(value):
+    """Get a page id from a Notion page URL or a bare id, or None"""
+    match = NOTION_PAGE_ID_PATTERN.search(value or '')
+    if match is None:
+        return None
+    raw = match.group(1).replace('-', '')
+    return f"{raw[:8]}-{raw[8:12]}-{raw[12:16]}-{raw[16:20]}-{raw[20:]}"
+
+def ticket_content_hash(title, description, issue_url, repo, labels=None):
+    """Hash the issue fields that end up on the Notion page"""
+    fields = [title, description or '', issue_url, repo]
+    if current_tenant().property('labels') and labels is not None:
+        fields.append(sorted(labels))
+    content = json.dumps(fields)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def sync_issue_to_notion(title, description, issue_number, issue_url, repo, status=None, force=False, labels=None,
+                         progress=None):
+    """Create or update the Notion ticket for an issue using the local index.
+
+    Returns the page id and what was done: 'created', 'updated' or
+    'unchanged' (nothing was written because the content hash matched).
+    `status` is only applied to new tickets; `force` rewrites the whole
+    page even if the hash matches. `progress` is passed on to
+    create_notion_ticket.
+    """
+    index = get_issue_index()
+    content_hash = ticket_content_hash(title, description, issue_url, repo, labels)
+    entry = index.get(repo, issue_number)
     
-    response = requests.post(url, headers=headers, json=data)
+    if entry is None:
+        progress = {} if progress is None else progress
+        try:
+            page_id = create_notion_ticket(
+                title=title,
+                description=description,
+                issue_number=issue_number,
+                issue_url=issue_url,
+                repo=repo,
+                status=status,
+                labels=labels,
+                progress=progress
+            )
+        except Exception:
+            if 'page_id' in progress:
+                # Index the half-written page so nothing creates a second one; the empty
+                # hash makes the next sync that isn't resuming it rewrite its content
+                get_notion_sync_state().record_status(progress['page_id'], status or NOTION_DEFAULT_STATUS)
+                index.upsert(repo, issue_number, progress['page_id'], '')
+            raise
+        get_notion_sync_state().record_status(page_id, status or NOTION_DEFAULT_STATUS)
+        action = 'created'
+    elif entry['content_hash'] == content_hash and not force:
+        logger.info(f"Notion ticket for issue #{issue_number} is already up to date")
+        return entry['page_id'], 'unchanged'
+    else:
+        page_id = entry['page_id']
+        if force:
+            # The page may have been edited in Notion, so don't trust the last snapshot
+            get_page_snapshots().discard(page_id)
+        update_notion_ticket(page_id, title, description, issue_number, issue_url, repo, labels=labels)
+        action = 'updated'
     
+    index.upsert(repo, issue_number, page_id, content_hash)
+    return page_id, action
+
+def find_installation_id(repo):
+    """Look up the GitHub App installation for a repository"""
+    response = github_client.get(
+        f"{GITHUB_API_URL}/repos/{repo}/installation",
+        headers={"Authorization": f"Bearer {get_app_jwt()}"},
+        rate_key='app'
+    )
     if response.status_code != 200:
-        logger.error(f"Failed to create Notion page: {response.text}")
-        raise Exception(f"Failed to create Notion page: {response.status_code}")
+        logger.error(f"Failed to find installation for {repo}: {response.text}")
+        raise Exception(f"Failed to find installation for {repo}: {response.status_code}")
+    return response.json()['id']
+
+def list_repository_issues(repo, installation_id, start_url=None):
+    """Yield each page of a repository's open issues with the URL of the next page"""
+    url = start_url or f"{GITHUB_API_URL}/repos/{repo}/issues?state=open&per_page=100"
+    while url:
+        token = get_github_app_token(installation_id)
+        response = github_client.get(
+            url,
+            headers={"Authorization": f"token {token}"},
+            rate_key=installation_id,
+            urgent=False
+        )
+        check_token_rejected(response, installation_id)
+        if response.status_code != 200:
+            logger.error(f"Failed to list issues for {repo}: {response.text}")
+            raise Exception(f"Failed to list issues for {repo}: {response.status_code}")
+        
+        next_url = response.links.get('next', {}).get('url')
+        # The issues API also returns pull requests
+        issues = [issue for issue in response.json() if 'pull_request' not in issue]
+        yield issues, next_url
+        url = next_url
+
+def count_open_issues(repo, installation_id):
+    """Open issue count for progress reporting (GitHub includes pull requests in it)"""
+    token = get_github_app_token(installation_id)
+    response = github_client.get(
+        f"{GITHUB_API_URL}/repos/{repo}",
+        headers={"Authorization": f"token {token}"},
+        rate_key=installation_id,
+        urgent=False
+    )
+    check_token_rejected(response, installation_id)
+    if response.status_code != 200:
+        return 0
+    return response.json().get('open_issues_count', 0)
+
+def run_backfill(repo, installation_id, concurrency=None, restart=False, report=None):
+    """Send every open issue of a repository to Notion, resuming from the last checkpoint.
+
+    Issues are synced `concurrency` at a time through sync_issue_to_notion,
+    one page of the issue listing at a time. `report` is called with
+    throughput and ETA after every page.
+    """
+    concurrency = concurrency or BACKFILL_CONCURRENCY
+    checkpoints = get_backfill_checkpoints()
+    if restart:
+        checkpoints.reset(repo)
+    resume = checkpoints.start(repo, stale_after=BACKFILL_STALE_AFTER)
     
-    notion_data = response.json()
-    notion_page_id = notion_data.get('id')
-    notion_url = f"https://notion.so/{notion_page_id.replace('-', '')}"
+    next_url = resume['next_url'] if resume else None
+    processed = resume['processed'] if resume else 0
+    failed = resume['failed'] if resume else 0
+    if resume:
+        logger.info(f"Resuming backfill of {repo} after {processed} issues")
     
-    logger.info(f"Created Notion ticket: {notion_url}")
-    return notion_page_id
+    total = count_open_issues(repo, installation_id)
+    tenant = tenant_for(installation_id)
+    started = time.monotonic()
+    processed_this_run = 0
+    progress = None
+    
+    def sync(issue):
+        with tenants.scope(tenant):
+            sync_issue_to_notion(
+                title=issue.get('title'),
+                description=issue.get('body') or '',
+                issue_number=issue.get('number'),
+                issue_url=issue.get('html_url'),
+                repo=repo,
+                labels=[label.get('name') for label in issue.get('labels', [])]
+            )
+    
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='backfill') as executor:
+            for issues, next_url in list_repository_issues(repo, installation_id, next_url):
+                futures = [executor.submit(sync, issue) for issue in issues]
+                for issue, future in zip(issues, futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Backfill of {repo}#{issue.get('number')} failed: {str(e)}")
+                
+                processed += len(issues)
+                processed_this_run += len(issues)
+                checkpoints.save(repo, next_url, processed, failed, 'running' if next_url else 'done')
+                
+                elapsed = time.monotonic() - started
+                rate = processed_this_run / elapsed if elapsed > 0 else 0.0
+                if not next_url:
+                    eta = 0
+                elif rate:
+                    eta = round(max(total - processed, 0) / rate)
+                else:
+                    eta = None
+                progress = {
+                    "repo": repo,
+                    "processed": processed,
+                    "failed": failed,
+                    "total": max(total, processed),
+                    "rate": round(rate, 2),
+                    "eta": eta
+                }
+                if report:
+                    report(progress)
+                else:
+                    logger.info(f"Backfill {repo}: {processed}/{progress['total']} issues, "
+                                f"{progress['rate']} issues/sec, ETA {progress['eta']}s")
+    except BaseException:
+        # Keep the last completed page so the next run resumes from there
+        saved = checkpoints.get(repo)
+        checkpoints.save(repo, saved['next_url'], saved['processed'], saved['failed'], 'interrupted')
+        raise
+    
+    return progress
+
+def rebuild_issue_index():
+    """Rebuild the issue index with one paginated pass over the Notion database"""
+    index = get_issue_index()
+    url = f"{NOTION_API_URL}/databases/{current_tenant().notion_database_id}/query"
+    headers = {
+        "Authorization": f"Bearer {current_tenant().notion_token}"
+    }
+    data = {"page_size": 100}
+    restored = 0
+    while True:
+        response = notion_client.post(url, headers=headers, json=data)
+        if response.status_code != 200:
+            logger.error(f"Failed to query Notion database: {response.text}")
+            raise Exception(f"Failed to query Notion database: {response.status_code}")
+        result = response.json()
+        
+        entries = []
+        for page in result.get('results', []):
+            issue_url = page.get('properties', {}).get(current_tenant().property('issue_url'), {}).get('url')
+            match = ISSUE_URL_PATTERN.match(issue_url or '')
+            if match:
+                entries.append((match.group(1), int(match.group(2)), page['id']))
+        index.restore(entries)
+        restored += len(entries)
+        
+        if not result.get('has_more'):
+            break
+        data["start_cursor"] = result.get('next_cursor')
+    
+    logger.info(f"Rebuilt issue index with {restored} pages")
+    return restored
+
+NOTION_SYNC_CURSOR = 'notion-status'
+
+def run_notion_sync():
+    """Apply the Notion Status changes made since the last run to the linked issues.
+
+    Every tenant's database is followed with its own cursor. A database
+    that can't be queried is logged and skipped until the next run.
+    """
+    totals = Counter(pages=0, changed=0, failed=0)
+    for cursor_name, tenant in notion_sync_targets():
+        with tenants.scope(tenant):
+            try:
+                totals.update(sync_database_statuses(cursor_name))
+            except Exception as e:
+                logger.error(f"Notion status sync of {tenant} failed: {str(e)}")
+    return dict(totals)
+
+def notion_sync_targets():
+    """The databases the status sync follows, as (cursor name, tenant) pairs.
+
+    The default tenant's database keeps the cursor it had before tenants
+    existed; it is left out when it isn't configured and tenants are.
+    Tenants sharing a database are followed once.
+    """
+    stored = get_tenants().all()
+    targets = {}
+    if default_tenant.notion_database_id or not stored:
+        targets[default_tenant.notion_database_id] = (NOTION_SYNC_CURSOR, default_tenant)
+    for tenant in stored:
+        targets.setdefault(tenant.notion_database_id, (f"{NOTION_SYNC_CURSOR}:{tenant.notion_database_id}", tenant))
+    return list(targets.values())
 
-def add_github_comment(repo_full_name, issue_number, notion_page_id, installation_id):
+def sync_database_statuses(cursor_name):
+    """Apply the Status changes in the current tenant's database since its cursor.
+
+    Only pages edited at or after the saved cursor are fetched, so the cost
+    of a run follows the number of edits rather than the database size.
+    The first run only sets the cursor.
+    """
+    state = get_notion_sync_state()
+    cursor = state.get_cursor(cursor_name)
+    if cursor is None:
+        state.save_cursor(cursor_name, datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+        return {"pages": 0, "changed": 0, "failed": 0}
+    
+    pages = changed = failed = 0
+    newest, stuck = cursor, False
+    for page in query_pages_edited_since(cursor):
+        pages += 1
+        try:
+            if sync_page_status(page, state):
+                changed += 1
+        except Exception as e:
+            failed += 1
+            # Don't move the cursor past a page that still has to be applied
+            stuck = True
+            logger.error(f"Failed to sync Notion status of page {page.get('id')}: {str(e)}")
+        if not stuck:
+            newest = max(newest, page.get('last_edited_time') or newest)
+    
+    # last_edited_time only has minute precision, so the next run asks for
+    # `on_or_after` and pages at the cursor are skipped by their status
+    state.save_cursor(cursor_name, newest)
+    if changed or failed:
+        logger.info(f"Notion status sync: {pages} pages edited, {changed} status changes, {failed} failed")
+    return {"pages": pages, "changed": changed, "failed": failed}
+
+def query_pages_edited_since(cursor):
+    """Yield the database pages edited at or after `cursor`, oldest first"""
+    url = f"{NOTION_API_URL}/databases/{current_tenant().notion_database_id}/query"
+    headers = {
+        "Authorization": f"Bearer {current_tenant().notion_token}"
+    }
+    data = {
+        "filter": {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": cursor}},
+        "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+        "page_size": 100
+    }
+    while True:
+        response = notion_client.post(url, headers=headers, json=data)
+        if response.status_code != 200:
+            logger.error(f"Failed to query Notion database: {response.text}")
+            raise Exception(f"Failed to query Notion database: {response.status_code}")
+        result = response.json()
+        yield from result.get('results', [])
+        if not result.get('has_more'):
+            return
+        data["start_cursor"] = result.get('next_cursor')
+
+def sync_page_status(page, state):
+    """Carry a page's Status over to its issue if it changed; returns True if it did"""
+    properties = page.get('properties', {})
+    tenant = current_tenant()
+    status = ((properties.get(tenant.property('status')) or {}).get('status') or {}).get('name')
+    match = ISSUE_URL_PATTERN.match((properties.get(tenant.property('issue_url')) or {}).get('url') or '')
+    if status is None or match is None:
+        return False
+    
+    previous = state.get_status(page['id'])
+    if previous is None:
+        # First time this page is seen, so there is no change to report
+        state.record_status(page['id'], status)
+        return False
+    if previous == status:
+        return False
+    
+    # Record the new status first, so a closed/reopened webhook for the change
+    # made below sees the ticket already agreeing and leaves the status alone
+    state.record_status(page['id'], status)
+    try:
+        apply_status_change(match.group(1), int(match.group(2)), page['id'], previous, status)
+    except Exception:
+        # Put the old status back so the next run tries the change again
+        state.record_status(page['id'], previous)
+        raise
+    return True
+
+def apply_status_change(repo, issue_number, page_id, previous, status):
+    """Update labels, open/closed state and comments of an issue for a new Notion status"""
+    logger.info(f"Notion status of {repo}#{issue_number} changed from {previous} to {status}")
+    installation_id = installation_for_repo(repo)
+    
+    if NOTION_STATUS_LABEL_PREFIX:
+        remove_issue_label(repo, issue_number, installation_id, NOTION_STATUS_LABEL_PREFIX + previous)
+        update_github_issue(repo, issue_number, installation_id, 'POST', '/labels',
+                            {"labels": [NOTION_STATUS_LABEL_PREFIX + status]})
+    
+    if status in NOTION_CLOSE_STATUSES and previous not in NOTION_CLOSE_STATUSES:
+        update_github_issue(repo, issue_number, installation_id, 'PATCH', '', {"state": "closed"})
+    elif previous in NOTION_CLOSE_STATUSES and status not in NOTION_CLOSE_STATUSES:
+        update_github_issue(repo, issue_number, installation_id, 'PATCH', '', {"state": "open"})
+    
+    if NOTION_STATUS_COMMENTS:
+        post_github_comment(repo, issue_number, installation_id,
+                            f"📋 [Notion ticket]({notion_page_url(page_id)}) moved from **{previous}** to **{status}**")
+
+def installation_for_repo(repo):
+    """Installation id of a repository, looked up once an hour"""
+    installation_id = installation_ids.get(repo)
+    if installation_id is None:
+        installation_id = find_installation_id(repo)
+        installation_ids.set(repo, installation_id)
+    return installation_id
+
+def update_github_issue(repo, issue_number, installation_id, method, path, data):
+    """Send a change to an issue (or one of its sub-resources) as the app installation"""
+    response = github_client.request(
+        method,
+        f"{GITHUB_API_URL}/repos/{repo}/issues/{issue_number}{path}",
+        headers={"Authorization": f"token {get_github_app_token(installation_id)}"},
+        json=data,
+        rate_key=installation_id,
+        urgent=False
+    )
+    check_token_rejected(response, installation_id)
+    if response.status_code not in (200, 201):
+        logger.error(f"Failed to update GitHub issue: {response.text}")
+        raise Exception(f"Failed to update GitHub issue: {response.status_code}")
+
+def remove_issue_label(repo, issue_number, installation_id, label):
+    """Remove a label from an issue; a label that isn't there is fine"""
+    response = github_client.delete(
+        f"{GITHUB_API_URL}/repos/{repo}/issues/{issue_number}/labels/{quote(label, safe='')}",
+        headers={"Authorization": f"token {get_github_app_token(installation_id)}"},
+        rate_key=installation_id,
+        urgent=False
+    )
+    check_token_rejected(response, installation_id)
+    if response.status_code not in (200, 404):
+        logger.error(f"Failed to remove GitHub label: {response.text}")
+        raise Exception(f"Failed to remove GitHub label: {response.status_code}")
+
+@metrics.timed('add_github_comment')
+def add_github_comment(repo_full_name, issue_number, notion_page_id, installation_id, action='created'):
     """Add a comment to the GitHub issue confirming the Notion ticket was created"""
+    notion_url = notion_page_url(notion_page_id)
+    comment_body = f"✅ {action.capitalize()} Notion ticket: [View in Notion]({notion_url})"
+    post_github_comment(repo_full_name, issue_number, installation_id, comment_body)
+
+def post_github_comment(repo_full_name, issue_number, installation_id, comment_body):
+    """Post a comment on a GitHub issue as the app installation"""
     logger.info(f"Adding comment to GitHub issue #{issue_number}")
     
     # Get an installation token for the GitHub App
     token = get_github_app_token(installation_id)
     
-    notion_url = f"https://notion.so/{notion_page_id.replace('-', '')}"
-    comment_body = f"✅ Created Notion ticket: [View in Notion]({notion_url})"
-    
-    url = f"https://api.github.com/repos/{repo_full_name}/issues/{issue_number}/comments"
+    url = f"{GITHUB_API_URL}/repos/{repo_full_name}/issues/{issue_number}/comments"
     headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
+        "Authorization": f"token {token}"
     }
     data = {
         "body": comment_body
     }
     
-    response = requests.post(url, headers=headers, json=data)
+    # The confirmation comment can wait if the installation is low on budget
+    response = github_client.post(
+        url,
+        headers=headers,
+        json=data,
+        rate_key=installation_id,
+        urgent=False
+    )
     
+    check_token_rejected(response, installation_id)
     if response.status_code != 201:
         logger.error(f"Failed to add GitHub comment: {response.text}")
         raise Exception(f"Failed to add GitHub comment: {response.status_code}")
     
     logger.info("Added comment to GitHub issue")
 
+_job_queue = None
+_queue_workers = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Open the job queue on first use"""
+    global _job_queue
+    with _queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(DATABASE_PATH)
+        return _job_queue
+
+_dedupe_store = None
+
+def get_dedupe_store():
+    """Open the store of claimed deliveries and issues on first use; it is shared by all workers"""
+    global _dedupe_store
+    with _queue_lock:
+        if _dedupe_store is None:
+            # Keyed on X-GitHub-Delivery and on (repo, issue_number)
+            _dedupe_store = IdempotencyStore(DATABASE_PATH, [DELIVERY_DEDUPE_TTL, ISSUE_DEDUPE_TTL])
+        return _dedupe_store
+
+_issue_index = None
+
+def get_issue_index():
+    """Open the issue-to-page index on first use"""
+    global _issue_index
+    with _queue_lock:
+        if _issue_index is None:
+            _issue_index = IssuePageIndex(DATABASE_PATH)
+        return _issue_index
+
+_backfill_checkpoints = None
+
+def get_backfill_checkpoints():
+    """Open the backfill checkpoint store on first use"""
+    global _backfill_checkpoints
+    with _queue_lock:
+        if _backfill_checkpoints is None:
+            _backfill_checkpoints = BackfillCheckpoints(DATABASE_PATH)
+        return _backfill_checkpoints
+
+_page_snapshots = None
+
+def get_page_snapshots():
+    """Open the page snapshot store on first use"""
+    global _page_snapshots
+    with _queue_lock:
+        if _page_snapshots is None:
+            _page_snapshots = PageSnapshots(DATABASE_PATH)
+        return _page_snapshots
+
+_notion_sync_state = None
+
+def get_notion_sync_state():
+    """Open the status sync state on first use"""
+    global _notion_sync_state
+    with _queue_lock:
+        if _notion_sync_state is None:
+            _notion_sync_state = NotionSyncState(DATABASE_PATH)
+        return _notion_sync_state
+
+_tenants = None
+
+def get_tenants():
+    """Open the tenant store, behind its in-process cache, on first use"""
+    global _tenants
+    with _queue_lock:
+        if _tenants is None:
+            _tenants = TenantDirectory(TenantStore(DATABASE_PATH), default_tenant, TENANT_CACHE_SIZE)
+        return _tenants
+
+def tenant_for(installation_id):
+    return get_tenants().get(installation_id)
+
+def start_notion_sync():
+    """Run the Notion to GitHub status sync every NOTION_SYNC_INTERVAL seconds in the background"""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    
+    def loop():
+        while True:
+            try:
+                # Every worker runs the loop, but only the lease holder syncs
+                if get_notion_sync_state().lease(NOTION_SYNC_CURSOR, owner, NOTION_SYNC_INTERVAL * 3):
+                    run_notion_sync()
+            except Exception as e:
+                logger.error(f"Notion status sync failed: {str(e)}")
+            time.sleep(NOTION_SYNC_INTERVAL)
+    
+    threading.Thread(target=loop, name="notion-sync", daemon=True).start()
+    logger.info(f"Syncing Notion status changes every {NOTION_SYNC_INTERVAL}s")
+
+def start_queue_workers():
+    """Start the background workers that drain the job queue"""
+    global _queue_workers
+    queue = get_job_queue()
+    with _queue_lock:
+        if _queue_workers is None:
+            _queue_workers = QueueWorkerPool(
+                queue,
+                JOB_HANDLERS,
+                logger,
+                workers=QUEUE_WORKERS,
+                max_attempts=QUEUE_MAX_ATTEMPTS,
+                retry_delay=QUEUE_RETRY_DELAY
+            )
+            _queue_workers.start()
+            logger.info(f"Started {QUEUE_WORKERS} queue workers on {DATABASE_PATH}")
+        return _queue_workers
+
+def tenant_job(handler):
+    """Run a job handler for the tenant of the job's installation"""
+    def run(job):
+        with tenants.scope(tenant_for(job.get('installation_id'))):
+            return handler(job)
+    return run
+
+# Job kinds the queue workers know how to run
+JOB_HANDLERS = {
+    'send': tenant_job(process_send_job),
+    'issue': tenant_job(process_issue_job)
+}
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for container orchestration"""
-    return jsonify({
+    return jsonify(health_status())
+
+def health_status():
+    return {
         "status": "healthy",
         "version": "1.0.0",
         "timestamp": time.time()
-    })
+    }
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics, summed across all gunicorn workers"""
+    data, content_type = metrics.render()
+    return Response(data, content_type=content_type)
+
+@app.route('/admin/stats', methods=['GET'])
+@require_admin
+def admin_stats():
+    """Internal counters for the caches and queues"""
+    stats = {
+        "github_token_cache": token_cache.stats(),
+        "notion_rate_limit": notion_rate_limiter.stats(),
+        "dedupe": get_dedupe_store().stats(),
+        "notion_schema": notion_schema.stats(),
+        "tenants": get_tenants().stats(),
+        "profiler": profiler.stats()
+    }
+    with _filter_lock:
+        stats["filtered_events"] = dict(filtered_events)
+    if delivery_journal is not None:
+        stats["journal"] = delivery_journal.stats()
+    if _job_queue is not None:
+        stats["job_queue"] = _job_queue.stats()
+    if _queue_workers is not None:
+        stats["queue_workers"] = _queue_workers.stats()
+    return jsonify(stats)
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+@require_admin
+def admin_profiling():
+    """Show the profiler settings, or change them for every worker process"""
+    if request.method == 'POST':
+        settings = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(settings.get('sample_rate'), settings.get('slow_threshold'))
+        except (TypeError, ValueError):
+            return jsonify({"error": "sample_rate and slow_threshold must be numbers"}), 400
+        logger.info(f"Profiler set to sample_rate={profiler.sample_rate} slow_threshold={profiler.slow_threshold}")
+    return jsonify(profiler.stats())
+
+@app.route('/admin/upstreams', methods=['GET'])
+@require_admin
+def admin_upstreams():
+    """Circuit breaker state and bulkhead use per upstream"""
+    return jsonify({name: dependency.stats() for name, dependency in upstreams.items()})
+
+@app.route('/admin/github-rate-limits', methods=['GET'])
+@require_admin
+def admin_github_rate_limits():
+    """Remaining GitHub rate-limit budget per installation"""
+    return jsonify(github_rate_budget.snapshot())
+
+@app.cli.command('rebuild-index')
+@click.option('--installation-id', type=int, help='Rebuild from the database of this installation\'s tenant.')
+def rebuild_index_command(installation_id):
+    """Rebuild the local issue-to-page index from the Notion database."""
+    with tenants.scope(tenant_for(installation_id)):
+        restored = rebuild_issue_index()
+    print(f"Indexed {restored} Notion pages")
+
+@app.cli.command('backfill')
+@click.argument('repo')
+@click.option('--installation-id', type=int, help='Installation of the GitHub App (looked up if omitted).')
+@click.option('--concurrency', type=int, default=BACKFILL_CONCURRENCY, show_default=True,
+              help='Issues synced at the same time.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and start from the first page.')
+def backfill_command(repo, installation_id, concurrency, restart):
+    """Send every open issue in REPO (owner/name) to Notion."""
+    if installation_id is None:
+        installation_id = find_installation_id(repo)
+    
+    def report(progress):
+        eta = 'unknown' if progress['eta'] is None else f"{progress['eta']}s"
+        print(f"{progress['processed']}/{progress['total']} issues, "
+              f"{progress['rate']} issues/sec, ETA {eta}")
+    
+    progress = run_backfill(repo, installation_id, concurrency=concurrency, restart=restart, report=report)
+    print(f"Done: {progress['processed']} issues, {progress['failed']} failed")
+
+@app.cli.command('replay-journal')
+@click.argument('url')
+@click.option('--journal-dir', default=lambda: WEBHOOK_JOURNAL_DIR or None, required=True,
+              help='Journal to read (defaults to WEBHOOK_JOURNAL_DIR).')
+@click.option('--speed', type=float, default=1.0, show_default=True,
+              help='Pacing relative to the recording; 0 sends as fast as possible.')
+@click.option('--concurrency', type=int, default=8, show_default=True, help='Deliveries in flight at once.')
+@click.option('--since', type=float, help='Only replay deliveries recorded at or after this Unix time.')
+@click.option('--until', type=float, help='Only replay deliveries recorded before this Unix time.')
+@click.option('--keep-delivery-ids', is_flag=True,
+              help='Send the recorded X-GitHub-Delivery ids, which a deduplicating server answers from memory.')
+def replay_journal_command(url, journal_dir, speed, concurrency, since, until, keep_delivery_ids):
+    """Re-sign the journaled deliveries with GITHUB_SECRET and send them to URL."""
+    with requests.Session() as session:
+        statuses = replay(
+            read_journal(journal_dir, since=since, until=until), url, GITHUB_SECRET, session,
+            speed=speed, concurrency=concurrency, new_delivery_ids=not keep_delivery_ids
+        )
+    print(f"Replayed {sum(statuses.values())} deliveries: " +
+          ', '.join(f"{count} x {status}" for status, count in sorted(statuses.items())))
+
+@app.cli.group('dead-letters')
+def dead_letters_cli():
+    """Inspect and replay jobs that ran out of retries."""
+
+@dead_letters_cli.command('list')
+@click.option('--kind', help='Only jobs of this kind (send, issue).')
+@click.option('--limit', type=int, default=50, show_default=True)
+def dead_letters_list(kind, limit):
+    """List failed jobs, newest first."""
+    for job in get_job_queue().list_jobs('failed', kind=kind, limit=limit):
+        failed_at = datetime.fromtimestamp(job.run_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{job.id}\t{job.kind}\t{job.payload.get('repo')}#{job.payload.get('issue_number')}\t"
+              f"stage={job.stage}\tattempts={job.attempts}\t{failed_at}\t{job.last_error}")
+
+@dead_letters_cli.command('show')
+@click.argument('job_id', type=int)
+def dead_letters_show(job_id):
+    """Print a job with its payload as JSON."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise click.ClickException(f"No job {job_id}")
+    print(json.dumps(job.to_dict(), indent=2))
+
+@dead_letters_cli.command('replay')
+@click.argument('job_ids', type=int, nargs=-1)
+@click.option('--all', 'replay_all', is_flag=True, help='Replay every failed job.')
+@click.option('--run', is_flag=True, help='Run the jobs that are due in this process instead of leaving them to the server.')
+def dead_letters_replay(job_ids, replay_all, run):
+    """Queue failed jobs again; they resume at the stage that failed."""
+    if not job_ids and not replay_all:
+        raise click.UsageError("Give job ids or --all")
+    queue = get_job_queue()
+    count = queue.requeue(None if replay_all else list(job_ids))
+    print(f"Requeued {count} jobs")
+    if run:
+        pool = QueueWorkerPool(queue, JOB_HANDLERS, logger, workers=0,
+                               max_attempts=QUEUE_MAX_ATTEMPTS, retry_delay=QUEUE_RETRY_DELAY)
+        while pool.run_once():
+            pass
+        stats = pool.stats()
+        print(f"Ran {stats['processed']} jobs, {stats['retried']} to be retried, {stats['failed']} failed again")
+
+@dead_letters_cli.command('purge')
+@click.argument('job_ids', type=int, nargs=-1)
+@click.option('--all', 'purge_all', is_flag=True, help='Delete every failed job.')
+@click.option('--older-than', type=float, help='Only jobs created more than this many hours ago.')
+def dead_letters_purge(job_ids, purge_all, older_than):
+    """Delete failed jobs."""
+    if not job_ids and not purge_all and older_than is None:
+        raise click.UsageError("Give job ids, --all or --older-than")
+    count = get_job_queue().purge(
+        list(job_ids) if job_ids else None,
+        older_than=older_than * 3600 if older_than is not None else None
+    )
+    print(f"Deleted {count} jobs")
+
+@app.cli.group('tenants')
+def tenants_cli():
+    """Manage the Notion workspace each GitHub App installation writes to."""
+
+@tenants_cli.command('list')
+def tenants_list():
+    """List the installations with their own Notion settings."""
+    for tenant in get_tenants().all():
+        renamed = {field: name for field, name in tenant.properties.items() if name != default_tenant.property(field)}
+        print(f"{tenant.installation_id}\t{tenant.notion_database_id}\t{json.dumps(renamed)}")
+
+@tenants_cli.command('set')
+@click.argument('installation_id', type=int)
+@click.option('--database-id', required=True, help='Notion database that gets the tickets.')
+@click.option('--notion-token', prompt=True, hide_input=True, envvar='TENANT_NOTION_TOKEN',
+              help='Notion integration token (prompted for if not given or in TENANT_NOTION_TOKEN).')
+@click.option('--property', 'renames', multiple=True, metavar='FIELD=NAME',
+              help=f'Notion property name for one of: {", ".join(tenants.PROPERTY_FIELDS)} (repeatable).')
+def tenants_set(installation_id, database_id, notion_token, renames):
+    """Add or replace the Notion settings of INSTALLATION_ID."""
+    properties = {}
+    for rename in renames:
+        field, _, name = rename.partition('=')
+        if field not in tenants.PROPERTY_FIELDS or not (name or field == 'labels'):
+            raise click.BadParameter(f"{rename!r} is not FIELD=NAME with FIELD one of "
+                                     f"{', '.join(tenants.PROPERTY_FIELDS)}", param_hint='--property')
+        properties[field] = name
+    get_tenants().store.save(installation_id, notion_token, database_id, properties)
+    print(f"Saved tenant {installation_id}")
+
+@tenants_cli.command('remove')
+@click.argument('installation_id', type=int)
+def tenants_remove(installation_id):
+    """Remove INSTALLATION_ID's settings; it falls back to the default workspace."""
+    if not get_tenants().store.remove(installation_id):
+        raise click.ClickException(f"No tenant {installation_id}")
+    print(f"Removed tenant {installation_id}")
+
+@app.cli.command('notion-sync')
+def notion_sync_command():
+    """Apply Notion Status changes since the last run to the linked GitHub issues."""
+    result = run_notion_sync()
+    print(f"{result['pages']} pages edited, {result['changed']} status changes, {result['failed']} failed")
+
+if NOTION_SYNC_INTERVAL > 0:
+    start_notion_sync()
 
 if __name__ == '__main__':
+    start_queue_workers()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
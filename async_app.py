@@ -0,0 +1,123 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+import app as gittion
+import metrics
+from webhook_body import BodyTooLarge
+
+logger = logging.getLogger(__name__)
+
+# Deliveries handled at once; the rest wait on the event loop, not in a worker
+ASYNC_MAX_INFLIGHT = int(os.environ.get('ASYNC_MAX_INFLIGHT', 256))
+
+EXECUTOR = web.AppKey('executor', ThreadPoolExecutor)
+
+
+def create_app(max_inflight=None):
+    """Build the aiohttp application serving the same /webhook, /health and /metrics as app.py.
+
+    Requests are accepted, verified and filtered on the event loop. The
+    handler for a command runs on a thread pool owned by the loop, so it
+    reuses the shared clients, rate limiters, token cache and stores of
+    app.py while the loop keeps accepting deliveries.
+    """
+    application = web.Application()
+    application[EXECUTOR] = ThreadPoolExecutor(
+        max_workers=max_inflight or ASYNC_MAX_INFLIGHT,
+        thread_name_prefix='webhook'
+    )
+    application.router.add_post('/webhook', webhook)
+    application.router.add_get('/health', health_check)
+    application.router.add_get('/metrics', metrics_endpoint)
+    application.on_cleanup.append(_shutdown_executor)
+    return application
+
+
+async def webhook(request):
+    """Handle GitHub webhook events"""
+    event = request.headers.get('X-GitHub-Event')
+    received_at = time.monotonic()
+    with metrics.in_flight.labels(kind='webhook').track_inprogress():
+        response = await receive_webhook(request, event, received_at)
+    gittion.count_delivery(event, response.status)
+    return response
+
+
+async def receive_webhook(request, event, received_at):
+    signature = request.headers.get('X-Hub-Signature-256')
+    rejected = gittion.reject_before_reading(signature, request.content_length)
+    if rejected is not None:
+        return web.json_response(rejected[0], status=rejected[1])
+
+    with gittion.new_webhook_body() as body:
+        try:
+            async for chunk in request.content.iter_chunked(gittion.WEBHOOK_CHUNK_SIZE):
+                body.update(chunk)
+        except BodyTooLarge:
+            return web.json_response(gittion.PAYLOAD_TOO_LARGE[0], status=gittion.PAYLOAD_TOO_LARGE[1])
+
+        # Verify the signature, journal and skip deliveries no handler would act on
+        screened = gittion.reject_unsigned(body, signature)
+        if screened is None:
+            if gittion.delivery_journal is not None:
+                # Compressing and writing a large body would hold up every other request on the loop
+                await asyncio.get_running_loop().run_in_executor(
+                    request.app[EXECUTOR], gittion.journal_delivery, request.headers, body
+                )
+            screened = gittion.skip_irrelevant(body, event)
+        if screened is not None:
+            return web.json_response(screened[0], status=screened[1])
+
+        try:
+            payload = gittion.parse_webhook_body(body)
+        except ValueError:
+            return web.json_response({"error": "Invalid JSON payload"}, status=400)
+
+    return await run_handler(
+        request.app, gittion.dispatch_event, event, payload,
+        delivery_id=request.headers.get('X-GitHub-Delivery'), received_at=received_at
+    )
+
+
+async def health_check(request):
+    """Health check endpoint for container orchestration"""
+    # Answered on the loop, so a probe doesn't wait behind deliveries for a thread
+    return web.json_response(gittion.health_status())
+
+
+async def metrics_endpoint(request):
+    """Prometheus metrics for this process"""
+    data, content_type = metrics.render()
+    # aiohttp wants the charset apart from the media type
+    media_type, _, charset = content_type.partition('; charset=')
+    return web.Response(body=data, content_type=media_type, charset=charset or None)
+
+
+async def run_handler(application, handler, *args, **kwargs):
+    """Run a Flask view or handler from app.py off the event loop and convert its response"""
+    loop = asyncio.get_running_loop()
+    body, status = await loop.run_in_executor(
+        application[EXECUTOR],
+        functools.partial(_call_in_app_context, handler, *args, **kwargs)
+    )
+    return web.json_response(body, status=status)
+
+
+def _call_in_app_context(handler, *args, **kwargs):
+    with gittion.app.app_context():
+        result = handler(*args, **kwargs)
+        response, status = result if isinstance(result, tuple) else (result, 200)
+        return response.get_json(), status
+
+
+async def _shutdown_executor(application):
+    application[EXECUTOR].shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    gittion.start_queue_workers()
+    web.run_app(create_app(), port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,95 @@
+"""Local stand-ins for the GitHub and Notion endpoints a `!send` delivery uses.
+
+The stubs answer after a configurable latency and can inject upstream
+errors and rate limiting, so the benchmark exercises the same retry and
+backoff paths as production.
+"""
+import uuid
+import random
+import asyncio
+import threading
+from collections import Counter
+from aiohttp import web
+
+DATABASE = {
+    "properties": {
+        "Task name": {"type": "title", "title": {}},
+        "Status": {"type": "status", "status": {"options": [{"name": "Icebox"}]}},
+        "GitHub Issue": {"type": "url", "url": {}},
+        "Repository": {"type": "rich_text", "rich_text": {}}
+    }
+}
+
+
+class StubUpstream:
+    """aiohttp server for `/github/...` and `/notion/...` with fault injection.
+
+    Each call waits `latency` seconds (plus up to `jitter`), then fails with
+    a 502 with probability `error_rate`, or answers 429 with `Retry-After:
+    retry_after` with probability `throttle_rate`. Calls and injected
+    faults are counted in `counts` until `reset()`.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Return the counts so far and start counting from zero"""
+        with self._lock:
+            counts, self.counts = dict(self.counts), Counter()
+        return counts
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    async def respond(self, upstream, status, body):
+        await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        self._count(f"{upstream}_calls")
+        roll = self._random.random()
+        if roll < self.error_rate:
+            self._count(f"{upstream}_errors")
+            return web.json_response({"message": "Injected upstream error"}, status=502)
+        if roll < self.error_rate + self.throttle_rate:
+            self._count(f"{upstream}_throttled")
+            return web.json_response(
+                {"message": "Injected rate limit"}, status=429,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        return web.json_response(body, status=status)
+
+    def application(self):
+        async def access_token(request):
+            return await self.respond('github', 201, {"token": "bench-token", "expires_at": "2099-01-01T00:00:00Z"})
+
+        async def comment(request):
+            return await self.respond('github', 201, {"id": 1})
+
+        async def database(request):
+            return await self.respond('notion', 200, DATABASE)
+
+        async def create_page(request):
+            return await self.respond('notion', 200, {"id": str(uuid.uuid4())})
+
+        application = web.Application()
+        application.router.add_post('/github/app/installations/{id}/access_tokens', access_token)
+        application.router.add_post('/github/repos/{owner}/{repo}/issues/{number}/comments', comment)
+        application.router.add_get('/notion/databases/{id}', database)
+        application.router.add_post('/notion/pages', create_page)
+        return application
+
+    def start(self, port, host='127.0.0.1'):
+        """Serve on a background thread with its own event loop"""
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(self.application())
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        return f"http://{host}:{port}"
@@ -0,0 +1,290 @@
+"""Measure webhook throughput and latency against local GitHub/Notion stubs.
+
+Starts stub GitHub and Notion APIs (see `stubs.py`), runs the real app
+under each server configuration against them and keeps a fixed number
+of signed `!send` deliveries in flight for a set time:
+
+    python bench/webhook_bench.py --config gunicorn:2x4 --config gunicorn:4x8 --config async \\
+        --duration 30 --concurrency 64 --latency 0.05 --output results.json
+
+Results are printed and, with --output, written as JSON. Pass an earlier
+results file as --baseline to fail when throughput or p99 latency
+regress by more than --tolerance.
+"""
+import os
+import re
+import sys
+import json
+import hmac
+import time
+import uuid
+import socket
+import asyncio
+import hashlib
+import argparse
+import itertools
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from aiohttp import ClientSession, ClientTimeout
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import StubUpstream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = 'bench-secret'
+CONFIG_PATTERN = re.compile(r'^(gunicorn)(?::(\d+)x(\d+))?$|^(async)$')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(config, port):
+    """Command line for a config such as `gunicorn:2x4` or `async`"""
+    match = CONFIG_PATTERN.match(config)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"Unknown server config {config!r}; use gunicorn:WORKERSxTHREADS or async")
+    if match.group(4):
+        return [sys.executable, 'async_app.py']
+    workers, threads = match.group(2) or '2', match.group(3) or '4'
+    return ['gunicorn', '--workers', workers, '--threads', threads, '--timeout', '120',
+            '--bind', f'127.0.0.1:{port}', 'app:app']
+
+
+def private_key_pem():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption()
+    ).decode()
+
+
+def delivery(number):
+    body = json.dumps({
+        "action": "created",
+        "comment": {"body": "@git-tion !send"},
+        "issue": {
+            "number": number,
+            "title": f"Benchmark issue {number}",
+            "body": "Benchmark body",
+            "html_url": f"https://github.com/bench/repo/issues/{number}"
+        },
+        "repository": {"full_name": "bench/repo"},
+        "installation": {"id": 1}
+    }).encode()
+    signature = 'sha256=' + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': 'issue_comment',
+        'X-GitHub-Delivery': str(uuid.uuid4()),
+        'X-Hub-Signature-256': signature
+    }
+
+
+async def fire(url, concurrency, duration, warmup, deliveries=None):
+    """Keep `concurrency` deliveries in flight for `warmup + duration` seconds.
+
+    With `deliveries` set, stop after that many instead. Only deliveries
+    started after the warmup are measured. Returns the sorted latencies of
+    the measured deliveries, their status counts and the measured time.
+    """
+    numbers = itertools.count(1)
+    latencies = []
+    statuses = {}
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def worker(session):
+        while True:
+            number = next(numbers)
+            if deliveries is not None and number > deliveries:
+                return
+            now = time.monotonic()
+            if deliveries is None and now >= stop_at:
+                return
+            body, headers = delivery(number)
+            try:
+                async with session.post(url, data=body, headers=headers) as response:
+                    await response.read()
+                    status = str(response.status)
+            except Exception as e:
+                status = type(e).__name__
+            if now >= measure_from:
+                latencies.append(time.monotonic() - now)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    async with ClientSession(timeout=ClientTimeout(total=300)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return sorted(latencies), statuses, time.monotonic() - max(measure_from, started)
+
+
+def wait_until_listening(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def percentile(latencies, p):
+    if not latencies:
+        return None
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+
+def run_config(config, args, stub, upstream_url, pem):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        GITHUB_SECRET=SECRET,
+        GITHUB_APP_ID='1',
+        GITHUB_PRIVATE_KEY=pem,
+        NOTION_TOKEN='bench-token',
+        NOTION_DATABASE_ID='bench-database',
+        GITHUB_API_URL=f'{upstream_url}/github',
+        NOTION_API_URL=f'{upstream_url}/notion',
+        # Measure the server, not the Notion rate limit
+        NOTION_RATE_LIMIT='100000',
+        NOTION_BURST='100000',
+        GITHUB_POOL_SIZE=str(args.concurrency),
+        NOTION_POOL_SIZE=str(args.concurrency),
+        GITHUB_MAX_CONCURRENT=str(args.concurrency),
+        NOTION_MAX_CONCURRENT=str(args.concurrency),
+        DATA_DIR=tempfile.mkdtemp(prefix='gittion-bench-'),
+        PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix='gittion-bench-metrics-')
+    )
+    server = subprocess.Popen(server_command(config, port), cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_listening(port)
+        stub.reset()
+        latencies, statuses, elapsed = asyncio.run(fire(
+            f'http://127.0.0.1:{port}/webhook', args.concurrency, args.duration, args.warmup, args.deliveries
+        ))
+        upstream = stub.reset()
+    finally:
+        server.terminate()
+        server.wait()
+
+    measured = len(latencies)
+    ok = sum(count for status, count in statuses.items() if status in ('200', '202'))
+    return {
+        "deliveries": measured,
+        "throughput": round(ok / elapsed, 2) if elapsed > 0 else 0.0,
+        "error_rate": round((measured - ok) / measured, 4) if measured else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else None,
+        "statuses": statuses,
+        "upstream": upstream
+    }
+
+
+def print_result(config, result):
+    def ms(value):
+        return f"{value * 1000:6.0f}ms" if value is not None else "     n/a"
+    print(f"{config:>14}: {result['throughput']:7.1f} deliveries/s  p50 {ms(result['p50'])}  "
+          f"p95 {ms(result['p95'])}  p99 {ms(result['p99'])}  max {ms(result['max'])}  "
+          f"errors {result['error_rate']:.1%}")
+
+
+def compare(baseline, results, tolerance):
+    """Regressions of `results` against an earlier results document, as messages"""
+    regressions = []
+    for config, result in results.items():
+        before = baseline.get("results", {}).get(config)
+        if before is None:
+            continue
+        if before["throughput"] and result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{config}: throughput {result['throughput']:.1f}/s, was {before['throughput']:.1f}/s"
+            )
+        if before["p99"] and result["p99"] and result["p99"] > before["p99"] * (1 + tolerance):
+            regressions.append(
+                f"{config}: p99 {result['p99'] * 1000:.0f}ms, was {before['p99'] * 1000:.0f}ms"
+            )
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', action='append',
+                        help='Server to run: gunicorn:WORKERSxTHREADS or async (repeatable; default gunicorn:2x4 and async)')
+    parser.add_argument('--concurrency', type=int, default=64, help='Deliveries kept in flight')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds measured per config')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds run before measuring')
+    parser.add_argument('--deliveries', type=int, help='Send this many deliveries instead of running for --duration')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds each stub API call takes')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency of up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of stub calls answered with a 502')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of stub calls answered with a 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After sent with injected 429s')
+    parser.add_argument('--seed', type=int, help='Seed for the injected faults')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed regression as a fraction')
+    args = parser.parse_args()
+    if args.deliveries is not None:
+        args.warmup = 0
+    configs = args.config or ['gunicorn:2x4', 'async']
+    for config in configs:
+        server_command(config, 0)
+
+    stub = StubUpstream(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after, args.seed)
+    upstream_url = stub.start(free_port())
+    pem = private_key_pem()
+
+    results = {}
+    for config in configs:
+        results[config] = run_config(config, args, stub, upstream_url, pem)
+        print_result(config, results[config])
+
+    document = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            key: getattr(args, key) for key in (
+                'concurrency', 'duration', 'warmup', 'deliveries', 'latency', 'jitter',
+                'error_rate', 'throttle_rate', 'retry_after', 'seed'
+            )
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != document["settings"]:
+            print("Warning: baseline was run with different settings", file=sys.stderr)
+        regressions = compare(baseline, results, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+import deadline
+
+
+class ApiClient:
+    """Keep-alive HTTP client for one upstream API, shared by all threads.
+
+    Requests go through a single `requests.Session` whose urllib3 pool keeps
+    up to `pool_size` connections to the upstream open between webhooks, so
+    a delivery doesn't pay for a new TCP and TLS handshake on every call.
+
+    An optional `limiter` (see `ratelimit`) is consulted around every
+    request: `before_request(rate_key, urgent, deadline)` may sleep or
+    raise, and
+    `after_response(rate_key, response)` returns True when a rate-limited
+    response should be retried, up to `max_retries` times.
+
+    An optional `observer` (see `metrics`) is told about every request sent:
+    `before_request()` and then `after_response(method, response, elapsed)`,
+    with `response` None when the request failed.
+
+    An optional `guard(method, url)` returns the `resilience.Dependency`
+    whose circuit breaker and bulkhead a request goes through, or None.
+
+    Inside a `deadline.scope` every attempt's timeout is cut to the time
+    left, and an attempt with no time left raises DeadlineExceeded. The
+    limiter gets the deadline too, so it raises rather than sleeping past it.
+    """
+
+    def __init__(self, base_url, headers=None, pool_size=10, timeout=(5, 30), limiter=None, max_retries=3,
+                 observer=None, guard=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.observer = observer
+        self.guard = guard
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        # The APIs don't use cookies; refusing them keeps the shared jar read-only across threads
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url(self, path):
+        """Resolve a path against the base URL; absolute URLs are left alone"""
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, rate_key=None, urgent=True, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url(path)
+        if self.limiter is None:
+            return self._send(method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            self.limiter.before_request(rate_key, urgent, deadline.current())
+            response = self._send(method, url, **kwargs)
+            if not self.limiter.after_response(rate_key, response) or attempt >= self.max_retries:
+                return response
+            attempt += 1
+
+    def _send(self, method, url, **kwargs):
+        budget = deadline.current()
+        if budget is not None:
+            deadline.check(f"{method} {url}")
+            kwargs['timeout'] = budget.clip(kwargs['timeout'])
+        dependency = self.guard(method, url) if self.guard is not None else None
+        if dependency is not None:
+            return dependency.call(lambda: self._observed(method, url, **kwargs))
+        return self._observed(method, url, **kwargs)
+
+    def _observed(self, method, url, **kwargs):
+        if self.observer is None:
+            return self.session.request(method, url, **kwargs)
+        self.observer.before_request()
+        started = time.monotonic()
+        response = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            return response
+        finally:
+            self.observer.after_response(method, response, time.monotonic() - started)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,99 @@
+import re
+from notion_blocks import iter_lines, CODE_FENCE, QUOTE
+
+INLINE_CODE = re.compile(r'`[^`\n]*`')
+COMMAND_NAME = re.compile(r'!([a-z][a-z-]*)')
+
+
+class Command:
+    """A command found in a comment: `@git-tion !name arg key=value`"""
+
+    def __init__(self, name, args=(), options=None):
+        self.name = name
+        self.args = list(args)
+        self.options = dict(options or {})
+
+    @property
+    def text(self):
+        """The positional arguments as one string, e.g. a multi-word status"""
+        return ' '.join(self.args)
+
+    def __eq__(self, other):
+        return isinstance(other, Command) and \
+            (self.name, self.args, self.options) == (other.name, other.args, other.options)
+
+    def __repr__(self):
+        return f"Command({self.name!r}, args={self.args!r}, options={self.options!r})"
+
+
+def parse_commands(body, mention):
+    """Extract every command addressed to `mention` from a comment in one pass.
+
+    Fenced code blocks, quoted lines and inline code are skipped, so
+    commands that are only shown or quoted don't run. A command's
+    arguments run to the end of the line or the next mention.
+    """
+    commands = []
+    fence = None
+    for line in iter_lines(body or ''):
+        fence_match = CODE_FENCE.match(line)
+        if fence is not None:
+            if fence_match and fence_match.group(1) == fence:
+                fence = None
+            continue
+        if fence_match:
+            fence = fence_match.group(1)
+            continue
+        if mention not in line or QUOTE.match(line):
+            continue
+        line = INLINE_CODE.sub('', line)
+        for segment in line.split(mention)[1:]:
+            command = _parse_segment(segment)
+            if command is not None:
+                commands.append(command)
+    return commands
+
+
+def _parse_segment(segment):
+    tokens = segment.split()
+    if not tokens:
+        return None
+    match = COMMAND_NAME.fullmatch(tokens[0])
+    if match is None:
+        return None
+    args, options = [], {}
+    for token in tokens[1:]:
+        key, sep, value = token.partition('=')
+        if sep and key:
+            options[key.lower()] = value
+        else:
+            args.append(token)
+    return Command(match.group(1), args, options)
+
+
+class CommandRegistry:
+    """Table of the commands the bot understands.
+
+    Handlers are registered with the `command` decorator and looked up by
+    name, so adding a command doesn't add another scan of the comment.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def command(self, name, usage=''):
+        def register(handler):
+            self._handlers[name] = (handler, usage)
+            return handler
+        return register
+
+    def __contains__(self, name):
+        return name in self._handlers
+
+    def dispatch(self, command, *args, **kwargs):
+        handler, _ = self._handlers[command.name]
+        return handler(command, *args, **kwargs)
+
+    def usage(self):
+        """Name and usage of each registered command, in registration order"""
+        return [(name, usage) for name, (_, usage) in self._handlers.items()]
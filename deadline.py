@@ -0,0 +1,112 @@
+import time
+import threading
+from contextlib import contextmanager
+import metrics
+
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a delivery's budget can't cover the next stage or request"""
+
+    def __init__(self, stage, remaining):
+        super().__init__(f"{remaining:.2f}s left of the delivery budget, not enough for {stage}")
+        self.stage = stage
+        self.remaining = remaining
+
+
+class Deadline:
+    """Time budget for handling one delivery.
+
+    `started` is a `time.monotonic()` reading, so the budget can be counted
+    from when the request arrived rather than from when a thread got to it.
+    """
+
+    def __init__(self, budget, started=None):
+        self.budget = budget
+        self.started = time.monotonic() if started is None else started
+        self.spent = {}
+        # The stage that was cut short or couldn't start
+        self.interrupted = None
+
+    def remaining(self):
+        return self.budget - (time.monotonic() - self.started)
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check_wait(self, seconds, name):
+        """Raise DeadlineExceeded if sleeping `seconds` before `name` would use up the budget"""
+        remaining = self.remaining()
+        if seconds >= remaining:
+            raise DeadlineExceeded(name, remaining)
+
+    def clip(self, timeout):
+        """Shorten a requests timeout, a number or (connect, read), to the time left"""
+        remaining = max(0.001, self.remaining())
+        if isinstance(timeout, tuple):
+            return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+def current():
+    """The deadline of the delivery being handled on this thread, if any"""
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def scope(budget, started=None):
+    """Run the enclosed block under a deadline of `budget` seconds.
+
+    Nested scopes keep the outer deadline, so a server can start the clock
+    when a request arrives and handlers can still ask for one. A budget of
+    0 runs without a deadline.
+    """
+    if budget <= 0 or current() is not None:
+        yield current()
+        return
+    deadline = Deadline(budget, started)
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = None
+        used = time.monotonic() - deadline.started
+        metrics.deadline_budget_used.labels(stage='total').observe(used / budget)
+
+
+@contextmanager
+def stage(name, minimum=0):
+    """Run a stage of the current delivery's work, if at least `minimum` seconds are left.
+
+    Raises DeadlineExceeded before starting when they aren't. The share of
+    the budget the stage used is recorded. Without a deadline, as on the
+    queue workers, the stage just runs.
+    """
+    deadline = current()
+    if deadline is None:
+        yield
+        return
+    remaining = deadline.remaining()
+    if remaining <= 0 or remaining < minimum:
+        deadline.interrupted = name
+        raise DeadlineExceeded(name, remaining)
+    started = time.monotonic()
+    try:
+        yield
+    except Exception as e:
+        if deadline.interrupted is None and (deadline.expired or isinstance(e, DeadlineExceeded)):
+            deadline.interrupted = name
+        raise
+    finally:
+        used = time.monotonic() - started
+        deadline.spent[name] = deadline.spent.get(name, 0.0) + used
+        metrics.deadline_budget_used.labels(stage=name).observe(used / deadline.budget)
+
+
+def check(name):
+    """Raise DeadlineExceeded if the current delivery has no time left for `name`"""
+    deadline = current()
+    if deadline is not None and deadline.expired:
+        raise DeadlineExceeded(name, deadline.remaining())
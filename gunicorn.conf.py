@@ -0,0 +1,33 @@
+"""Gunicorn settings read from the working directory by `gunicorn app:app`.
+
+Every worker starts the job queue workers as soon as it boots, so jobs
+waiting for a retry, deferred work and replayed dead letters are picked up
+after a restart without waiting for a new delivery.
+
+Each worker keeps its own Prometheus samples; pointing them all at one
+directory lets /metrics on any worker report the totals for the server.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'gittion-prometheus')
+)
+
+
+def on_starting(server):
+    # Samples left by a previous run would otherwise be added to this one's
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    from app import start_queue_workers
+    start_queue_workers()
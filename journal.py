@@ -0,0 +1,222 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import zlib
+import heapq
+import struct
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Headers recorded with each delivery; the signature is recomputed on replay
+JOURNAL_HEADERS = (
+    'X-GitHub-Event',
+    'X-GitHub-Delivery',
+    'X-GitHub-Hook-ID',
+    'X-GitHub-Hook-Installation-Target-ID',
+    'X-GitHub-Hook-Installation-Target-Type',
+    'Content-Type',
+    'User-Agent'
+)
+
+# One index entry per record: wall-clock time, offset and length in the segment
+INDEX_ENTRY = struct.Struct('<dQI')
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+
+class JournalRecord:
+    """A delivery read back from the journal"""
+
+    def __init__(self, timestamp, headers, body):
+        self.timestamp = timestamp
+        self.headers = headers
+        self.body = body
+
+    def __lt__(self, other):
+        return self.timestamp < other.timestamp
+
+
+class DeliveryJournal:
+    """Append-only record of verified webhook deliveries.
+
+    Each record is the delivery's headers and body compressed with zlib,
+    appended to a segment file, with its offset in a fixed-size index file
+    next to it so any record can be read without scanning. Segments are
+    named after the writing process, so gunicorn workers never share a
+    file. A segment is closed once it passes `segment_size` bytes, and
+    only the newest `max_segments` are kept.
+    """
+
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, max_segments=32):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._segment = None
+        self._index = None
+        self._pid = None
+        self._sequence = 0
+        self._records = 0
+
+    def append(self, headers, chunks, timestamp=None):
+        """Record a delivery; `chunks` yields the body's bytes"""
+        meta = {name: headers[name] for name in JOURNAL_HEADERS if headers.get(name) is not None}
+        compressor = zlib.compressobj()
+        parts = [compressor.compress(json.dumps(meta).encode() + b'\n')]
+        parts.extend(compressor.compress(chunk) for chunk in chunks)
+        parts.append(compressor.flush())
+        data = b''.join(parts)
+        with self._lock:
+            segment, index = self._open()
+            offset = segment.tell()
+            segment.write(data)
+            segment.flush()
+            index.write(INDEX_ENTRY.pack(timestamp or time.time(), offset, len(data)))
+            index.flush()
+            self._records += 1
+            if segment.tell() >= self.segment_size:
+                self._close()
+
+    def _open(self):
+        # A forked worker starts its own segment instead of writing to its parent's
+        if self._segment is not None and self._pid == os.getpid():
+            return self._segment, self._index
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        name = f"{int(time.time() * 1000):015d}-{os.getpid()}-{self._sequence:06d}"
+        path = os.path.join(self.directory, name)
+        self._segment = open(path + SEGMENT_SUFFIX, 'ab')
+        self._index = open(path + INDEX_SUFFIX, 'ab')
+        self._pid = os.getpid()
+        self._prune()
+        return self._segment, self._index
+
+    def _close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = self._index = None
+
+    def _prune(self):
+        segments = list_segments(self.directory)
+        for name in segments[:max(0, len(segments) - self.max_segments)]:
+            for suffix in (SEGMENT_SUFFIX, INDEX_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        with self._lock:
+            return {"directory": self.directory, "records": self._records}
+
+
+def list_segments(directory):
+    """Segment names (without suffix), oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+class JournalSegment:
+    """Random access to the records of one segment through its index"""
+
+    def __init__(self, directory, name):
+        self.path = os.path.join(directory, name)
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path + INDEX_SUFFIX) // INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def entry(self, number):
+        with open(self.path + INDEX_SUFFIX, 'rb') as index:
+            index.seek(number * INDEX_ENTRY.size)
+            return INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+
+    def read(self, number):
+        """The `number`th record of the segment"""
+        timestamp, offset, length = self.entry(number)
+        with open(self.path + SEGMENT_SUFFIX, 'rb') as segment:
+            segment.seek(offset)
+            return decode_record(timestamp, segment.read(length))
+
+    def __iter__(self):
+        with open(self.path + INDEX_SUFFIX, 'rb') as index, open(self.path + SEGMENT_SUFFIX, 'rb') as segment:
+            while True:
+                entry = index.read(INDEX_ENTRY.size)
+                if len(entry) < INDEX_ENTRY.size:
+                    return
+                timestamp, offset, length = INDEX_ENTRY.unpack(entry)
+                segment.seek(offset)
+                yield decode_record(timestamp, segment.read(length))
+
+
+def decode_record(timestamp, data):
+    meta, _, body = zlib.decompress(data).partition(b'\n')
+    return JournalRecord(timestamp, json.loads(meta), body)
+
+
+def read_journal(directory, since=None, until=None):
+    """Every record in the journal in time order, merging the segments of all processes"""
+    segments = [iter(JournalSegment(directory, name)) for name in list_segments(directory)]
+    for record in heapq.merge(*segments):
+        if since is not None and record.timestamp < since:
+            continue
+        if until is not None and record.timestamp >= until:
+            return
+        yield record
+
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def replay(records, url, secret, session, speed=1.0, concurrency=8, new_delivery_ids=True, sleep=time.sleep):
+    """Re-sign and send recorded deliveries to `url`.
+
+    Deliveries keep the gaps between them divided by `speed`; a speed of 0
+    sends them as fast as `concurrency` allows. Responses only hold up
+    the pacing when all `concurrency` sends are waiting for theirs, which
+    also keeps the journal from being read ahead into memory. Returns a
+    count of the response statuses.
+    """
+    statuses = {}
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def send(record):
+        headers = dict(record.headers)
+        if new_delivery_ids:
+            headers['X-GitHub-Delivery'] = str(uuid.uuid4())
+        headers['X-Hub-Signature-256'] = sign(secret, record.body)
+        try:
+            status = str(session.post(url, data=record.body, headers=headers).status_code)
+        except Exception as e:
+            status = type(e).__name__
+        finally:
+            slots.release()
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    first = None
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            if first is None:
+                first = record.timestamp
+            if speed > 0:
+                delay = (record.timestamp - first) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    sleep(delay)
+            slots.acquire()
+            executor.submit(send, record)
+    return statuses
@@ -0,0 +1,115 @@
+import os
+import time
+import functools
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+)
+from prometheus_client import multiprocess
+import profiling
+
+# Set by gunicorn.conf.py; each worker then writes its samples to files there
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# Webhook work is dominated by network round trips of 50ms to a few seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+webhook_requests = Counter(
+    'gittion_webhook_requests_total',
+    'Webhook deliveries by event and outcome',
+    ['event', 'outcome']
+)
+webhook_filtered = Counter(
+    'gittion_webhook_filtered_total',
+    'Deliveries answered before parsing because no handler would act on them',
+    ['reason']
+)
+stage_duration = Histogram(
+    'gittion_stage_duration_seconds',
+    'Time spent in each stage of handling a delivery',
+    ['stage'],
+    buckets=LATENCY_BUCKETS
+)
+upstream_responses = Counter(
+    'gittion_upstream_responses_total',
+    'Responses from GitHub and Notion by status code (0 when no response arrived)',
+    ['upstream', 'method', 'status']
+)
+upstream_duration = Histogram(
+    'gittion_upstream_request_duration_seconds',
+    'Duration of single requests to GitHub and Notion',
+    ['upstream'],
+    buckets=LATENCY_BUCKETS
+)
+deadline_budget_used = Histogram(
+    'gittion_deadline_budget_used_ratio',
+    'Share of the delivery deadline used by each stage, and in total',
+    ['stage'],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2)
+)
+deferred_jobs = Counter(
+    'gittion_deferred_jobs_total',
+    'Deliveries whose remaining work was queued when their deadline ran out',
+    ['kind', 'stage']
+)
+in_flight = Gauge(
+    'gittion_in_flight',
+    'Webhook deliveries and upstream requests currently being handled',
+    ['kind'],
+    multiprocess_mode='livesum'
+)
+
+
+@contextmanager
+def stage(name):
+    """Record how long the enclosed block takes under `stage=name`.
+
+    The stage is also added to the delivery's timeline if it is being profiled.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.labels(stage=name).observe(elapsed)
+        profiling.record_span(name, started, elapsed)
+
+
+def timed(name):
+    """Decorator form of `stage` for functions that make up a whole stage"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class UpstreamObserver:
+    """ApiClient hook counting requests to one upstream by status and timing them"""
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self._in_flight = in_flight.labels(kind=upstream)
+        self._duration = upstream_duration.labels(upstream=upstream)
+
+    def before_request(self):
+        self._in_flight.inc()
+
+    def after_response(self, method, response, elapsed):
+        self._in_flight.dec()
+        self._duration.observe(elapsed)
+        status = response.status_code if response is not None else 0
+        upstream_responses.labels(upstream=self.upstream, method=method, status=str(status)).inc()
+        profiling.record_span(f"{self.upstream} {method}", time.perf_counter() - elapsed, elapsed, status=status)
+
+
+def render():
+    """The metrics of this process, or of every worker process under gunicorn"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,269 @@
+import re
+import json
+import hashlib
+from itertools import islice
+
+# Notion API limits
+MAX_TEXT_LENGTH = 2000
+MAX_RICH_TEXT_ITEMS = 100
+MAX_CHILDREN = 100
+
+CODE_FENCE = re.compile(r'^\s*(```|~~~)\s*([\w+#.-]*)')
+HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+TODO_ITEM = re.compile(r'^\s*[-*+]\s+\[([ xX])\]\s+(.*)$')
+BULLETED_ITEM = re.compile(r'^\s*[-*+]\s+(.*)$')
+NUMBERED_ITEM = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+QUOTE = re.compile(r'^\s*>\s?(.*)$')
+DIVIDER = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+INLINE = re.compile(
+    r'\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)\s]+)\)'
+    r'|`(?P<code>[^`]+)`'
+    r'|\*\*(?P<bold>[^*]+)\*\*'
+    r'|__(?P<bold_alt>[^_]+)__'
+    r'|\*(?P<italic>[^*\s][^*]*)\*'
+    r'|~~(?P<strike>[^~]+)~~'
+)
+
+# Languages Notion accepts for code blocks, keyed by common Markdown aliases
+CODE_LANGUAGES = {
+    'bash': 'bash', 'sh': 'shell', 'shell': 'shell', 'console': 'shell', 'c': 'c', 'cpp': 'c++',
+    'c++': 'c++', 'cs': 'c#', 'csharp': 'c#', 'css': 'css', 'diff': 'diff', 'dockerfile': 'docker',
+    'docker': 'docker', 'go': 'go', 'graphql': 'graphql', 'html': 'html', 'java': 'java',
+    'javascript': 'javascript', 'js': 'javascript', 'json': 'json', 'kotlin': 'kotlin',
+    'makefile': 'makefile', 'markdown': 'markdown', 'md': 'markdown', 'php': 'php',
+    'powershell': 'powershell', 'python': 'python', 'py': 'python', 'ruby': 'ruby', 'rb': 'ruby',
+    'rust': 'rust', 'rs': 'rust', 'scala': 'scala', 'sql': 'sql', 'swift': 'swift', 'toml': 'toml',
+    'ts': 'typescript', 'typescript': 'typescript', 'xml': 'xml', 'yaml': 'yaml', 'yml': 'yaml'
+}
+
+
+def iter_lines(text):
+    """Yield the lines of a string without building a list of all of them"""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find('\n', start)
+        if end == -1:
+            end = length
+        yield text[start:end].rstrip('\r')
+        start = end + 1
+
+
+def rich_text(text):
+    """Convert inline Markdown to Notion rich text, splitting at the 2000 character limit"""
+    elements = []
+    position = 0
+    for match in INLINE.finditer(text):
+        if match.start() > position:
+            elements.extend(_text_elements(text[position:match.start()]))
+        if match.group('link_text') is not None:
+            elements.extend(_text_elements(match.group('link_text'), link=match.group('link_url')))
+        elif match.group('code') is not None:
+            elements.extend(_text_elements(match.group('code'), code=True))
+        elif match.group('bold') is not None or match.group('bold_alt') is not None:
+            elements.extend(_text_elements(match.group('bold') or match.group('bold_alt'), bold=True))
+        elif match.group('italic') is not None:
+            elements.extend(_text_elements(match.group('italic'), italic=True))
+        else:
+            elements.extend(_text_elements(match.group('strike'), strikethrough=True))
+        position = match.end()
+    if position < len(text):
+        elements.extend(_text_elements(text[position:]))
+    return elements
+
+
+def _text_elements(content, link=None, **annotations):
+    for start in range(0, len(content), MAX_TEXT_LENGTH):
+        element = {
+            "type": "text",
+            "text": {"content": content[start:start + MAX_TEXT_LENGTH]}
+        }
+        if link and link.startswith(('http://', 'https://')):
+            element["text"]["link"] = {"url": link}
+        if annotations:
+            element["annotations"] = annotations
+        yield element
+
+
+def text_blocks(block_type, text, **extra):
+    """Yield blocks of one type, starting a new block every 100 rich text items"""
+    elements = rich_text(text) if text else []
+    if not elements:
+        elements = [{"type": "text", "text": {"content": ""}}]
+    for start in range(0, len(elements), MAX_RICH_TEXT_ITEMS):
+        yield {
+            "object": "block",
+            "type": block_type,
+            block_type: {"rich_text": elements[start:start + MAX_RICH_TEXT_ITEMS], **extra}
+        }
+
+
+def _code_block(code, language):
+    return {
+        "object": "block",
+        "type": "code",
+        "code": {
+            "rich_text": [{"type": "text", "text": {"content": code}}],
+            "language": language
+        }
+    }
+
+
+def markdown_to_blocks(lines):
+    """Convert Markdown lines to Notion blocks, one block at a time.
+
+    Only the current paragraph, quote or code chunk is buffered, and it is
+    flushed before it passes the 2000 character text limit, so memory use
+    doesn't grow with the size of the document.
+    """
+    paragraph = []
+    paragraph_length = 0
+    quote = []
+    quote_length = 0
+    code = None
+    code_length = 0
+    code_emitted = False
+    fence = None
+    language = 'plain text'
+
+    def flush_paragraph():
+        nonlocal paragraph, paragraph_length
+        blocks = list(text_blocks('paragraph', '\n'.join(paragraph))) if paragraph else []
+        paragraph, paragraph_length = [], 0
+        return blocks
+
+    def flush_quote():
+        nonlocal quote, quote_length
+        blocks = list(text_blocks('quote', '\n'.join(quote))) if quote else []
+        quote, quote_length = [], 0
+        return blocks
+
+    for line in lines:
+        if code is not None:
+            if line.strip().startswith(fence):
+                if code or not code_emitted:
+                    yield _code_block('\n'.join(code), language)
+                code, fence = None, None
+                continue
+            # Start another code block rather than pass the text limit
+            if code and code_length + len(line) + 1 > MAX_TEXT_LENGTH:
+                yield _code_block('\n'.join(code), language)
+                code, code_length, code_emitted = [], 0, True
+            while len(line) > MAX_TEXT_LENGTH:
+                yield _code_block(line[:MAX_TEXT_LENGTH], language)
+                line = line[MAX_TEXT_LENGTH:]
+                code_emitted = True
+            code.append(line)
+            code_length += len(line) + 1
+            continue
+
+        fence_match = CODE_FENCE.match(line)
+        if fence_match:
+            yield from flush_paragraph()
+            yield from flush_quote()
+            fence = fence_match.group(1)
+            language = CODE_LANGUAGES.get(fence_match.group(2).lower(), 'plain text')
+            code, code_length, code_emitted = [], 0, False
+            continue
+
+        quote_match = QUOTE.match(line)
+        if quote_match:
+            yield from flush_paragraph()
+            if quote_length + len(quote_match.group(1)) > MAX_TEXT_LENGTH:
+                yield from flush_quote()
+            quote.append(quote_match.group(1))
+            quote_length += len(quote_match.group(1)) + 1
+            continue
+        yield from flush_quote()
+
+        if not line.strip():
+            yield from flush_paragraph()
+            continue
+
+        heading_match = HEADING.match(line)
+        divider_match = DIVIDER.match(line)
+        todo_match = TODO_ITEM.match(line)
+        bulleted_match = BULLETED_ITEM.match(line)
+        numbered_match = NUMBERED_ITEM.match(line)
+
+        if heading_match:
+            yield from flush_paragraph()
+            level = min(len(heading_match.group(1)), 3)
+            yield from text_blocks(f'heading_{level}', heading_match.group(2))
+        elif divider_match:
+            yield from flush_paragraph()
+            yield {"object": "block", "type": "divider", "divider": {}}
+        elif todo_match:
+            yield from flush_paragraph()
+            yield from text_blocks('to_do', todo_match.group(2), checked=todo_match.group(1) != ' ')
+        elif bulleted_match:
+            yield from flush_paragraph()
+            yield from text_blocks('bulleted_list_item', bulleted_match.group(1))
+        elif numbered_match:
+            yield from flush_paragraph()
+            yield from text_blocks('numbered_list_item', numbered_match.group(1))
+        else:
+            if paragraph_length + len(line) > MAX_TEXT_LENGTH:
+                yield from flush_paragraph()
+            paragraph.append(line)
+            paragraph_length += len(line) + 1
+
+    if code:
+        # Unterminated fence: keep what we have
+        yield _code_block('\n'.join(code), language)
+    yield from flush_quote()
+    yield from flush_paragraph()
+
+
+def batched(blocks, size=MAX_CHILDREN):
+    """Group blocks into lists of at most `size` for the children endpoints"""
+    iterator = iter(blocks)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def block_hash(value):
+    """Stable hash of a block or property value, for telling what changed"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+class BlockDiff:
+    """The edits that turn the blocks on a page into a new list of blocks.
+
+    Blocks at the start and end that didn't change are kept. In the part
+    that changed, blocks are updated in place while their types line up;
+    the rest of the old blocks are deleted and the rest of the new ones
+    inserted after `after`.
+    """
+
+    def __init__(self, old, new):
+        hashes = [block_hash(block) for block in new]
+        limit = min(len(old), len(new))
+        prefix = 0
+        while prefix < limit and old[prefix][1] == hashes[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[len(old) - 1 - suffix][1] == hashes[len(new) - 1 - suffix]:
+            suffix += 1
+
+        old_middle = old[prefix:len(old) - suffix]
+        new_middle = new[prefix:len(new) - suffix]
+        updated = 0
+        while updated < min(len(old_middle), len(new_middle)) and \
+                old_middle[updated][2] == new_middle[updated]['type']:
+            updated += 1
+
+        self.kept_before = [block_id for block_id, _, _ in old[:prefix]]
+        self.kept_after = [block_id for block_id, _, _ in old[len(old) - suffix:]]
+        self.updates = [(old_middle[i][0], new_middle[i]) for i in range(updated)]
+        self.deletes = [block_id for block_id, _, _ in old_middle[updated:]]
+        self.inserts = new_middle[updated:]
+        anchors = self.kept_before + [block_id for block_id, _ in self.updates]
+        self.after = anchors[-1] if anchors else None
+
+    @property
+    def empty(self):
+        return not (self.updates or self.deletes or self.inserts)
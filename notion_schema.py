@@ -0,0 +1,83 @@
+import threading
+import time
+
+
+class SchemaError(Exception):
+    """Raised when a page payload doesn't match the Notion database schema"""
+
+
+class NotionSchema:
+    """Lazily fetched, TTL-cached properties of a Notion database.
+
+    Payloads are checked against the cached schema before they are sent.
+    A mismatch triggers one refresh (at most once per `min_refresh_interval`)
+    in case the cache is stale; if the payload still doesn't fit, it fails
+    locally instead of costing a failed write.
+    """
+
+    # Property types whose option has to exist already; Notion creates select options on write
+    OPTION_TYPES = ('status',)
+
+    def __init__(self, fetch, ttl=300, min_refresh_interval=30):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._properties = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.rejected = 0
+
+    def properties(self, refresh=False):
+        """Return the database properties, fetching them if the cache is empty or expired"""
+        with self._lock:
+            now = time.monotonic()
+            expired = now - self._fetched_at > self.ttl
+            if self._properties is None or expired or (
+                    refresh and now - self._fetched_at > self.min_refresh_interval):
+                self._properties = self._fetch()
+                self._fetched_at = now
+                self.refreshes += 1
+            return self._properties
+
+    def invalidate(self):
+        with self._lock:
+            self._properties = None
+
+    def problems(self, payload, properties):
+        """List the ways a page `properties` payload doesn't fit the schema"""
+        problems = []
+        for name, value in payload.items():
+            prop = properties.get(name)
+            if prop is None:
+                problems.append(f"property '{name}' does not exist")
+                continue
+            value_type = next(iter(value), None)
+            if prop.get('type') != value_type:
+                problems.append(f"property '{name}' is a {prop.get('type')}, not a {value_type}")
+                continue
+            if value_type in self.OPTION_TYPES and value[value_type]:
+                option = value[value_type].get('name')
+                options = [o.get('name') for o in prop.get(value_type, {}).get('options', [])]
+                if option not in options:
+                    problems.append(f"'{option}' is not an option of property '{name}'")
+        return problems
+
+    def validate(self, payload):
+        """Raise SchemaError if the payload doesn't fit, after refreshing a stale schema once"""
+        problems = self.problems(payload, self.properties())
+        if problems:
+            problems = self.problems(payload, self.properties(refresh=True))
+        if problems:
+            with self._lock:
+                self.rejected += 1
+            raise SchemaError("Notion database schema mismatch: " + "; ".join(problems))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached": self._properties is not None,
+                "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._properties is not None else None,
+                "refreshes": self.refreshes,
+                "rejected": self.rejected
+            }
@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+import json
+import time
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Frames kept per sample; deeper stacks are cut at the root end
+MAX_STACK_DEPTH = 64
+
+_local = threading.local()
+
+
+def current_trace():
+    """The trace of the delivery being handled on this thread, if it is profiled"""
+    return getattr(_local, 'trace', None)
+
+
+def record_span(name, started, elapsed, **attributes):
+    """Add a span to the current delivery's timeline; a no-op when it isn't profiled.
+
+    `started` is a `time.perf_counter()` reading.
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.add_span(name, started, elapsed, attributes)
+
+
+class DeliveryTrace:
+    """Span timeline and stack samples collected for one delivery"""
+
+    def __init__(self, delivery_id, event, sampled):
+        self.delivery_id = delivery_id
+        self.event = event
+        self.sampled = sampled
+        self.thread_id = threading.get_ident()
+        self.wall_started = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.stacks = Counter()
+        self.samples = 0
+
+    def add_span(self, name, started, elapsed, attributes):
+        span = {"name": name, "start": round(started - self.started, 6), "duration": round(elapsed, 6)}
+        span.update(attributes)
+        self.spans.append(span)
+
+    def add_sample(self, stack):
+        self.stacks[stack] += 1
+        self.samples += 1
+
+    def to_dict(self, reason):
+        return {
+            "delivery_id": self.delivery_id,
+            "event": self.event,
+            "reason": reason,
+            "started": self.wall_started,
+            "duration": round(self.duration, 6),
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+            "samples": self.samples,
+            # Collapsed stacks ("root;...;leaf": count), the input format of flame graph tools
+            "stacks": dict(self.stacks.most_common())
+        }
+
+
+class DeliveryProfiler:
+    """Opt-in stack sampling and span timelines for webhook deliveries.
+
+    Every `sample_rate`-th delivery is profiled, and with a `slow_threshold`
+    every delivery is sampled but only kept if it took longer than that.
+    One sampler thread reads the stacks of the threads handling profiled
+    deliveries every `interval` seconds, so the handlers themselves run
+    unmodified. Each kept delivery is written to `directory` as JSON, and
+    only the newest `keep` files are kept.
+
+    With a `settings_path`, `configure` saves the triggers there and every
+    process using the same file picks them up within `reload_interval`
+    seconds, so one admin request reaches all server workers. A saved file
+    overrides the triggers given here.
+
+    With both triggers off, `trace` is a flag check, plus a clock read when
+    settings are shared, and nothing else.
+    """
+
+    def __init__(self, directory, sample_rate=0, slow_threshold=0, interval=0.005, keep=200,
+                 settings_path=None, reload_interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.settings_path = settings_path
+        self.reload_interval = reload_interval
+        self._settings_mtime = None
+        self._next_reload = 0.0
+        self._lock = threading.Lock()
+        self._active = {}
+        self._sampler = None
+        self._counter = itertools.count(1)
+        self._written = 0
+        self._discarded = 0
+        self.sample_rate, self.slow_threshold = 0, 0.0
+        self._apply(sample_rate, slow_threshold)
+        self._reload()
+
+    def configure(self, sample_rate=None, slow_threshold=None):
+        """Change the triggers at runtime; None leaves a setting as it is"""
+        self._apply(sample_rate, slow_threshold)
+        if self.settings_path is not None:
+            os.makedirs(os.path.dirname(self.settings_path) or '.', exist_ok=True)
+            with open(self.settings_path + '.tmp', 'w') as f:
+                json.dump({"sample_rate": self.sample_rate, "slow_threshold": self.slow_threshold}, f)
+            os.replace(self.settings_path + '.tmp', self.settings_path)
+            self._settings_mtime = os.stat(self.settings_path).st_mtime_ns
+
+    def _apply(self, sample_rate, slow_threshold):
+        sample_rate = self.sample_rate if sample_rate is None else max(0, int(sample_rate))
+        slow_threshold = self.slow_threshold if slow_threshold is None else max(0.0, float(slow_threshold))
+        self.sample_rate, self.slow_threshold = sample_rate, slow_threshold
+
+    def _reload(self):
+        """Pick up triggers another process saved to the settings file"""
+        if self.settings_path is None:
+            return
+        try:
+            mtime = os.stat(self.settings_path).st_mtime_ns
+            if mtime == self._settings_mtime:
+                return
+            with open(self.settings_path) as f:
+                settings = json.load(f)
+            self._apply(settings.get('sample_rate'), settings.get('slow_threshold'))
+            self._settings_mtime = mtime
+        except (TypeError, OSError, ValueError):
+            # No file yet, or an unreadable one; keep the current triggers
+            pass
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.slow_threshold > 0
+
+    @contextmanager
+    def trace(self, delivery_id, event=None):
+        """Profile the enclosed handling of a delivery if a trigger selects it.
+
+        Nested calls on the same thread join the outer trace, so a server
+        can start tracing before the body is read and handlers can still
+        ask for one.
+        """
+        if self.settings_path is not None:
+            now = time.monotonic()
+            if now >= self._next_reload:
+                self._next_reload = now + self.reload_interval
+                self._reload()
+        if not self.enabled or getattr(_local, 'trace', None) is not None:
+            yield getattr(_local, 'trace', None)
+            return
+        sampled = self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0
+        if not sampled and self.slow_threshold <= 0:
+            yield None
+            return
+
+        trace = DeliveryTrace(delivery_id or 'unknown', event, sampled)
+        _local.trace = trace
+        self._register(trace)
+        try:
+            yield trace
+        finally:
+            trace.duration = time.perf_counter() - trace.started
+            _local.trace = None
+            self._unregister(trace)
+            self._finish(trace)
+
+    def _register(self, trace):
+        with self._lock:
+            self._active[trace.thread_id] = trace
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='delivery-profiler', daemon=True)
+                self._sampler.start()
+
+    def _unregister(self, trace):
+        with self._lock:
+            self._active.pop(trace.thread_id, None)
+
+    def _sample(self):
+        """Sampler thread; exits once no delivery is being profiled"""
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for thread_id, trace in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    trace.add_sample(collapse_stack(frame))
+
+    def _finish(self, trace):
+        if trace.sampled:
+            reason = 'sampled'
+        elif trace.duration >= self.slow_threshold:
+            reason = 'slow'
+        else:
+            with self._lock:
+                self._discarded += 1
+            return
+        self._write(trace.to_dict(reason))
+
+    def _write(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(profile['started'] * 1000)}-{safe_name(profile['delivery_id'])}.json"
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(profile, f)
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            self._written += 1
+            self._rotate()
+
+    def _rotate(self):
+        profiles = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in profiles[:max(0, len(profiles) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "slow_threshold": self.slow_threshold,
+                "active": len(self._active),
+                "written": self._written,
+                "discarded": self._discarded,
+                "directory": self.directory,
+                "pid": os.getpid()
+            }
+
+
+def collapse_stack(frame):
+    """`module:function` names from the root of the stack to `frame`, joined by ';'"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def safe_name(value):
+    """A delivery id made safe to use in a file name"""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', str(value))[:64]
@@ -0,0 +1,229 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class RateLimitExceeded(Exception):
+    """Raised instead of waiting when a rate limit won't reset soon enough"""
+
+
+def parse_retry_after(headers, default=1.0):
+    """Read a Retry-After header (seconds or HTTP date) as a delay in seconds"""
+    value = headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """Process-wide token bucket that paces calls to a rate-limited API.
+
+    Callers reserve a token and sleep until it is theirs, so a burst is
+    queued and spread out at `rate` calls per second instead of failing.
+    `pause()` stops handing out tokens until a Retry-After has passed.
+    A caller with a `deadline.Deadline` gets DeadlineExceeded, and keeps
+    its token, when the wait wouldn't fit in the time it has left.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.delayed = 0
+        self.waiting = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, deadline=None):
+        """Take a token, sleeping until one is available; returns the time waited"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            ready_at = self._updated + max(0.0, -self._tokens) / self.rate
+            wait = max(0.0, ready_at - now)
+            if wait > 0 and deadline is not None:
+                try:
+                    deadline.check_wait(wait, f"a {wait:.2f}s rate limit wait")
+                except Exception:
+                    self._tokens += 1
+                    raise
+            self.acquired += 1
+            if wait > 0:
+                self.delayed += 1
+                self.waiting += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+        if wait > 0:
+            time.sleep(wait)
+            with self._lock:
+                self.waiting -= 1
+        return wait
+
+    def before_request(self, key=None, urgent=True, deadline=None):
+        """ApiClient hook: wait for a token before each request"""
+        self.acquire(deadline)
+
+    def after_response(self, key, response):
+        """ApiClient hook: pause on 429 and ask for the request to be retried"""
+        if response.status_code != 429:
+            return False
+        self.pause(parse_retry_after(response.headers))
+        return True
+
+    def pause(self, seconds):
+        """Hand out no tokens for the next `seconds` (e.g. after a 429)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._updated = max(self._updated, now + seconds)
+            # Let a single call probe the API when the pause ends, then pace the rest
+            self._tokens = min(self._tokens, 1.0)
+            self.throttled += 1
+
+    def level(self):
+        """Tokens currently available (negative while callers are queued)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return self._tokens
+
+    def stats(self):
+        level = self.level()
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "level": round(level, 3),
+                "acquired": self.acquired,
+                "delayed": self.delayed,
+                "waiting": self.waiting,
+                "throttled": self.throttled,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "max_wait_seconds": round(self.max_wait, 3),
+                "avg_wait_seconds": round(self.total_wait / self.delayed, 3) if self.delayed else 0.0
+            }
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+
+class RateBudgetTracker:
+    """Per-installation GitHub rate-limit budget fed from response headers.
+
+    Every response updates the installation's `X-RateLimit-*` view. When the
+    remaining budget drops below `low_watermark`, non-urgent calls are
+    spread over the time left until the reset. Secondary rate limits (a 403
+    or 429 with Retry-After, or an exhausted budget) block the installation
+    until they clear, backing off exponentially when GitHub gives no
+    Retry-After. Waits longer than `max_delay` raise RateLimitExceeded
+    instead of holding the calling thread, and so do waits longer than the
+    caller's `deadline.Deadline` has left, with DeadlineExceeded.
+    """
+
+    def __init__(self, low_watermark=100, max_delay=30, secondary_backoff=60):
+        self.low_watermark = low_watermark
+        self.max_delay = max_delay
+        self.secondary_backoff = secondary_backoff
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, key, urgent=True, deadline=None):
+        """Sleep as long as the installation's budget requires, or raise if too long"""
+        if key is None:
+            return
+        now = time.time()
+        with self._lock:
+            budget = self._budgets.get(key)
+            if budget is None:
+                return
+            wait = max(0.0, budget['blocked_until'] - now)
+            if not wait and not urgent and budget['remaining'] is not None \
+                    and budget['remaining'] < self.low_watermark and budget['reset'] > now:
+                # Spread what is left of the budget over the rest of the window
+                wait = min((budget['reset'] - now) / (budget['remaining'] + 1), self.max_delay)
+            if wait > self.max_delay:
+                raise RateLimitExceeded(
+                    f"GitHub rate limit for {key} resets in {int(wait)}s"
+                )
+            if wait and deadline is not None:
+                deadline.check_wait(wait, f"the GitHub rate limit for {key}")
+            if wait:
+                budget['delayed'] += 1
+        if wait:
+            time.sleep(wait)
+
+    def after_response(self, key, response):
+        """Record the response's rate-limit headers; returns True if it should be retried"""
+        if key is None:
+            return False
+        headers = response.headers
+        now = time.time()
+        with self._lock:
+            budget = self._budgets.setdefault(key, {
+                'limit': None,
+                'remaining': None,
+                'used': None,
+                'reset': 0.0,
+                'blocked_until': 0.0,
+                'secondary_hits': 0,
+                'strikes': 0,
+                'delayed': 0
+            })
+            for name in ('limit', 'remaining', 'used'):
+                value = headers.get(f'X-RateLimit-{name.capitalize()}')
+                if value is not None and value.isdigit():
+                    budget[name] = int(value)
+            reset = headers.get('X-RateLimit-Reset')
+            if reset is not None and reset.isdigit():
+                budget['reset'] = float(reset)
+
+            if response.status_code not in (403, 429):
+                budget['strikes'] = 0
+                return False
+
+            if 'Retry-After' in headers:
+                delay = parse_retry_after(headers)
+            elif budget['remaining'] == 0 and budget['reset'] > now:
+                delay = budget['reset'] - now
+            elif response.status_code == 429 or 'secondary rate limit' in (response.text or '').lower():
+                delay = self.secondary_backoff * (2 ** budget['strikes'])
+            else:
+                # A plain 403 is a permissions problem, not a rate limit
+                return False
+
+            budget['strikes'] += 1
+            budget['secondary_hits'] += 1
+            budget['blocked_until'] = max(budget['blocked_until'], now + delay)
+            return True
+
+    def snapshot(self):
+        """Remaining budget per installation for the admin endpoint"""
+        now = time.time()
+        with self._lock:
+            return {
+                str(key): {
+                    'limit': budget['limit'],
+                    'remaining': budget['remaining'],
+                    'used': budget['used'],
+                    'reset_in': max(0, round(budget['reset'] - now)),
+                    'blocked_for': max(0, round(budget['blocked_until'] - now, 1)),
+                    'secondary_hits': budget['secondary_hits'],
+                    'delayed': budget['delayed']
+                }
+                for key, budget in self._budgets.items()
+            }
@@ -0,0 +1,183 @@
+import time
+import threading
+from collections import deque
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream whose breaker is open or whose bulkhead is full"""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one upstream.
+
+    Outcomes from the last `window` seconds are kept. Once there are at
+    least `minimum_calls` of them and the share of failures reaches
+    `failure_rate`, the breaker opens and calls fail immediately for
+    `open_for` seconds. It then lets `half_open_calls` probes through:
+    if they all succeed it closes again, and any failure reopens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_rate=0.5, minimum_calls=10, window=60, open_for=30, half_open_calls=1):
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_for = open_for
+        self.half_open_calls = half_open_calls
+        self.state = self.CLOSED
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """Raise UpstreamUnavailable unless a call may go ahead now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_for:
+                    self.rejected += 1
+                    raise UpstreamUnavailable("Circuit breaker is open")
+                self.state = self.HALF_OPEN
+                self._probes = 0
+                self._probe_successes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    raise UpstreamUnavailable("Circuit breaker is half-open and probing")
+                self._probes += 1
+
+    def record(self, success):
+        """Record the outcome of a call let through by `allow`"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN:
+                if not success:
+                    self._open(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                return
+            if self.state == self.OPEN:
+                # A call that started before the breaker opened
+                return
+            self._outcomes.append((now, success))
+            if not success:
+                self._failures += 1
+            self._trim(now)
+            if len(self._outcomes) >= self.minimum_calls and \
+                    self._failures / len(self._outcomes) >= self.failure_rate:
+                self._open(now)
+
+    def _trim(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, success = self._outcomes.popleft()
+            if not success:
+                self._failures -= 1
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+        self.opened += 1
+        self._outcomes.clear()
+        self._failures = 0
+
+    def stats(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = len(self._outcomes)
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.open_for - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "state": self.state,
+                "calls": calls,
+                "failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "retry_in": retry_in
+            }
+
+
+class Bulkhead:
+    """Cap on the calls in flight to one upstream.
+
+    A call waits up to `max_wait` seconds for a slot and then fails, so a
+    slow upstream holds at most `max_concurrent` threads and the rest stay
+    free for other upstreams and /health. 0 means no cap.
+    """
+
+    def __init__(self, max_concurrent=0, max_wait=1.0):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if self._slots is not None and not self._slots.acquire(timeout=self.max_wait):
+            with self._lock:
+                self.rejected += 1
+            raise UpstreamUnavailable(f"All {self.max_concurrent} slots are in use")
+        with self._lock:
+            self.in_use += 1
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "in_use": self.in_use,
+                "rejected": self.rejected
+            }
+
+
+class Dependency:
+    """An upstream guarded by a bulkhead and a circuit breaker.
+
+    Connection errors, timeouts and 5xx responses count as failures; other
+    responses, including 429s, count as successes since the upstream is
+    answering.
+    """
+
+    def __init__(self, name, breaker, bulkhead):
+        self.name = name
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+
+    def call(self, send):
+        """Run `send()` if the upstream is available; raises UpstreamUnavailable otherwise"""
+        try:
+            self.bulkhead.acquire()
+        except UpstreamUnavailable as e:
+            raise UpstreamUnavailable(f"{self.name}: {e}") from None
+        try:
+            try:
+                self.breaker.allow()
+            except UpstreamUnavailable as e:
+                raise UpstreamUnavailable(f"{self.name}: {e}") from None
+            try:
+                response = send()
+            except Exception:
+                self.breaker.record(False)
+                raise
+            self.breaker.record(response.status_code < 500)
+            return response
+        finally:
+            self.bulkhead.release()
+
+    def stats(self):
+        return {"breaker": self.breaker.stats(), "bulkhead": self.bulkhead.stats()}
@@ -0,0 +1,713 @@
+import os
+import json
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """Base class for the small SQLite-backed stores used by Git-tion.
+
+    Each thread gets its own connection; the database runs in WAL mode so
+    gunicorn workers and background threads can read while another writes.
+    """
+
+    schema = ''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(self.schema)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block inside a write transaction"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+def backoff_delay(base_delay, attempts):
+    """Jittered exponential backoff before the retry that follows attempt number `attempts`"""
+    return base_delay * (2 ** (attempts - 1)) * random.uniform(0.5, 1.5)  # nosec B311
+
+
+class Job:
+    """A job claimed from the queue"""
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.kind = row['kind']
+        self.payload = json.loads(row['payload'])
+        self.attempts = row['attempts']
+        self.status = row['status']
+        self.stage = row['stage']
+        self.last_error = row['last_error']
+        self.run_at = row['run_at']
+        self.created_at = row['created_at']
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "run_at": self.run_at,
+            "created_at": self.created_at,
+            "payload": self.payload
+        }
+
+    def __repr__(self):
+        return f"Job(id={self.id}, kind={self.kind!r}, attempts={self.attempts})"
+
+
+class JobQueue(SQLiteStore):
+    """Durable job queue for webhook work that runs outside the request.
+
+    Claimed jobs are leased; if a worker dies mid-job the lease runs out and
+    another worker picks the job up again. Jobs that run out of attempts
+    stay in the table as `failed`, with the stage they failed in and their
+    last error, until they are requeued or purged: the dead-letter store.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            stage TEXT,
+            run_at REAL NOT NULL,
+            locked_until REAL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at);
+    '''
+
+    def __init__(self, path, lease_seconds=300):
+        super().__init__(path)
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Event()
+        # Queues created before jobs recorded the stage they failed in
+        columns = {row['name'] for row in self._connect().execute('PRAGMA table_info(jobs)')}
+        if 'stage' not in columns:
+            self._connect().execute('ALTER TABLE jobs ADD COLUMN stage TEXT')
+
+    def enqueue(self, kind, payload, delay=0, attempts=0, error=None):
+        """Persist a job and return its id.
+
+        A job that already failed once, e.g. while its delivery was being
+        handled, is enqueued with the attempts it used and its error.
+        """
+        now = time.time()
+        stage = payload.get('stage') if error is not None else None
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                '''INSERT INTO jobs (kind, payload, attempts, last_error, stage, run_at, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (kind, json.dumps(payload), attempts, None if error is None else str(error), stage,
+                 now + delay, now)
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def claim(self):
+        """Lease the next runnable job, or return None if there isn't one"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                '''SELECT * FROM jobs
+                   WHERE (status = 'queued' AND run_at <= ?)
+                      OR (status = 'running' AND locked_until < ?)
+                   ORDER BY run_at LIMIT 1''',
+                (now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                '''UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?
+                   WHERE id = ?''',
+                (now + self.lease_seconds, row['id'])
+            )
+        job = Job(row)
+        job.attempts += 1
+        job.status = 'running'
+        return job
+
+    def complete(self, job):
+        """Remove a finished job from the queue"""
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job.id,))
+
+    def retry(self, job, error, max_attempts, base_delay):
+        """Reschedule a failed job with jittered exponential backoff.
+
+        The job's payload is saved as well so progress made before the
+        failure is kept, along with the stage it failed in (`stage` in the
+        payload). Returns False once the job has run out of attempts and
+        has been marked as failed.
+        """
+        exhausted = job.attempts >= max_attempts
+        delay = backoff_delay(base_delay, job.attempts)
+        with self._transaction() as conn:
+            conn.execute(
+                '''UPDATE jobs SET status = ?, payload = ?, last_error = ?, stage = ?, run_at = ?,
+                   locked_until = NULL WHERE id = ?''',
+                ('failed' if exhausted else 'queued', json.dumps(job.payload), str(error),
+                 job.payload.get('stage'), time.time() + delay, job.id)
+            )
+        if not exhausted:
+            self._wakeup.set()
+        return not exhausted
+
+    def get(self, job_id):
+        """The job with this id in any status, or None"""
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return Job(row) if row is not None else None
+
+    def list_jobs(self, status='failed', kind=None, limit=100):
+        """Jobs with a status, newest first; by default the dead letters"""
+        query = 'SELECT * FROM jobs WHERE status = ?'
+        params = [status]
+        if kind is not None:
+            query += ' AND kind = ?'
+            params.append(kind)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        return [Job(row) for row in self._connect().execute(query, params)]
+
+    def requeue(self, job_ids=None):
+        """Give failed jobs (all, or those in `job_ids`) a fresh set of attempts, starting now.
+
+        Their payloads keep the progress they made, so they resume at the
+        stage that failed. Returns the number of jobs requeued.
+        """
+        query = "UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, locked_until = NULL " \
+                "WHERE status = 'failed'"
+        params = [time.time()]
+        if job_ids is not None:
+            query += f" AND id IN ({','.join('?' * len(job_ids))})"
+            params.extend(job_ids)
+        with self._transaction() as conn:
+            count = conn.execute(query, params).rowcount
+        if count:
+            self._wakeup.set()
+        return count
+
+    def purge(self, job_ids=None, older_than=None):
+        """Delete failed jobs, optionally only those in `job_ids` or created over `older_than` seconds ago"""
+        query = "DELETE FROM jobs WHERE status = 'failed'"
+        params = []
+        if job_ids is not None:
+            query += f" AND id IN ({','.join('?' * len(job_ids))})"
+            params.extend(job_ids)
+        if older_than is not None:
+            query += ' AND created_at < ?'
+            params.append(time.time() - older_than)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    def wait(self, timeout):
+        """Block until a job is enqueued in this process or the timeout passes"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def stats(self):
+        """Return queue depth by status and the age of the oldest queued job"""
+        conn = self._connect()
+        counts = {'queued': 0, 'running': 0, 'failed': 0}
+        for row in conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status'):
+            counts[row['status']] = row['n']
+        oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        counts['oldest_queued_age'] = round(time.time() - oldest, 3) if oldest else 0
+        return counts
+
+
+class QueueWorkerPool:
+    """Background threads that take jobs off a JobQueue and run their handlers"""
+
+    def __init__(self, queue, handlers, logger, workers=4, max_attempts=5, retry_delay=5, poll_interval=1):
+        self.queue = queue
+        self.handlers = handlers
+        self.logger = logger
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"queue-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self.queue._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_once(self):
+        """Process a single job if one is ready; returns True if a job ran"""
+        job = self.queue.claim()
+        if job is None:
+            return False
+
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise Exception(f"No handler for job kind {job.kind!r}")
+            handler(job.payload)
+        except Exception as e:
+            if self.queue.retry(job, e, self.max_attempts, self.retry_delay):
+                self.logger.warning(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}, will retry: {str(e)}")
+                self._count('retried')
+            else:
+                self.logger.error(f"Job {job.id} ({job.kind}) failed permanently: {str(e)}")
+                self._count('failed')
+            return True
+
+        self.queue.complete(job)
+        self._count('processed')
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "processed": self.processed,
+                "retried": self.retried,
+                "failed": self.failed
+            }
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if not self.run_once():
+                    self.queue.wait(self.poll_interval)
+            except Exception as e:
+                self.logger.error(f"Queue worker error: {str(e)}")
+                time.sleep(self.poll_interval)
+
+
+class IdempotencyStore(SQLiteStore):
+    """Remembers the outcome of recent work so duplicates can be answered without redoing it.
+
+    Work is identified by one or more keys (e.g. a delivery id and the issue
+    it targets); seeing any of them again counts as a duplicate. Each key
+    position has its own time to live in `ttls`. Claims live in the shared
+    database, so a redelivery that reaches another server worker is caught
+    too. A claim whose work never finishes, because its process died, lapses
+    after `pending_ttl` seconds.
+    """
+
+    PENDING = {"status": "in progress"}
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS dedupe_keys (
+            position INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            result TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (position, key)
+        );
+        CREATE INDEX IF NOT EXISTS dedupe_keys_expiry ON dedupe_keys (expires_at);
+    '''
+
+    def __init__(self, path, ttls, pending_ttl=300):
+        super().__init__(path)
+        self.ttls = ttls
+        self.pending_ttl = pending_ttl
+        self.duplicates = 0
+
+    def claim(self, keys):
+        """Reserve the keys; returns the stored result if any of them was already seen"""
+        now = time.time()
+        keys = self._keys(keys)
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM dedupe_keys WHERE expires_at <= ?', (now,))
+            for position, key in keys:
+                row = conn.execute(
+                    'SELECT result FROM dedupe_keys WHERE position = ? AND key = ?', (position, key)
+                ).fetchone()
+                if row is not None:
+                    self.duplicates += 1
+                    return json.loads(row['result'])
+            pending = json.dumps(self.PENDING)
+            conn.executemany(
+                'INSERT INTO dedupe_keys (position, key, result, expires_at) VALUES (?, ?, ?, ?)',
+                [(position, key, pending, now + min(self.ttls[position], self.pending_ttl))
+                 for position, key in keys]
+            )
+        return None
+
+    def finish(self, keys, result):
+        """Store the result of the work so later duplicates get the same answer"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO dedupe_keys (position, key, result, expires_at) VALUES (?, ?, ?, ?)',
+                [(position, key, json.dumps(result), now + self.ttls[position])
+                 for position, key in self._keys(keys)]
+            )
+
+    def release(self, keys):
+        """Forget the keys after a failure so the work can be retried"""
+        with self._transaction() as conn:
+            conn.executemany(
+                'DELETE FROM dedupe_keys WHERE position = ? AND key = ?', self._keys(keys)
+            )
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM dedupe_keys')
+
+    def stats(self):
+        row = self._connect().execute(
+            'SELECT COUNT(*) FROM dedupe_keys WHERE expires_at > ?', (time.time(),)
+        ).fetchone()
+        return {"duplicates": self.duplicates, "entries": row[0]}
+
+    @staticmethod
+    def _keys(keys):
+        return [(position, json.dumps(key)) for position, key in enumerate(keys) if key is not None]
+
+
+class IssuePageIndex(SQLiteStore):
+    """Maps (repo, issue_number) to the Notion page created for it.
+
+    `content_hash` is a hash of the issue content last written to the page,
+    so a repeat `!send` can tell whether anything changed. It is NULL for
+    entries recovered by a rebuild, which forces the next sync to write.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS issue_pages (
+            repo TEXT NOT NULL,
+            issue_number INTEGER NOT NULL,
+            page_id TEXT NOT NULL,
+            content_hash TEXT,
+            synced_at REAL NOT NULL,
+            PRIMARY KEY (repo, issue_number)
+        );
+        CREATE INDEX IF NOT EXISTS issue_pages_page ON issue_pages (page_id);
+    '''
+
+    def get(self, repo, issue_number):
+        row = self._connect().execute(
+            'SELECT * FROM issue_pages WHERE repo = ? AND issue_number = ?',
+            (repo, issue_number)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def upsert(self, repo, issue_number, page_id, content_hash):
+        with self._transaction() as conn:
+            conn.execute(
+                '''INSERT INTO issue_pages (repo, issue_number, page_id, content_hash, synced_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (repo, issue_number) DO UPDATE SET
+                       page_id = excluded.page_id,
+                       content_hash = excluded.content_hash,
+                       synced_at = excluded.synced_at''',
+                (repo, issue_number, page_id, content_hash, time.time())
+            )
+
+    def restore(self, entries):
+        """Add (repo, issue_number, page_id) entries found in Notion.
+
+        Hashes are kept for entries that still point at the same page and
+        cleared for everything else.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                '''INSERT INTO issue_pages (repo, issue_number, page_id, content_hash, synced_at)
+                   VALUES (?, ?, ?, NULL, ?)
+                   ON CONFLICT (repo, issue_number) DO UPDATE SET
+                       content_hash = CASE WHEN page_id = excluded.page_id THEN content_hash END,
+                       page_id = excluded.page_id''',
+                [(repo, issue_number, page_id, now) for repo, issue_number, page_id in entries]
+            )
+
+    def count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM issue_pages').fetchone()[0]
+
+
+class BackfillCheckpoints(SQLiteStore):
+    """Progress of repository backfills, so an interrupted run can resume.
+
+    `next_url` is the GitHub issues page to fetch next; it only moves
+    forward once every issue on the previous page has been handled.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            repo TEXT PRIMARY KEY,
+            next_url TEXT,
+            processed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def get(self, repo):
+        row = self._connect().execute(
+            'SELECT * FROM backfill_checkpoints WHERE repo = ?', (repo,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def save(self, repo, next_url, processed, failed, status):
+        with self._transaction() as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO backfill_checkpoints
+                   (repo, next_url, processed, failed, status, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (repo, next_url, processed, failed, status, time.time())
+            )
+
+    def start(self, repo, stale_after):
+        """Mark a backfill as running unless another one is already running.
+
+        Returns the checkpoint to resume from (None for a fresh start) and
+        raises if a run updated the checkpoint within `stale_after` seconds.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT * FROM backfill_checkpoints WHERE repo = ?', (repo,)
+            ).fetchone()
+            if row is not None and row['status'] == 'running' and time.time() - row['updated_at'] < stale_after:
+                raise Exception(f"A backfill of {repo} is already running")
+            resume = dict(row) if row is not None and row['status'] != 'done' else None
+            conn.execute(
+                '''INSERT OR REPLACE INTO backfill_checkpoints
+                   (repo, next_url, processed, failed, status, updated_at)
+                   VALUES (?, ?, ?, ?, 'running', ?)''',
+                (repo, resume['next_url'] if resume else None,
+                 resume['processed'] if resume else 0,
+                 resume['failed'] if resume else 0,
+                 time.time())
+            )
+        return resume
+
+    def reset(self, repo):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM backfill_checkpoints WHERE repo = ?', (repo,))
+
+
+class NotionSyncState(SQLiteStore):
+    """Progress of the Notion to GitHub status sync.
+
+    `cursor` is the newest `last_edited_time` handled, so each run only
+    asks Notion for pages edited since. The lease makes sure one process
+    runs the sync at a time. `page_status` holds the Status last seen for
+    each page, so edits that don't change the Status are skipped.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS sync_cursors (
+            name TEXT PRIMARY KEY,
+            cursor TEXT,
+            owner TEXT,
+            locked_until REAL NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS page_status (
+            page_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def get_cursor(self, name):
+        row = self._connect().execute(
+            'SELECT cursor FROM sync_cursors WHERE name = ?', (name,)
+        ).fetchone()
+        return row['cursor'] if row is not None else None
+
+    def save_cursor(self, name, cursor):
+        with self._transaction() as conn:
+            conn.execute(
+                '''INSERT INTO sync_cursors (name, cursor, updated_at) VALUES (?, ?, ?)
+                   ON CONFLICT (name) DO UPDATE SET cursor = excluded.cursor, updated_at = excluded.updated_at''',
+                (name, cursor, time.time())
+            )
+
+    def lease(self, name, owner, seconds):
+        """Take or renew the lease on a sync; returns False if another owner holds it"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT owner, locked_until FROM sync_cursors WHERE name = ?', (name,)
+            ).fetchone()
+            if row is not None and row['owner'] not in (None, owner) and row['locked_until'] > now:
+                return False
+            conn.execute(
+                '''INSERT INTO sync_cursors (name, owner, locked_until, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, locked_until = excluded.locked_until''',
+                (name, owner, now + seconds, now)
+            )
+        return True
+
+    def get_status(self, page_id):
+        row = self._connect().execute(
+            'SELECT status FROM page_status WHERE page_id = ?', (page_id,)
+        ).fetchone()
+        return row['status'] if row is not None else None
+
+    def record_status(self, page_id, status):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO page_status (page_id, status, updated_at) VALUES (?, ?, ?)',
+                (page_id, status, time.time())
+            )
+
+
+class PageSnapshots(SQLiteStore):
+    """What Git-tion last wrote to each Notion page, so updates can send only the differences.
+
+    `properties` maps property names to hashes of their values. `blocks`
+    lists the page's top-level blocks as [block_id, hash, type], or is
+    NULL when the block ids aren't known and the next update has to
+    rewrite the content.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS page_snapshots (
+            page_id TEXT PRIMARY KEY,
+            properties TEXT NOT NULL,
+            blocks TEXT,
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def get(self, page_id):
+        row = self._connect().execute(
+            'SELECT properties, blocks FROM page_snapshots WHERE page_id = ?', (page_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'properties': json.loads(row['properties']),
+            'blocks': json.loads(row['blocks']) if row['blocks'] is not None else None
+        }
+
+    def save(self, page_id, properties, blocks):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO page_snapshots (page_id, properties, blocks, updated_at) VALUES (?, ?, ?, ?)',
+                (page_id, json.dumps(properties), json.dumps(blocks) if blocks is not None else None, time.time())
+            )
+
+    def discard(self, page_id):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM page_snapshots WHERE page_id = ?', (page_id,))
+
+
+class TenantStore(SQLiteStore):
+    """Notion settings per GitHub App installation.
+
+    `properties` maps the fields Git-tion writes (see `tenants.PROPERTY_FIELDS`)
+    to property names in the tenant's database. Every write moves the
+    mtime of a generation file next to the database, which is how
+    processes that cache tenants notice a change without querying.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS tenants (
+            installation_id INTEGER PRIMARY KEY,
+            notion_token TEXT NOT NULL,
+            notion_database_id TEXT NOT NULL,
+            properties TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.generation_path = f"{path}.tenants"
+
+    def get(self, installation_id):
+        row = self._connect().execute(
+            'SELECT * FROM tenants WHERE installation_id = ?', (installation_id,)
+        ).fetchone()
+        return self._row(row) if row is not None else None
+
+    def list(self):
+        return [self._row(row) for row in self._connect().execute('SELECT * FROM tenants ORDER BY installation_id')]
+
+    def save(self, installation_id, notion_token, notion_database_id, properties=None):
+        with self._transaction() as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO tenants (installation_id, notion_token, notion_database_id, properties, updated_at)
+                   VALUES (?, ?, ?, ?, ?)''',
+                (installation_id, notion_token, notion_database_id, json.dumps(properties or {}), time.time())
+            )
+        self._bump_generation()
+
+    def remove(self, installation_id):
+        """Delete a tenant; returns False if there was none"""
+        with self._transaction() as conn:
+            removed = conn.execute('DELETE FROM tenants WHERE installation_id = ?', (installation_id,)).rowcount
+        self._bump_generation()
+        return bool(removed)
+
+    def generation(self):
+        """The generation file's mtime in nanoseconds, or 0 before the first write"""
+        try:
+            return os.stat(self.generation_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _bump_generation(self):
+        # Keep the mtime moving forward even if the clock hasn't ticked since the last write
+        previous = self.generation()
+        with open(self.generation_path, 'a'):
+            pass
+        mtime = max(time.time_ns(), previous + 1)
+        os.utime(self.generation_path, ns=(mtime, mtime))
+
+    @staticmethod
+    def _row(row):
+        return {
+            'installation_id': row['installation_id'],
+            'notion_token': row['notion_token'],
+            'notion_database_id': row['notion_database_id'],
+            'properties': json.loads(row['properties']),
+            'updated_at': row['updated_at']
+        }
@@ -0,0 +1,106 @@
+import threading
+from contextlib import contextmanager
+from cache import LRUCache
+
+_local = threading.local()
+
+# Fields Git-tion writes to a ticket, and the Notion property names used when a tenant doesn't rename them.
+# `labels` is left out of the ticket while it is empty.
+PROPERTY_FIELDS = {
+    'title': 'Task name',
+    'issue_url': 'GitHub Issue',
+    'repository': 'Repository',
+    'status': 'Status',
+    'labels': ''
+}
+
+_MISSING = object()
+
+
+class Tenant:
+    """The Notion workspace one GitHub App installation writes to"""
+
+    def __init__(self, installation_id, notion_token, notion_database_id, properties=None):
+        self.installation_id = installation_id
+        self.notion_token = notion_token
+        self.notion_database_id = notion_database_id
+        self.properties = dict(PROPERTY_FIELDS, **(properties or {}))
+
+    def property(self, field):
+        """The name of the Notion property that holds `field`"""
+        return self.properties[field]
+
+    def __repr__(self):
+        # Leaves out the token, so tenants can be logged
+        return f"Tenant(installation_id={self.installation_id}, database={self.notion_database_id!r})"
+
+
+class TenantDirectory:
+    """Looks up the tenant of an installation, from an in-process LRU cache.
+
+    Installations without a row in the store get `default`, the tenant
+    configured through the environment; that answer is cached too. Before
+    each lookup the store's generation is compared with the one the cache
+    was filled under, a `stat` rather than a query, and the cache is
+    dropped when it moved. Tenants added or changed by any process are
+    therefore used from the next delivery on.
+    """
+
+    def __init__(self, store, default, max_entries=1024):
+        self.store = store
+        self.default = default
+        self._cache = LRUCache(max_entries)
+        self._generation = store.generation()
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def get(self, installation_id):
+        generation = self.store.generation()
+        with self._lock:
+            if generation != self._generation:
+                self._cache.clear()
+                self._generation = generation
+                self.invalidations += 1
+        tenant = self._cache.get(installation_id, _MISSING)
+        if tenant is not _MISSING:
+            return tenant
+
+        row = self.store.get(installation_id) if installation_id is not None else None
+        tenant = self.default if row is None else self._tenant(row)
+        with self._lock:
+            # Don't cache what was read under a generation that has moved on since
+            if self._generation == generation:
+                self._cache.set(installation_id, tenant)
+        return tenant
+
+    def all(self):
+        """Every tenant in the store, read from the store rather than the cache"""
+        return [self._tenant(row) for row in self.store.list()]
+
+    def _tenant(self, row):
+        # Property names the tenant doesn't set fall back to the default tenant's
+        return Tenant(
+            row['installation_id'],
+            row['notion_token'],
+            row['notion_database_id'],
+            dict(self.default.properties, **row['properties'])
+        )
+
+    def stats(self):
+        return dict(self._cache.stats(), invalidations=self.invalidations)
+
+
+def current():
+    """The tenant whose work is running on this thread, if any"""
+    return getattr(_local, 'tenant', None)
+
+
+@contextmanager
+def scope(tenant):
+    """Run the enclosed block on behalf of `tenant`"""
+    previous = current()
+    _local.tenant = tenant
+    try:
+        yield tenant
+    finally:
+        _local.tenant = previous
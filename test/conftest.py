@@ -0,0 +1,90 @@
+import pytest
+from unittest.mock import MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from storage import IssuePageIndex
+
+
+@pytest.fixture
+def client():
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as client:
+        yield client
+
+
+def send_comment_payload(issue_number=42, installation_id=12345678):
+    """An issue_comment delivery asking for `!send` on an issue of user/repo"""
+    return {
+        "action": "created",
+        "comment": {"body": "@git-tion !send"},
+        "issue": {
+            "number": issue_number,
+            "title": "Test Issue",
+            "body": "Body",
+            "html_url": f"https://github.com/user/repo/issues/{issue_number}"
+        },
+        "repository": {"full_name": "user/repo"},
+        "installation": {"id": installation_id}
+    }
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Make sure cached state doesn't leak between tests"""
+    app_module.token_cache.invalidate()
+    app_module.invalidate_app_jwt()
+    yield
+    app_module.token_cache.invalidate()
+    app_module.invalidate_app_jwt()
+
+
+@pytest.fixture(autouse=True)
+def queue_workers(monkeypatch):
+    """Leave jobs handed off to the queue there instead of running them on real workers"""
+    start = MagicMock()
+    monkeypatch.setattr(app_module, 'start_queue_workers', start)
+    return start
+
+
+@pytest.fixture(autouse=True)
+def fresh_upstreams(monkeypatch):
+    """Start every test with closed circuit breakers and empty bulkheads"""
+    monkeypatch.setattr(app_module, 'upstreams', {
+        name: app_module.new_dependency(name, dependency.bulkhead.max_concurrent)
+        for name, dependency in app_module.upstreams.items()
+    })
+
+
+@pytest.fixture(autouse=True)
+def local_stores(tmp_path, monkeypatch):
+    """Keep the SQLite stores in a temporary directory"""
+    monkeypatch.setattr(app_module, 'DATABASE_PATH', str(tmp_path / "gittion.db"))
+    monkeypatch.setattr(app_module, '_issue_index', IssuePageIndex(str(tmp_path / "gittion.db")))
+    monkeypatch.setattr(app_module, '_job_queue', None)
+    monkeypatch.setattr(app_module, '_dedupe_store', None)
+    monkeypatch.setattr(app_module, '_notion_sync_state', None)
+    monkeypatch.setattr(app_module, '_page_snapshots', None)
+    monkeypatch.setattr(app_module, '_tenants', None)
+
+
+# The properties create_notion_ticket expects, as returned by GET /databases/{id}
+DATABASE_PROPERTIES = {
+    "Task name": {"type": "title", "title": {}},
+    "Status": {"type": "status", "status": {"options": [{"name": "Icebox"}, {"name": "Done"}]}},
+    "GitHub Issue": {"type": "url", "url": {}},
+    "Repository": {"type": "rich_text", "rich_text": {}}
+}
+
+
+@pytest.fixture(autouse=True)
+def notion_schema(monkeypatch):
+    """Serve the Notion database schema from the cache instead of the API"""
+    from notion_schema import NotionSchema
+    schema = NotionSchema(lambda: DATABASE_PROPERTIES)
+    schema.properties()
+    monkeypatch.setattr(app_module, 'notion_schema', schema)
+    return schema
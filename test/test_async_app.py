@@ -0,0 +1,171 @@
+import json
+import time
+import asyncio
+import threading
+from unittest.mock import patch
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiohttp.test_utils import TestClient, TestServer
+import app as gittion
+from async_app import create_app
+from journal import DeliveryJournal, read_journal
+from conftest import send_comment_payload
+
+
+def run_with_client(scenario, max_inflight=None):
+    """Run `scenario(client)` against a test server for the asyncio app"""
+    async def run():
+        async with TestClient(TestServer(create_app(max_inflight))) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+
+async def post_comment(client, payload, delivery_id):
+    response = await client.post(
+        '/webhook',
+        data=json.dumps(payload),
+        headers={'X-GitHub-Event': 'issue_comment', 'X-GitHub-Delivery': delivery_id,
+                 'X-Hub-Signature-256': 'sha256=mocked'}
+    )
+    return response.status, await response.json()
+
+
+def test_async_health_check():
+    """Test that the asyncio server answers /health like the Flask app"""
+    async def scenario(client):
+        response = await client.get('/health')
+        return response.status, await response.json()
+
+    status, body = run_with_client(scenario)
+    assert status == 200
+    assert body['status'] == "healthy"
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+def test_async_health_check_skips_busy_pool(mock_comment, mock_verify):
+    """Test that /health answers while every handler thread is busy with a delivery"""
+    def slow_create(*args, **kwargs):
+        time.sleep(1)
+        return "test-page-id"
+
+    async def scenario(client):
+        deliveries = [
+            asyncio.ensure_future(post_comment(client, send_comment_payload(number), f"delivery-{number}"))
+            for number in range(1, 3)
+        ]
+        await asyncio.sleep(0.2)
+        started = time.monotonic()
+        response = await client.get('/health')
+        elapsed = time.monotonic() - started
+        await asyncio.gather(*deliveries)
+        return response.status, elapsed
+
+    with patch('app.create_notion_ticket', side_effect=slow_create):
+        status, elapsed = run_with_client(scenario, max_inflight=2)
+
+    assert status == 200
+    assert elapsed < 0.5
+
+
+def test_async_webhook_invalid_signature():
+    """Test that the asyncio server rejects requests with invalid signatures"""
+    async def scenario(client):
+        response = await client.post(
+            '/webhook',
+            data=json.dumps({"test": "payload"}),
+            headers={'X-Hub-Signature-256': 'invalid_signature'}
+        )
+        return response.status, await response.json()
+
+    assert run_with_client(scenario) == (401, {"error": "Invalid signature"})
+
+
+@patch('app.verify_signature', return_value=True)
+def test_async_webhook_ignores_other_events(mock_verify):
+    """Test that the asyncio server ignores non-issue-comment events"""
+    async def scenario(client):
+        response = await client.post('/webhook', data=b'{}', headers={'X-GitHub-Event': 'push', 'X-Hub-Signature-256': 'sha256=mocked'})
+        return response.status, await response.json()
+
+    assert run_with_client(scenario) == (200, {"status": "ignored"})
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_async_webhook_runs_the_same_handler(mock_create, mock_comment, mock_verify):
+    """Test that a command goes through the shared handler, including deduplication"""
+    async def scenario(client):
+        first = await post_comment(client, send_comment_payload(), "delivery-1")
+        second = await post_comment(client, send_comment_payload(), "delivery-1")
+        return first, second
+
+    (first_status, first), (second_status, second) = run_with_client(scenario)
+    assert first_status == 200
+    assert first['status'] == "success"
+    assert first['notion_page_id'] == "test-page-id"
+    assert second['status'] == "duplicate"
+    mock_create.assert_called_once()
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+def test_async_webhook_keeps_deliveries_in_flight(mock_comment, mock_verify):
+    """Test that slow deliveries overlap instead of queueing behind each other"""
+    def slow_create(*args, **kwargs):
+        time.sleep(0.2)
+        return "test-page-id"
+
+    async def scenario(client):
+        return await asyncio.gather(*(
+            post_comment(client, send_comment_payload(number), f"delivery-{number}")
+            for number in range(1, 33)
+        ))
+
+    with patch('app.create_notion_ticket', side_effect=slow_create):
+        started = time.monotonic()
+        results = run_with_client(scenario, max_inflight=64)
+        elapsed = time.monotonic() - started
+
+    assert all(body['status'] == "success" for _, body in results)
+    # 32 deliveries of 0.2s each would take 6.4s one after another
+    assert elapsed < 2
+
+
+@patch('app.verify_signature', return_value=True)
+def test_async_webhook_journals_off_the_loop(mock_verify, tmp_path, monkeypatch):
+    """Test that the asyncio server records deliveries on a handler thread, not the event loop"""
+    journal = DeliveryJournal(str(tmp_path))
+    threads = []
+    append = journal.append
+    monkeypatch.setattr(journal, 'append', lambda *args, **kwargs: threads.append(threading.current_thread())
+                        or append(*args, **kwargs))
+    monkeypatch.setattr(gittion, 'delivery_journal', journal)
+
+    async def scenario(client):
+        loop_thread = threading.current_thread()
+        response = await client.post('/webhook', data=b'{}', headers={
+            'X-GitHub-Event': 'push', 'X-GitHub-Delivery': 'delivery-1', 'X-Hub-Signature-256': 'sha256=mocked'
+        })
+        return response.status, loop_thread
+
+    status, loop_thread = run_with_client(scenario)
+    journal.close()
+
+    assert status == 200
+    assert threads and threads[0] is not loop_thread
+    assert [record.headers['X-GitHub-Delivery'] for record in read_journal(str(tmp_path))] == ['delivery-1']
+
+@patch('app.WEBHOOK_MAX_BODY', 64)
+def test_async_webhook_rejects_oversized_body():
+    """Test that the asyncio server refuses bodies over WEBHOOK_MAX_BODY"""
+    async def scenario(client):
+        response = await client.post('/webhook', data=b'x' * 65,
+                                     headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=mocked'})
+        return response.status
+
+    assert run_with_client(scenario) == 413
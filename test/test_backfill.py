@@ -0,0 +1,116 @@
+import json
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app, run_backfill, list_repository_issues, get_backfill_checkpoints
+
+
+def issue(number):
+    return {
+        "number": number,
+        "title": f"Issue {number}",
+        "body": "Body",
+        "html_url": f"https://github.com/user/repo/issues/{number}"
+    }
+
+
+def github_page(items, next_url=None):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = items
+    response.links = {"next": {"url": next_url}} if next_url else {}
+    return response
+
+
+@patch('app.get_github_app_token', return_value="test-installation-token")
+@patch('app.github_client.get')
+def test_list_repository_issues_follows_pagination(mock_get, mock_token):
+    """Test that issue listing follows Link headers and skips pull requests"""
+    mock_get.side_effect = [
+        github_page([issue(1), {**issue(2), "pull_request": {}}], next_url="https://api.github.com/page2"),
+        github_page([issue(3)])
+    ]
+    
+    pages = list(list_repository_issues("user/repo", 1))
+    
+    assert [[i['number'] for i in issues] for issues, _ in pages] == [[1], [3]]
+    assert pages[0][1] == "https://api.github.com/page2"
+    assert mock_get.call_args_list[1].args[0] == "https://api.github.com/page2"
+
+
+@patch('app.count_open_issues', return_value=3)
+@patch('app.sync_issue_to_notion')
+@patch('app.list_repository_issues')
+def test_run_backfill_reports_progress(mock_list, mock_sync, mock_count):
+    """Test that every issue is synced and throughput is reported"""
+    mock_list.return_value = iter([([issue(1), issue(2)], "page2"), ([issue(3)], None)])
+    reports = []
+    
+    progress = run_backfill("user/repo", 1, concurrency=2, report=reports.append)
+    
+    assert mock_sync.call_count == 3
+    assert progress['processed'] == 3
+    assert progress['eta'] == 0
+    assert reports[0]['processed'] == 2
+    assert get_backfill_checkpoints().get("user/repo")['status'] == 'done'
+
+
+@patch('app.count_open_issues', return_value=3)
+@patch('app.sync_issue_to_notion')
+@patch('app.list_repository_issues')
+def test_run_backfill_resumes_from_checkpoint(mock_list, mock_sync, mock_count):
+    """Test that an interrupted backfill resumes from the last completed page"""
+    def interrupted(repo, installation_id, start_url=None):
+        yield [issue(1)], "page2"
+        raise Exception("GitHub went away")
+    mock_list.side_effect = interrupted
+    
+    with pytest.raises(Exception):
+        run_backfill("user/repo", 1, report=lambda progress: None)
+    checkpoint = get_backfill_checkpoints().get("user/repo")
+    assert checkpoint['status'] == 'interrupted'
+    assert checkpoint['next_url'] == "page2"
+    
+    mock_list.side_effect = None
+    mock_list.return_value = iter([([issue(2), issue(3)], None)])
+    progress = run_backfill("user/repo", 1, report=lambda progress: None)
+    
+    assert mock_list.call_args.args[2] == "page2"
+    assert progress['processed'] == 3
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.process_backfill_job')
+def test_send_all_command_starts_backfill(mock_backfill, mock_verify):
+    """Test that `!send-all` starts a backfill instead of a single `!send`"""
+    payload = {
+        "action": "created",
+        "comment": {"body": "@git-tion !send-all"},
+        "issue": {"number": 7},
+        "repository": {"full_name": "user/repo"},
+        "installation": {"id": 12345678}
+    }
+    
+    with patch('app.create_notion_ticket') as mock_create:
+        response = app.test_client().post(
+            '/webhook',
+            data=json.dumps(payload),
+            content_type='application/json',
+            headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=mocked'}
+        )
+    
+    assert response.status_code == 202
+    assert response.get_json()['status'] == "backfill started"
+    mock_create.assert_not_called()
+    
+    # The backfill runs on its own thread
+    for _ in range(100):
+        if mock_backfill.called:
+            break
+        time.sleep(0.01)
+    mock_backfill.assert_called_once_with({"repo": "user/repo", "issue_number": 7, "installation_id": 12345678})
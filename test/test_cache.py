@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache import TTLCache, LRUCache
+
+
+def test_ttl_cache_expires_entries():
+    """Test that entries disappear once their TTL has passed"""
+    cache = TTLCache(ttl=10)
+    
+    with patch('cache.time.monotonic', return_value=100):
+        cache.set("a", 1)
+    with patch('cache.time.monotonic', return_value=105):
+        assert cache.get("a") == 1
+    with patch('cache.time.monotonic', return_value=111):
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_oldest_when_full():
+    """Test that the cache stays within max_entries"""
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 2
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that reading an entry keeps it in a full cache"""
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 1}
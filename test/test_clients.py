@@ -0,0 +1,56 @@
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clients import ApiClient
+from app import github_client, notion_client, fetch_database_properties
+
+
+def test_client_resolves_paths_against_base_url():
+    """Test that relative paths use the base URL and absolute URLs pass through"""
+    client = ApiClient("https://api.example.com/v1/")
+    
+    assert client.url("/pages") == "https://api.example.com/v1/pages"
+    assert client.url("pages") == "https://api.example.com/v1/pages"
+    assert client.url("https://other.example.com/x") == "https://other.example.com/x"
+
+
+def test_client_applies_default_timeout():
+    """Test that every request gets the client timeout unless one is given"""
+    client = ApiClient("https://api.example.com", timeout=(1, 2))
+    
+    with patch.object(client.session, 'request') as mock_request:
+        client.get("/a")
+        client.post("/b", timeout=9)
+    
+    assert mock_request.call_args_list[0].kwargs['timeout'] == (1, 2)
+    assert mock_request.call_args_list[1].kwargs['timeout'] == 9
+
+
+def test_client_shares_one_connection_pool():
+    """Test that the session uses a pooled adapter of the configured size"""
+    client = ApiClient("https://api.example.com", pool_size=25)
+    adapter = client.session.get_adapter("https://api.example.com/a")
+    
+    assert adapter._pool_maxsize == 25
+    assert client.session.get_adapter("https://api.example.com/b") is adapter
+
+
+def test_upstream_default_headers():
+    """Test that the shared clients send the API headers by default"""
+    assert notion_client.session.headers['Notion-Version'] == "2022-06-28"
+    assert github_client.session.headers['Accept'] == "application/vnd.github.v3+json"
+
+
+@patch('app.notion_client.get')
+def test_database_schema_uses_notion_client(mock_get):
+    """Test that the database schema is fetched through the shared Notion client"""
+    mock_get.return_value = MagicMock(status_code=200, json=MagicMock(return_value={"properties": {}}))
+    
+    assert fetch_database_properties() == {}
+    
+    args, kwargs = mock_get.call_args
+    assert "https://api.notion.com/v1/databases/" in args[0]
+    assert kwargs['headers']['Authorization'].startswith("Bearer ")
@@ -0,0 +1,190 @@
+from unittest.mock import patch, MagicMock
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from app import app, handle_issue_comment, parse_notion_page_id
+from commands import Command, CommandRegistry, parse_commands
+from conftest import send_comment_payload
+
+
+def test_parse_single_command():
+    assert parse_commands("Please @git-tion !send", '@git-tion') == [Command('send')]
+
+
+def test_parse_arguments_and_options():
+    """Test that key=value tokens become options and the rest positional arguments"""
+    body = "@git-tion !send status=Backlog\n@git-tion !status In progress"
+    
+    assert parse_commands(body, '@git-tion') == [
+        Command('send', options={'status': 'Backlog'}),
+        Command('status', args=['In', 'progress'])
+    ]
+
+
+def test_parse_several_commands_on_one_line():
+    body = "@git-tion !send @git-tion !close"
+    
+    assert [c.name for c in parse_commands(body, '@git-tion')] == ['send', 'close']
+
+
+def test_parse_skips_code_and_quotes():
+    """Test that commands in fenced code, inline code and quotes don't run"""
+    body = "\n".join([
+        "> @git-tion !close",
+        "```",
+        "@git-tion !send-all",
+        "```",
+        "Use `@git-tion !sync` to force an update",
+        "~~~markdown",
+        "@git-tion !link abc",
+        "~~~",
+        "@git-tion !status"
+    ])
+    
+    assert parse_commands(body, '@git-tion') == [Command('status')]
+
+
+def test_parse_ignores_mentions_without_command():
+    assert parse_commands("Thanks @git-tion! and @git-tion send", '@git-tion') == []
+
+
+def test_registry_dispatches_by_name():
+    registry = CommandRegistry()
+    
+    @registry.command('ping', '`!ping`')
+    def ping(command, payload):
+        return {"pong": payload}, 200
+    
+    assert 'ping' in registry
+    assert 'pong' not in registry
+    assert registry.dispatch(Command('ping'), 1) == ({"pong": 1}, 200)
+    assert registry.usage() == [('ping', '`!ping`')]
+
+
+def test_parse_notion_page_id():
+    page_id = "0123456789abcdef0123456789abcdef"
+    expected = "01234567-89ab-cdef-0123-456789abcdef"
+    
+    assert parse_notion_page_id(page_id) == expected
+    assert parse_notion_page_id(expected) == expected
+    assert parse_notion_page_id(f"https://www.notion.so/team/My-Ticket-{page_id}?pvs=4") == expected
+    assert parse_notion_page_id("not a page") is None
+
+
+def comment_payload(body, issue_number=42):
+    payload = send_comment_payload(issue_number)
+    payload['comment']['body'] = body
+    return payload
+
+
+def call(payload, delivery_id="delivery-1"):
+    with app.app_context():
+        response, status = handle_issue_comment(payload, delivery_id=delivery_id)
+        return response.get_json(), status
+
+
+@patch('app.add_github_comment')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_send_passes_status_option(mock_create, mock_comment):
+    body, status = call(comment_payload("@git-tion !send status=Backlog"))
+    
+    assert status == 200
+    assert mock_create.call_args.kwargs['status'] == "Backlog"
+
+
+@patch('app.add_github_comment')
+@patch('app.update_notion_ticket')
+def test_sync_rewrites_unchanged_ticket(mock_update, mock_comment):
+    """Test that `!sync` writes even when the content hash matches"""
+    payload = comment_payload("@git-tion !sync")
+    issue = payload['issue']
+    app_module.get_issue_index().upsert("user/repo", 42, "page-1", app_module.ticket_content_hash(
+        issue['title'], issue['body'], issue['html_url'], "user/repo"))
+    
+    body, status = call(payload)
+    
+    assert body['action'] == "updated"
+    mock_update.assert_called_once()
+
+
+@patch('app.post_github_comment')
+@patch('app.set_notion_status')
+def test_close_sets_done_status(mock_set_status, mock_post):
+    app_module.get_issue_index().upsert("user/repo", 42, "page-1", "hash")
+    
+    body, status = call(comment_payload("@git-tion !close"))
+    
+    assert status == 200
+    mock_set_status.assert_called_once_with("page-1", app_module.NOTION_DONE_STATUS)
+    assert "Done" in mock_post.call_args[0][3]
+
+
+@patch('app.post_github_comment')
+@patch('app.get_notion_status', return_value="In progress")
+def test_status_reports_notion_status(mock_get_status, mock_post):
+    app_module.get_issue_index().upsert("user/repo", 42, "page-1", "hash")
+    
+    body, status = call(comment_payload("@git-tion !status"))
+    
+    assert body['notion_status'] == "In progress"
+    assert "**In progress**" in mock_post.call_args[0][3]
+
+
+@patch('app.post_github_comment')
+def test_status_without_ticket(mock_post):
+    body, status = call(comment_payload("@git-tion !status"))
+    
+    assert body['status'] == "not linked"
+    mock_post.assert_called_once()
+
+
+@patch('app.post_github_comment')
+@patch('app.set_notion_status')
+def test_close_without_ticket(mock_set_status, mock_post):
+    """Test that `!close` on an unlinked issue is answered with a hint instead of an error"""
+    body, status = call(comment_payload("@git-tion !close"))
+    
+    assert status == 200
+    assert body['status'] == "not linked"
+    mock_set_status.assert_not_called()
+    assert "!send" in mock_post.call_args[0][3]
+
+
+@patch('app.post_github_comment')
+@patch('app.notion_client.patch')
+def test_link_points_index_at_page(mock_patch, mock_post):
+    """Test that `!link` stores the page in the index and sets its GitHub Issue property"""
+    mock_patch.return_value = MagicMock(status_code=200)
+    
+    body, status = call(comment_payload("@git-tion !link https://www.notion.so/Ticket-0123456789abcdef0123456789abcdef"))
+    
+    page_id = "01234567-89ab-cdef-0123-456789abcdef"
+    assert body == {"status": "success", "notion_page_id": page_id, "action": "linked"}
+    entry = app_module.get_issue_index().get("user/repo", 42)
+    assert entry['page_id'] == page_id
+    assert entry['content_hash'] is None
+    assert mock_patch.call_args.kwargs['json']['properties'] == {
+        "GitHub Issue": {"url": "https://github.com/user/repo/issues/42"}
+    }
+
+
+@patch('app.post_github_comment')
+@patch('app.set_notion_status')
+@patch('app.add_github_comment')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_several_commands_in_one_comment(mock_create, mock_comment, mock_set_status, mock_post):
+    body, status = call(comment_payload("@git-tion !send\n@git-tion !close"))
+    
+    assert status == 200
+    assert body['status'] == "multiple"
+    assert [result['command'] for result in body['results']] == ['send', 'close']
+    mock_set_status.assert_called_once_with("test-page-id", "Done")
+
+
+def test_unknown_command_is_not_found():
+    body, status = call(comment_payload("@git-tion !dance"))
+    
+    assert body == {"status": "no command found"}
@@ -0,0 +1,151 @@
+import json
+import time
+import pytest
+import requests
+from unittest.mock import patch
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import deadline
+from app import app
+from clients import ApiClient
+from deadline import Deadline, DeadlineExceeded
+from ratelimit import TokenBucket
+from conftest import send_comment_payload
+
+
+def test_deadline_clips_timeouts():
+    """Test that timeouts are cut to the time left but never lengthened"""
+    budget = Deadline(2.0)
+
+    connect, read = budget.clip((5, 30))
+    assert 1.9 < connect <= 2.0 and 1.9 < read <= 2.0
+    assert budget.clip(0.5) == 0.5
+    assert budget.clip(None) <= 2.0
+
+
+def test_client_uses_remaining_budget():
+    """Test that requests under a deadline get the time left as their timeout"""
+    api = ApiClient("https://api.example.com", timeout=(5, 30))
+
+    with patch.object(api.session, 'request') as mock_request:
+        with deadline.scope(3):
+            api.get("/a")
+        api.get("/b")
+
+    assert mock_request.call_args_list[0].kwargs['timeout'][1] <= 3
+    assert mock_request.call_args_list[1].kwargs['timeout'] == (5, 30)
+
+
+def test_client_refuses_requests_after_deadline():
+    """Test that nothing is sent once the budget is used up"""
+    api = ApiClient("https://api.example.com")
+
+    with patch.object(api.session, 'request') as mock_request:
+        with deadline.scope(5, started=time.monotonic() - 10):
+            with pytest.raises(DeadlineExceeded):
+                api.get("/a")
+
+    mock_request.assert_not_called()
+
+
+def test_rate_limit_wait_longer_than_budget_fails_fast():
+    """Test that a paused rate limiter raises instead of sleeping past the deadline"""
+    limiter = TokenBucket(rate=100)
+    limiter.pause(3)
+    api = ApiClient("https://api.example.com", limiter=limiter)
+
+    with patch.object(api.session, 'request') as mock_request, patch('ratelimit.time.sleep') as mock_sleep:
+        with deadline.scope(1):
+            with pytest.raises(DeadlineExceeded):
+                api.get("/a")
+
+    mock_request.assert_not_called()
+    mock_sleep.assert_not_called()
+    assert limiter.stats()['acquired'] == 0
+
+
+def test_stage_needs_its_minimum():
+    """Test that a stage doesn't start without its minimum and records what it used"""
+    with deadline.scope(1) as budget:
+        with deadline.stage('quick', minimum=0.5):
+            pass
+        with pytest.raises(DeadlineExceeded):
+            with deadline.stage('long', minimum=5):
+                pass
+
+    assert 'quick' in budget.spent
+    assert budget.interrupted == 'long'
+
+
+def test_stage_without_deadline_runs():
+    """Test that queue workers, which have no deadline, run every stage"""
+    with deadline.stage('comment', minimum=100):
+        ran = True
+    assert ran
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+@patch('app.sync_issue_to_notion', return_value=("page-1", "created"))
+def test_send_defers_stage_that_does_not_fit(mock_sync, mock_comment, mock_verify, client, queue_workers, monkeypatch):
+    """Test that work left when the budget runs short is queued with the finished stages"""
+    monkeypatch.setattr(app_module, 'DEADLINE_COMMENT_MIN', 100)
+
+    response = client.post('/webhook', data=json.dumps(send_comment_payload()), headers={
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': 'issue_comment',
+        'X-GitHub-Delivery': 'deadline-1',
+        'X-Hub-Signature-256': 'sha256=mocked'
+    })
+
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "deferred"
+    assert response.get_json()["stage"] == "comment"
+    mock_comment.assert_not_called()
+    queue_workers.assert_called_once()
+    job = app_module.get_job_queue().claim()
+    assert job.kind == 'send'
+    assert job.payload['notion_page_id'] == "page-1"
+    assert not job.payload.get('commented')
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.sync_issue_to_notion')
+def test_timeout_after_deadline_is_deferred(mock_sync, mock_verify, client, queue_workers, monkeypatch):
+    """Test that a request timing out because the budget ran out defers the job"""
+    monkeypatch.setattr(app_module, 'DELIVERY_DEADLINE', 0.05)
+    monkeypatch.setattr(app_module, 'DEADLINE_NOTION_MIN', 0)
+
+    def slow_sync(**kwargs):
+        time.sleep(0.06)
+        raise requests.Timeout("read timed out")
+    mock_sync.side_effect = slow_sync
+
+    response = client.post('/webhook', data=json.dumps(send_comment_payload()), headers={
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': 'issue_comment',
+        'X-GitHub-Delivery': 'deadline-2',
+        'X-Hub-Signature-256': 'sha256=mocked'
+    })
+
+    assert response.status_code == 202
+    assert response.get_json()["stage"] == "notion"
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.sync_issue_to_notion', side_effect=requests.Timeout("read timed out"))
+def test_timeout_with_time_left_is_an_error(mock_sync, mock_verify, client):
+    """Test that an upstream timeout with budget to spare is retried as a failure instead of deferred"""
+    response = client.post('/webhook', data=json.dumps(send_comment_payload()), headers={
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': 'issue_comment',
+        'X-GitHub-Delivery': 'deadline-3',
+        'X-Hub-Signature-256': 'sha256=mocked'
+    })
+
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "retrying"
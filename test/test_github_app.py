@@ -1,5 +1,6 @@
 import pytest
 import time
+import threading
 import jwt
 from unittest.mock import patch, MagicMock, ANY
 
@@ -7,11 +8,14 @@ from unittest.mock import patch, MagicMock, ANY
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import get_github_app_token, add_github_comment
+from app import (
+    app, get_github_app_token, add_github_comment, InstallationTokenCache,
+    get_app_jwt, load_private_key
+)
 
 
 @patch('app.jwt.encode')
-@patch('app.requests.post')
+@patch('app.github_client.post')
 def test_get_github_app_token(mock_post, mock_jwt_encode):
     """Test GitHub App token acquisition"""
     # Set up the mocks
@@ -55,7 +59,7 @@ def test_get_github_app_token(mock_post, mock_jwt_encode):
         assert kwargs['headers']['Authorization'] == f"Bearer test-jwt-token"
 
 
-@patch('app.requests.post')
+@patch('app.github_client.post')
 def test_get_github_app_token_failure(mock_post):
     """Test GitHub App token acquisition failure"""
     # Set up the mock response
@@ -81,7 +85,7 @@ def test_get_github_app_token_failure(mock_post):
 
 
 @patch('app.get_github_app_token')
-@patch('app.requests.post')
+@patch('app.github_client.post')
 def test_add_github_comment_success(mock_post, mock_get_token):
     """Test successful GitHub comment addition"""
     # Set up the mocks
@@ -124,7 +128,7 @@ def test_add_github_comment_success(mock_post, mock_get_token):
 
 
 @patch('app.get_github_app_token')
-@patch('app.requests.post')
+@patch('app.github_client.post')
 def test_add_github_comment_failure(mock_post, mock_get_token):
     """Test GitHub comment addition failure"""
     # Set up the mocks
@@ -151,4 +155,166 @@ def test_add_github_comment_failure(mock_post, mock_get_token):
         )
     
     # Verify that the error message contains the status code
-    assert "403" in str(excinfo.value)
\ No newline at end of file
+    assert "403" in str(excinfo.value)
+
+def test_token_cache_serves_hits_until_expiry():
+    """Test that cached installation tokens are reused until they expire"""
+    fetch = MagicMock(return_value=("cached-token", time.time() + 3600))
+    cache = InstallationTokenCache(fetch, refresh_margin=300)
+    
+    assert cache.get(1) == "cached-token"
+    assert cache.get(1) == "cached-token"
+    
+    fetch.assert_called_once_with(1)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_token_cache_refetches_expired_token():
+    """Test that an expired token is not served from the cache"""
+    fetch = MagicMock(side_effect=[("old-token", time.time() - 1), ("new-token", time.time() + 3600)])
+    cache = InstallationTokenCache(fetch)
+    
+    assert cache.get(1) == "old-token"
+    assert cache.get(1) == "new-token"
+    assert fetch.call_count == 2
+
+
+def test_token_cache_collapses_concurrent_misses():
+    """Test that concurrent misses for one installation share a single fetch"""
+    release = threading.Event()
+    calls = []
+    
+    def slow_fetch(installation_id):
+        calls.append(installation_id)
+        release.wait(5)
+        return "shared-token", time.time() + 3600
+    
+    cache = InstallationTokenCache(slow_fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(7))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert calls == [7]
+    assert results == ["shared-token"] * 5
+
+
+def test_token_cache_refreshes_in_background():
+    """Test that a token close to expiry is served while a refresh runs"""
+    refreshed = threading.Event()
+    
+    def fetch(installation_id):
+        if fetch.calls:
+            refreshed.set()
+            return "fresh-token", time.time() + 3600
+        fetch.calls += 1
+        return "stale-token", time.time() + 60
+    fetch.calls = 0
+    
+    cache = InstallationTokenCache(fetch, refresh_margin=300)
+    assert cache.get(1) == "stale-token"
+    assert cache.get(1) == "stale-token"
+    
+    assert refreshed.wait(5)
+    time.sleep(0.05)
+    assert cache.get(1) == "fresh-token"
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_admin_stats_requires_token():
+    """Test that the admin stats endpoint is protected by ADMIN_TOKEN"""
+    client = app.test_client()
+    
+    with patch('app.ADMIN_TOKEN', None):
+        assert client.get('/admin/stats').status_code == 404
+    
+    with patch('app.ADMIN_TOKEN', 'admin-secret'):
+        assert client.get('/admin/stats').status_code == 401
+        response = client.get('/admin/stats', headers={'Authorization': 'Bearer admin-secret'})
+        assert response.status_code == 200
+        assert 'hits' in response.get_json()['github_token_cache']
+
+
+def test_app_jwt_is_reused_until_near_expiry():
+    """Test that the signed app JWT is cached instead of re-signed per call"""
+    with patch('app.jwt.encode', return_value="cached-jwt") as mock_jwt_encode:
+        assert get_app_jwt() == "cached-jwt"
+        assert get_app_jwt() == "cached-jwt"
+        mock_jwt_encode.assert_called_once()
+        
+        # Once inside the reuse margin a new JWT is signed
+        issued_at = time.time()
+        with patch('app.time.time', return_value=issued_at + 10 * 60 - 30):
+            get_app_jwt()
+        assert mock_jwt_encode.call_count == 2
+
+
+def test_app_jwt_signs_with_parsed_key():
+    """Test that the private key is parsed once and the key object is used for signing"""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import serialization
+    
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption()
+    ).decode()
+    
+    with patch('app.GITHUB_PRIVATE_KEY', pem):
+        token = get_app_jwt()
+        assert load_private_key(pem) is load_private_key(pem)
+    
+    decoded = jwt.decode(token, key.public_key(), algorithms=['RS256'])
+    assert decoded['iss'] == "test-app-id"
+
+
+@patch('app.github_client.post')
+def test_rejected_app_jwt_is_discarded(mock_post):
+    """Test that a 401 from the token endpoint drops the cached app JWT"""
+    mock_response = MagicMock()
+    mock_response.status_code = 401
+    mock_response.text = "Bad credentials"
+    mock_post.return_value = mock_response
+    
+    with patch('app.jwt.encode', return_value="test-jwt-token") as mock_jwt_encode:
+        for _ in range(2):
+            with pytest.raises(Exception):
+                get_github_app_token(12345678)
+        assert mock_jwt_encode.call_count == 2
+
+
+@patch('app.github_client.post')
+def test_rejected_installation_token_is_discarded(mock_post):
+    """Test that a 401 on a comment evicts the cached installation token"""
+    fetch = MagicMock(side_effect=[("revoked-token", time.time() + 3600), ("new-token", time.time() + 3600)])
+    mock_post.return_value = MagicMock(status_code=401, text="Bad credentials")
+    
+    with patch('app.token_cache', InstallationTokenCache(fetch)):
+        with pytest.raises(Exception):
+            add_github_comment("user/repo", 42, "test-page-id", 12345678)
+        assert get_github_app_token(12345678) == "new-token"
+
+
+@patch('app.get_github_app_token', return_value="test-installation-token")
+def test_add_github_comment_feeds_rate_budget(mock_get_token):
+    """Test that comment responses update the installation's rate budget"""
+    response = MagicMock(status_code=201, text='', headers={
+        'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4321', 'X-RateLimit-Reset': str(int(time.time()) + 60)
+    })
+    client = app.test_client()
+    
+    with patch('app.github_client.session.request', return_value=response), \
+         patch('app.ADMIN_TOKEN', 'admin-secret'), \
+         patch.dict('app.github_rate_budget._budgets', clear=True):
+        add_github_comment("user/repo", 42, "test-page-id", 555)
+        snapshot = client.get(
+            '/admin/github-rate-limits', headers={'Authorization': 'Bearer admin-secret'}
+        ).get_json()
+    
+    assert snapshot['555']['remaining'] == 4321
@@ -0,0 +1,125 @@
+import hmac
+import json
+import time
+import hashlib
+import threading
+from unittest.mock import MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from app import app
+from journal import DeliveryJournal, JournalRecord, JournalSegment, list_segments, read_journal, replay
+
+
+def headers_for(delivery_id, event='issue_comment'):
+    return {'X-GitHub-Event': event, 'X-GitHub-Delivery': delivery_id, 'Content-Type': 'application/json'}
+
+
+def test_journal_round_trip(tmp_path):
+    """Test that recorded headers and bodies read back in order"""
+    journal = DeliveryJournal(str(tmp_path))
+    journal.append(headers_for('d1'), [b'{"a": ', b'1}'], timestamp=100.0)
+    journal.append({**headers_for('d2'), 'X-Hub-Signature-256': 'sha256=secret'}, [b'{"b": 2}'], timestamp=101.0)
+    journal.close()
+
+    records = list(read_journal(str(tmp_path)))
+
+    assert [record.body for record in records] == [b'{"a": 1}', b'{"b": 2}']
+    assert records[0].headers['X-GitHub-Delivery'] == 'd1'
+    assert records[1].timestamp == 101.0
+    assert 'X-Hub-Signature-256' not in records[1].headers
+
+
+def test_segment_random_access(tmp_path):
+    """Test that the index finds a record without reading the ones before it"""
+    journal = DeliveryJournal(str(tmp_path))
+    for number in range(5):
+        journal.append(headers_for(f'd{number}'), [b'x' * 1000 * number], timestamp=float(number))
+    journal.close()
+
+    segment = JournalSegment(str(tmp_path), list_segments(str(tmp_path))[0])
+
+    assert len(segment) == 5
+    assert segment.read(3).headers['X-GitHub-Delivery'] == 'd3'
+    assert segment.read(3).body == b'x' * 3000
+
+
+def test_segments_rotate_and_merge(tmp_path):
+    """Test that full segments are closed, old ones pruned and readers merge by time"""
+    journal = DeliveryJournal(str(tmp_path), segment_size=1, max_segments=3)
+    for number in range(5):
+        journal.append(headers_for(f'd{number}'), [b'{}'], timestamp=float(number))
+    journal.close()
+    # A second process writing interleaved deliveries
+    other = DeliveryJournal(str(tmp_path), max_segments=10)
+    other.append(headers_for('other'), [b'{}'], timestamp=3.5)
+    other.close()
+
+    records = list(read_journal(str(tmp_path), since=2.0))
+
+    assert [record.headers['X-GitHub-Delivery'] for record in records] == ['d2', 'd3', 'other', 'd4']
+
+
+def test_replay_resigns_and_paces(tmp_path):
+    """Test that replay signs each body, sends fresh delivery ids and keeps the recorded gaps"""
+    journal = DeliveryJournal(str(tmp_path))
+    journal.append(headers_for('d1'), [b'{"n": 1}'], timestamp=100.0)
+    journal.append(headers_for('d2'), [b'{"n": 2}'], timestamp=104.0)
+    journal.close()
+    session = MagicMock()
+    session.post.return_value = MagicMock(status_code=200)
+    sleep = MagicMock()
+
+    statuses = replay(read_journal(str(tmp_path)), 'http://localhost/webhook', 'replay-secret', session,
+                      speed=2.0, concurrency=1, sleep=sleep)
+
+    assert statuses == {'200': 2}
+    assert 1.9 < sleep.call_args.args[0] <= 2.0
+    call = session.post.call_args_list[0]
+    body = call.kwargs['data']
+    assert call.kwargs['headers']['X-Hub-Signature-256'] == \
+        'sha256=' + hmac.new(b'replay-secret', body, hashlib.sha256).hexdigest()
+    assert call.kwargs['headers']['X-GitHub-Delivery'] != 'd1'
+
+
+def test_replay_reads_no_further_ahead_than_concurrency(tmp_path):
+    """Test that replay at speed 0 only takes a record once a send slot is free"""
+    release = threading.Event()
+    taken = []
+    session = MagicMock()
+    session.post.side_effect = lambda *args, **kwargs: release.wait(5) and MagicMock(status_code=200)
+
+    def records():
+        for number in range(10):
+            taken.append(number)
+            yield JournalRecord(100.0 + number, headers_for(f'd{number}'), b'{}')
+
+    replayer = threading.Thread(target=replay, args=(records(), 'http://localhost/webhook', 'secret', session),
+                                kwargs={'speed': 0, 'concurrency': 2})
+    replayer.start()
+    time.sleep(0.2)
+    # Two sends in flight and one record waiting for a slot
+    assert len(taken) == 3
+    release.set()
+    replayer.join(5)
+    assert len(taken) == 10
+
+def test_webhook_journals_verified_deliveries(tmp_path, monkeypatch):
+    """Test that verified deliveries, including filtered ones, are journaled and forged ones aren't"""
+    monkeypatch.setattr(app_module, 'delivery_journal', DeliveryJournal(str(tmp_path)))
+    monkeypatch.setattr(app_module, 'GITHUB_SECRET', 'journal-secret')
+    body = json.dumps({"action": "created", "comment": {"body": "no command"}}).encode()
+    signature = 'sha256=' + hmac.new(b'journal-secret', body, hashlib.sha256).hexdigest()
+    app.config['TESTING'] = True
+
+    with app.test_client() as client:
+        client.post('/webhook', data=body, headers={**headers_for('good'), 'X-Hub-Signature-256': signature})
+        client.post('/webhook', data=body, headers={**headers_for('forged'), 'X-Hub-Signature-256': 'sha256=bad'})
+    app_module.delivery_journal.close()
+
+    records = list(read_journal(str(tmp_path)))
+    assert [record.headers['X-GitHub-Delivery'] for record in records] == ['good']
+    assert records[0].body == body
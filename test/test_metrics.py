@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from prometheus_client import REGISTRY
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+from clients import ApiClient
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_stage_observes_duration_even_on_error():
+    """Test that a stage is timed whether or not its block raises"""
+    before = sample('gittion_stage_duration_seconds_count', stage='test_stage')
+
+    with metrics.stage('test_stage'):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.stage('test_stage'):
+            raise ValueError("boom")
+
+    assert sample('gittion_stage_duration_seconds_count', stage='test_stage') == before + 2
+
+
+def test_upstream_observer_counts_status_codes():
+    """Test that the client reports each response, and failed requests as status 0"""
+    client = ApiClient("https://api.example.com", observer=metrics.UpstreamObserver('test_upstream'))
+    ok = sample('gittion_upstream_responses_total', upstream='test_upstream', method='GET', status='200')
+    failed = sample('gittion_upstream_responses_total', upstream='test_upstream', method='GET', status='0')
+
+    with patch.object(client.session, 'request', return_value=MagicMock(status_code=200)):
+        client.get("/a")
+    with patch.object(client.session, 'request', side_effect=ConnectionError("down")):
+        with pytest.raises(ConnectionError):
+            client.get("/a")
+
+    assert sample('gittion_upstream_responses_total', upstream='test_upstream', method='GET', status='200') == ok + 1
+    assert sample('gittion_upstream_responses_total', upstream='test_upstream', method='GET', status='0') == failed + 1
+    assert sample('gittion_in_flight', kind='test_upstream') == 0
+
+
+def test_webhook_counts_outcome(client):
+    """Test that deliveries are counted by event and outcome"""
+    rejected = sample('gittion_webhook_requests_total', event='issue_comment', outcome='unauthorized')
+    filtered = sample('gittion_webhook_requests_total', event='other', outcome='handled')
+
+    client.post('/webhook', data=b'{}', headers={
+        'X-GitHub-Event': 'issue_comment',
+        'X-Hub-Signature-256': 'sha256=wrong'
+    })
+    with patch('app.verify_signature', return_value=True):
+        client.post('/webhook', data=b'{}', headers={
+            'X-GitHub-Event': 'push',
+            'X-Hub-Signature-256': 'sha256=mocked'
+        })
+
+    assert sample('gittion_webhook_requests_total', event='issue_comment', outcome='unauthorized') == rejected + 1
+    assert sample('gittion_webhook_requests_total', event='other', outcome='handled') == filtered + 1
+    assert sample('gittion_in_flight', kind='webhook') == 0
+
+
+def test_metrics_endpoint(client):
+    """Test that /metrics serves the Prometheus text format"""
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    assert b'gittion_stage_duration_seconds_bucket' in response.data
+    assert b'gittion_webhook_requests_total' in response.data
@@ -5,11 +5,15 @@ from unittest.mock import patch, MagicMock
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import create_notion_ticket
+from app import (
+    create_notion_ticket, update_notion_ticket, sync_issue_to_notion,
+    rebuild_issue_index, get_issue_index, get_page_snapshots, process_send_job
+)
 
 
-@patch('app.requests.post')
-def test_create_notion_ticket_success(mock_post):
+@patch('app.list_notion_block_ids', return_value=[])
+@patch('app.notion_client.post')
+def test_create_notion_ticket_success(mock_post, mock_list):
     """Test successful Notion ticket creation"""
     # Set up the mock response
     mock_response = MagicMock()
@@ -59,7 +63,7 @@ def test_create_notion_ticket_success(mock_post):
     assert repo in str(kwargs['json'])
 
 
-@patch('app.requests.post')
+@patch('app.notion_client.post')
 def test_create_notion_ticket_failure(mock_post):
     """Test Notion ticket creation failure"""
     # Set up the mock response
@@ -92,9 +96,10 @@ def test_create_notion_ticket_failure(mock_post):
     mock_post.assert_called_once()
 
 
+@patch('app.list_notion_block_ids', return_value=[])
 @patch('app.inspect_database')
-@patch('app.requests.post')
-def test_create_notion_ticket_empty_description(mock_post, mock_inspect):
+@patch('app.notion_client.post')
+def test_create_notion_ticket_empty_description(mock_post, mock_inspect, mock_list):
     """Test Notion ticket creation with an empty description"""
     # Set up the mock response
     mock_response = MagicMock()
@@ -139,4 +144,209 @@ def test_create_notion_ticket_empty_description(mock_post, mock_inspect):
                 description_found = True
                 break
     
-    assert description_found, "Default text for empty description not found"
\ No newline at end of file
+    assert description_found, "Default text for empty description not found"
+
+def notion_response(status_code=200, data=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = data or {}
+    return response
+
+
+@patch('app.update_notion_ticket')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_sync_issue_creates_then_skips_unchanged(mock_create, mock_update):
+    """Test that a repeat sync of unchanged content doesn't write to Notion"""
+    args = ("Test Issue", "Body", 42, "https://github.com/user/repo/issues/42", "user/repo")
+    
+    assert sync_issue_to_notion(*args) == ("test-page-id", "created")
+    assert sync_issue_to_notion(*args) == ("test-page-id", "unchanged")
+    
+    mock_create.assert_called_once()
+    mock_update.assert_not_called()
+
+
+@patch('app.update_notion_ticket')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_sync_issue_updates_changed_content(mock_create, mock_update):
+    """Test that changed issue content updates the existing page"""
+    sync_issue_to_notion("Test Issue", "Body", 42, "https://github.com/user/repo/issues/42", "user/repo")
+    result = sync_issue_to_notion("Test Issue", "New body", 42, "https://github.com/user/repo/issues/42", "user/repo")
+    
+    assert result == ("test-page-id", "updated")
+    mock_create.assert_called_once()
+    assert mock_update.call_args[0][0] == "test-page-id"
+    assert mock_update.call_args[0][2] == "New body"
+
+
+@patch('app.notion_client.delete')
+@patch('app.notion_client.get')
+@patch('app.notion_client.patch')
+def test_update_notion_ticket_replaces_content(mock_patch, mock_get, mock_delete):
+    """Test that an update rewrites properties and page content but not Status"""
+    mock_patch.return_value = notion_response()
+    mock_get.side_effect = [
+        notion_response(data={"results": [{"id": "block-1"}], "has_more": True, "next_cursor": "c1"}),
+        notion_response(data={"results": [{"id": "block-2"}], "has_more": False})
+    ]
+    mock_delete.return_value = notion_response()
+    
+    update_notion_ticket("page-id", "Test Issue", "Body", 42, "https://github.com/user/repo/issues/42", "user/repo")
+    
+    properties = mock_patch.call_args_list[0].kwargs['json']['properties']
+    assert "Status" not in properties
+    assert "[#42]" in properties['Task name']['title'][0]['text']['content']
+    assert mock_get.call_args_list[1].kwargs['params']['start_cursor'] == "c1"
+    assert [c.args[0].rsplit('/', 1)[1] for c in mock_delete.call_args_list] == ["block-1", "block-2"]
+    assert "/blocks/page-id/children" in mock_patch.call_args_list[1].args[0]
+
+
+@patch('app.notion_client.post')
+def test_rebuild_issue_index_from_notion(mock_post):
+    """Test that the index can be rebuilt from a paginated database query"""
+    def page(page_id, url):
+        return {"id": page_id, "properties": {"GitHub Issue": {"url": url}}}
+    
+    mock_post.side_effect = [
+        notion_response(data={
+            "results": [page("page-1", "https://github.com/user/repo/issues/1")],
+            "has_more": True,
+            "next_cursor": "cursor-1"
+        }),
+        notion_response(data={
+            "results": [page("page-2", "https://github.com/user/repo/issues/2"), page("page-3", None)],
+            "has_more": False
+        })
+    ]
+    
+    assert rebuild_issue_index() == 2
+    assert mock_post.call_args_list[1].kwargs['json']['start_cursor'] == "cursor-1"
+    
+    entry = get_issue_index().get("user/repo", 2)
+    assert entry['page_id'] == "page-2"
+    assert entry['content_hash'] is None
+
+
+@patch('app.list_notion_block_ids', return_value=[f"block-{n}" for n in range(252)])
+@patch('app.notion_client.patch')
+@patch('app.notion_client.post')
+def test_create_notion_ticket_appends_long_content_in_batches(mock_post, mock_patch, mock_list):
+    """Test that content past 100 blocks is appended in 100-block batches"""
+    mock_post.return_value = notion_response(data={"id": "test-page-id"})
+    mock_patch.return_value = notion_response()
+    description = "\n".join(f"- item {n}" for n in range(250))
+    
+    create_notion_ticket("Test Issue", description, 42, "https://github.com/user/repo/issues/42", "user/repo")
+    
+    # Intro + 250 items + link = 252 blocks
+    assert len(mock_post.call_args.kwargs['json']['children']) == 100
+    batch_sizes = [len(c.kwargs['json']['children']) for c in mock_patch.call_args_list]
+    assert batch_sizes == [100, 52]
+    assert all("/blocks/test-page-id/children" in c.args[0] for c in mock_patch.call_args_list)
+    # The page's blocks are recorded so the first update can send only the differences
+    snapshot = get_page_snapshots().get("test-page-id")
+    assert [block[0] for block in snapshot['blocks']] == [f"block-{n}" for n in range(252)]
+    assert set(snapshot['properties']) == {"Task name", "GitHub Issue", "Repository"}
+
+
+@patch('app.list_notion_block_ids', return_value=[])
+@patch('app.add_github_comment')
+@patch('app.notion_client.patch')
+@patch('app.notion_client.post')
+def test_send_job_resumes_appending_after_partial_create(mock_post, mock_patch, mock_comment, mock_list):
+    """Test that a retry appends the missing blocks to the page already created instead of creating another"""
+    mock_post.return_value = notion_response(data={"id": "test-page-id"})
+    mock_patch.side_effect = [notion_response(), notion_response(502), notion_response()]
+    job = {
+        "issue_number": 42,
+        "title": "Test Issue",
+        "body": "\n".join(f"- item {n}" for n in range(250)),
+        "issue_url": "https://github.com/user/repo/issues/42",
+        "repo": "user/repo",
+        "installation_id": 12345678
+    }
+    
+    with pytest.raises(Exception):
+        process_send_job(job)
+    assert job['notion_page_id'] == "test-page-id"
+    assert job['blocks_written'] == 200
+    assert get_issue_index().get("user/repo", 42)['page_id'] == "test-page-id"
+    
+    assert process_send_job(job) == "test-page-id"
+    
+    mock_post.assert_called_once()
+    assert len(mock_patch.call_args_list[-1].kwargs['json']['children']) == 52
+    assert 'blocks_written' not in job
+    assert get_issue_index().get("user/repo", 42)['content_hash']
+    mock_comment.assert_called_once()
+
+
+def appended(data_ids):
+    return notion_response(data={"results": [{"id": block_id} for block_id in data_ids]})
+
+
+@patch('app.notion_client.delete')
+@patch('app.notion_client.get')
+@patch('app.notion_client.patch')
+def test_update_notion_ticket_sends_only_differences(mock_patch, mock_get, mock_delete):
+    """Test that once the page content is known, an edit only touches what changed"""
+    args = (42, "https://github.com/user/repo/issues/42", "user/repo")
+    mock_get.return_value = notion_response(data={"results": [{"id": "old-block"}], "has_more": False})
+    mock_delete.return_value = notion_response()
+    # Properties, then the rewrite of intro + 3 paragraphs + link
+    mock_patch.side_effect = [notion_response(), appended(["b0", "b1", "b2", "b3", "b4"])]
+    
+    update_notion_ticket("page-id", "Test Issue", "One\n\nTwo\n\nThree", *args)
+    
+    mock_patch.reset_mock()
+    mock_patch.side_effect = None
+    mock_patch.return_value = notion_response()
+    mock_get.reset_mock()
+    mock_delete.reset_mock()
+    
+    update_notion_ticket("page-id", "Test Issue", "One\n\nTwo, edited\n\nThree", *args)
+    
+    # Same title: no property update; one paragraph changed: one block update
+    assert len(mock_patch.call_args_list) == 1
+    assert mock_patch.call_args.args[0].endswith("/blocks/b2")
+    assert mock_patch.call_args.kwargs['json']['paragraph']['rich_text'][0]['text']['content'] == "Two, edited"
+    mock_get.assert_not_called()
+    mock_delete.assert_not_called()
+
+
+@patch('app.notion_client.delete')
+@patch('app.notion_client.get')
+@patch('app.notion_client.patch')
+@patch('app.notion_client.post')
+def test_first_update_after_create_sends_only_differences(mock_post, mock_patch, mock_get, mock_delete):
+    """Test that a new ticket's first edit doesn't rewrite the whole page"""
+    args = (42, "https://github.com/user/repo/issues/42", "user/repo")
+    mock_post.return_value = notion_response(data={"id": "page-id"})
+    # Intro + 2 paragraphs + link, listed once after the page is created
+    mock_get.return_value = notion_response(data={"results": [{"id": f"b{n}"} for n in range(4)], "has_more": False})
+    mock_patch.return_value = notion_response()
+    
+    create_notion_ticket("Test Issue", "One\n\nTwo", *args)
+    update_notion_ticket("page-id", "Test Issue", "One\n\nTwo, edited", *args)
+    
+    assert [c.args[0] for c in mock_patch.call_args_list] == ["https://api.notion.com/v1/blocks/b2"]
+    mock_delete.assert_not_called()
+
+@patch('app.notion_client.delete')
+@patch('app.notion_client.get')
+@patch('app.notion_client.patch')
+def test_update_notion_ticket_inserts_new_blocks_in_place(mock_patch, mock_get, mock_delete):
+    args = (42, "https://github.com/user/repo/issues/42", "user/repo")
+    mock_get.return_value = notion_response(data={"results": [], "has_more": False})
+    mock_patch.side_effect = [notion_response(), appended(["b0", "b1", "b2"])]
+    update_notion_ticket("page-id", "Test Issue", "One", *args)
+    
+    mock_patch.side_effect = [notion_response(), appended(["b-new"])]
+    mock_patch.reset_mock()
+    update_notion_ticket("page-id", "New title", "One\n\n---", *args)
+    
+    properties = mock_patch.call_args_list[0].kwargs['json']['properties']
+    assert list(properties) == ["Task name"]
+    insert = mock_patch.call_args_list[1].kwargs['json']
+    assert insert['after'] == "b1"
+    assert insert['children'][0]['type'] == "divider"
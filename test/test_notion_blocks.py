@@ -0,0 +1,122 @@
+from itertools import count, islice
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notion_blocks import markdown_to_blocks, iter_lines, rich_text, batched, block_hash, BlockDiff, MAX_TEXT_LENGTH
+
+
+def convert(markdown):
+    return list(markdown_to_blocks(iter_lines(markdown)))
+
+
+def text_of(block):
+    return ''.join(item['text']['content'] for item in block[block['type']]['rich_text'])
+
+
+def test_converts_common_markdown():
+    """Test headings, lists, quotes, code and paragraphs"""
+    blocks = convert(
+        "# Title\n"
+        "First line\nsecond line\n"
+        "\n"
+        "- bullet\n"
+        "1. numbered\n"
+        "- [x] done\n"
+        "> quoted\n"
+        "```python\nprint('hi')\n```\n"
+        "---\n"
+    )
+    
+    assert [block['type'] for block in blocks] == [
+        'heading_1', 'paragraph', 'bulleted_list_item', 'numbered_list_item',
+        'to_do', 'quote', 'code', 'divider'
+    ]
+    assert text_of(blocks[1]) == "First line\nsecond line"
+    assert blocks[4]['to_do']['checked'] is True
+    assert blocks[6]['code']['language'] == 'python'
+    assert text_of(blocks[6]) == "print('hi')"
+
+
+def test_inline_links_and_annotations():
+    """Test that links and inline formatting become rich text"""
+    elements = rich_text("See [the docs](https://example.com) and **this** `code`")
+    
+    assert elements[1]['text'] == {"content": "the docs", "link": {"url": "https://example.com"}}
+    assert elements[3]['annotations'] == {"bold": True}
+    assert elements[5]['annotations'] == {"code": True}
+
+
+def test_long_content_respects_text_limit():
+    """Test that no rich text element goes past Notion's 2000 character limit"""
+    blocks = convert("x" * 4500 + "\n\n```\n" + ("y" * 100 + "\n") * 60 + "```")
+    
+    for block in blocks:
+        for item in block[block['type']]['rich_text']:
+            assert len(item['text']['content']) <= MAX_TEXT_LENGTH
+    assert sum(len(text_of(b)) for b in blocks if b['type'] == 'paragraph') == 4500
+    assert len([b for b in blocks if b['type'] == 'code']) == 4
+
+
+def test_conversion_is_incremental():
+    """Test that blocks are produced before the input has been read to the end"""
+    endless = (f"- item {n}" for n in count())
+    
+    first = list(islice(markdown_to_blocks(endless), 3))
+    
+    assert [text_of(block) for block in first] == ["item 0", "item 1", "item 2"]
+
+
+def test_batched_groups_blocks():
+    """Test that blocks are grouped into requests of at most 100"""
+    sizes = [len(batch) for batch in batched(range(250))]
+    
+    assert sizes == [100, 100, 50]
+
+
+def on_page(blocks):
+    """What a snapshot records for blocks on a page: [block_id, hash, type]"""
+    return [[f"block-{i}", block_hash(block), block['type']] for i, block in enumerate(blocks)]
+
+
+def test_block_diff_of_unchanged_content_is_empty():
+    blocks = convert("# Title\n\nSome text\n\n- item")
+    
+    assert BlockDiff(on_page(blocks), blocks).empty
+
+
+def test_block_diff_updates_changed_block_in_place():
+    """Test that one edited paragraph becomes a single in-place update"""
+    old = convert("# Title\n\nSome text\n\n- item")
+    new = convert("# Title\n\nOther text\n\n- item")
+    
+    diff = BlockDiff(on_page(old), new)
+    
+    assert diff.updates == [("block-1", new[1])]
+    assert diff.deletes == [] and diff.inserts == []
+    assert diff.kept_before == ["block-0"] and diff.kept_after == ["block-2"]
+
+
+def test_block_diff_inserts_after_last_kept_block():
+    old = convert("# Title\n\n- item")
+    new = convert("# Title\n\nNew paragraph\n\n---\n\n- item")
+    
+    diff = BlockDiff(on_page(old), new)
+    
+    assert diff.updates == []
+    assert diff.inserts == new[1:3]
+    assert diff.after == "block-0"
+
+
+def test_block_diff_replaces_blocks_of_another_type():
+    """Test that a block whose type changed is deleted and re-inserted"""
+    old = convert("# Title\n\nSome text\n\n- item")
+    new = convert("# Title\n\n> Quoted now\n\n- item")
+    
+    diff = BlockDiff(on_page(old), new)
+    
+    assert diff.updates == []
+    assert diff.deletes == ["block-1"]
+    assert diff.inserts == [new[1]]
+    assert diff.after == "block-0"
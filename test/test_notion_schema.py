@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_notion_ticket
+from notion_schema import NotionSchema, SchemaError
+from conftest import DATABASE_PROPERTIES
+
+
+def payload(status="Icebox", **extra):
+    return {
+        "Task name": {"title": [{"text": {"content": "[#1] Test"}}]},
+        "Status": {"status": {"name": status}},
+        **extra
+    }
+
+
+def test_schema_is_cached_until_ttl():
+    """Test that the schema is fetched once and reused until it expires"""
+    fetch = MagicMock(return_value=DATABASE_PROPERTIES)
+    schema = NotionSchema(fetch, ttl=300)
+    
+    schema.validate(payload())
+    schema.validate(payload())
+    fetch.assert_called_once()
+    
+    with patch('notion_schema.time.monotonic', return_value=10 ** 9):
+        schema.validate(payload())
+    assert fetch.call_count == 2
+
+
+def test_schema_refreshes_once_on_mismatch():
+    """Test that a renamed property is picked up by refreshing the schema once"""
+    renamed = {**DATABASE_PROPERTIES, "Repo": {"type": "rich_text", "rich_text": {}}}
+    fetch = MagicMock(side_effect=[DATABASE_PROPERTIES, renamed])
+    schema = NotionSchema(fetch, min_refresh_interval=0)
+    schema.properties()
+    
+    schema.validate(payload(Repo={"rich_text": []}))
+    
+    assert fetch.call_count == 2
+
+
+def test_schema_rejects_missing_property_and_status():
+    """Test that payloads that still don't fit fail without another refresh"""
+    fetch = MagicMock(return_value=DATABASE_PROPERTIES)
+    schema = NotionSchema(fetch, min_refresh_interval=60)
+    
+    with pytest.raises(SchemaError) as excinfo:
+        schema.validate(payload(status="Backlog", Owner={"people": []}))
+    
+    assert "'Owner' does not exist" in str(excinfo.value)
+    assert "'Backlog' is not an option" in str(excinfo.value)
+    assert fetch.call_count == 1
+    assert schema.stats()['rejected'] == 1
+
+
+def test_schema_rejects_wrong_type():
+    """Test that a property whose type changed is reported"""
+    schema = NotionSchema(lambda: DATABASE_PROPERTIES)
+    
+    problems = schema.problems({"GitHub Issue": {"rich_text": []}}, DATABASE_PROPERTIES)
+    
+    assert problems == ["property 'GitHub Issue' is a url, not a rich_text"]
+
+
+@patch('app.notion_client.post')
+def test_create_notion_ticket_fails_fast_on_schema_drift(mock_post, notion_schema):
+    """Test that no page is sent when the database no longer has a property"""
+    notion_schema._fetch = lambda: {k: v for k, v in DATABASE_PROPERTIES.items() if k != "Repository"}
+    notion_schema.invalidate()
+    
+    with pytest.raises(SchemaError):
+        create_notion_ticket("Test Issue", "Body", 42, "https://github.com/user/repo/issues/42", "user/repo")
+    
+    mock_post.assert_not_called()
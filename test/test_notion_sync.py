@@ -0,0 +1,133 @@
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from app import run_notion_sync, NOTION_SYNC_CURSOR
+
+CURSOR = "2024-01-01T10:00:00.000Z"
+
+
+def notion_page(page_id, status, edited, issue_number=42):
+    return {
+        "id": page_id,
+        "last_edited_time": edited,
+        "properties": {
+            "Status": {"type": "status", "status": {"name": status}},
+            "GitHub Issue": {"type": "url", "url": f"https://github.com/user/repo/issues/{issue_number}"}
+        }
+    }
+
+
+def query_response(pages):
+    return MagicMock(status_code=200, json=MagicMock(return_value={"results": pages, "has_more": False}))
+
+
+def test_first_run_only_sets_cursor():
+    """Test that the first run starts following changes without touching old pages"""
+    with patch('app.notion_client.post') as mock_post:
+        assert run_notion_sync() == {"pages": 0, "changed": 0, "failed": 0}
+    
+    mock_post.assert_not_called()
+    assert app_module.get_notion_sync_state().get_cursor(NOTION_SYNC_CURSOR) is not None
+
+
+@patch('app.installation_for_repo', return_value=12345678)
+@patch('app.post_github_comment')
+@patch('app.remove_issue_label')
+@patch('app.update_github_issue')
+@patch('app.notion_client.post')
+def test_status_change_closes_issue(mock_post, mock_update, mock_remove, mock_comment, mock_installation):
+    """Test that moving a card to Done relabels, closes and comments on the issue"""
+    state = app_module.get_notion_sync_state()
+    state.save_cursor(NOTION_SYNC_CURSOR, CURSOR)
+    state.record_status("page-1", "Icebox")
+    state.record_status("page-2", "Icebox")
+    mock_post.return_value = query_response([
+        notion_page("page-1", "Done", "2024-01-01T10:05:00.000Z"),
+        # Edited, but the Status didn't change
+        notion_page("page-2", "Icebox", "2024-01-01T10:06:00.000Z", issue_number=43)
+    ])
+    
+    assert run_notion_sync() == {"pages": 2, "changed": 1, "failed": 0}
+    
+    query = mock_post.call_args.kwargs['json']
+    assert query['filter'] == {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": CURSOR}}
+    mock_remove.assert_called_once_with("user/repo", 42, 12345678, "notion: Icebox")
+    mock_update.assert_any_call("user/repo", 42, 12345678, 'POST', '/labels', {"labels": ["notion: Done"]})
+    mock_update.assert_any_call("user/repo", 42, 12345678, 'PATCH', '', {"state": "closed"})
+    assert "**Icebox** to **Done**" in mock_comment.call_args[0][3]
+    assert state.get_status("page-1") == "Done"
+    assert state.get_cursor(NOTION_SYNC_CURSOR) == "2024-01-01T10:06:00.000Z"
+
+
+@patch('app.installation_for_repo', return_value=12345678)
+@patch('app.post_github_comment')
+@patch('app.remove_issue_label')
+@patch('app.update_github_issue')
+@patch('app.notion_client.post')
+def test_leaving_done_reopens_issue(mock_post, mock_update, mock_remove, mock_comment, mock_installation):
+    state = app_module.get_notion_sync_state()
+    state.save_cursor(NOTION_SYNC_CURSOR, CURSOR)
+    state.record_status("page-1", "Done")
+    mock_post.return_value = query_response([notion_page("page-1", "In progress", "2024-01-01T10:05:00.000Z")])
+    
+    run_notion_sync()
+    
+    mock_update.assert_any_call("user/repo", 42, 12345678, 'PATCH', '', {"state": "open"})
+
+
+@patch('app.installation_for_repo', return_value=12345678)
+@patch('app.post_github_comment')
+@patch('app.remove_issue_label')
+@patch('app.update_github_issue')
+@patch('app.notion_client.post')
+def test_reopened_webhook_during_sync_keeps_status(mock_post, mock_update, mock_remove, mock_comment,
+                                                   mock_installation):
+    """Test that the reopened webhook caused by the sync doesn't overwrite the new status"""
+    state = app_module.get_notion_sync_state()
+    state.save_cursor(NOTION_SYNC_CURSOR, CURSOR)
+    state.record_status("page-1", "Done")
+    mock_post.return_value = query_response([notion_page("page-1", "In progress", "2024-01-01T10:05:00.000Z")])
+    seen = []
+    mock_update.side_effect = lambda *args: seen.append(app_module.issue_state_status("page-1", 'reopened'))
+    
+    run_notion_sync()
+    
+    assert seen and all(status is None for status in seen)
+    assert state.get_status("page-1") == "In progress"
+
+
+@patch('app.apply_status_change', side_effect=[Exception("GitHub down"), None])
+@patch('app.notion_client.post')
+def test_failed_page_holds_cursor(mock_post, mock_apply):
+    """Test that the cursor stays at a page whose change couldn't be applied"""
+    state = app_module.get_notion_sync_state()
+    state.save_cursor(NOTION_SYNC_CURSOR, CURSOR)
+    state.record_status("page-1", "Icebox")
+    state.record_status("page-2", "Icebox")
+    mock_post.return_value = query_response([
+        notion_page("page-1", "Done", "2024-01-01T10:05:00.000Z"),
+        notion_page("page-2", "Done", "2024-01-01T10:07:00.000Z", issue_number=43)
+    ])
+    
+    assert run_notion_sync() == {"pages": 2, "changed": 1, "failed": 1}
+    
+    assert state.get_cursor(NOTION_SYNC_CURSOR) == CURSOR
+    assert state.get_status("page-1") == "Icebox"
+    assert state.get_status("page-2") == "Done"
+
+
+@patch('app.apply_status_change')
+@patch('app.notion_client.post')
+def test_unseen_page_is_recorded_without_change(mock_post, mock_apply):
+    state = app_module.get_notion_sync_state()
+    state.save_cursor(NOTION_SYNC_CURSOR, CURSOR)
+    mock_post.return_value = query_response([notion_page("page-9", "Done", "2024-01-01T10:05:00.000Z")])
+    
+    run_notion_sync()
+    
+    mock_apply.assert_not_called()
+    assert state.get_status("page-9") == "Done"
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+from unittest.mock import patch
+
+# Import the app to test
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import metrics
+from app import app
+from profiling import DeliveryProfiler, current_trace
+
+
+def profiles(directory):
+    if not os.path.isdir(directory):
+        return []
+    return [json.load(open(os.path.join(directory, name))) for name in sorted(os.listdir(directory))]
+
+
+def slow_handler(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_disabled_profiler_does_nothing(tmp_path):
+    """Test that no trace is started or written while both triggers are off"""
+    profiler = DeliveryProfiler(str(tmp_path / "profiles"))
+
+    with profiler.trace("d1") as trace:
+        assert trace is None
+        assert current_trace() is None
+
+    assert profiles(str(tmp_path / "profiles")) == []
+
+
+def test_sample_rate_profiles_every_nth_delivery(tmp_path):
+    """Test that 1 in N deliveries is written with its spans and stack samples"""
+    directory = str(tmp_path / "profiles")
+    profiler = DeliveryProfiler(directory, sample_rate=2, interval=0.001)
+
+    for number in range(4):
+        with profiler.trace(f"delivery-{number}", "issue_comment"):
+            with metrics.stage('create_notion_ticket'):
+                slow_handler(0.02)
+
+    written = profiles(directory)
+    assert [profile["delivery_id"] for profile in written] == ["delivery-1", "delivery-3"]
+    assert written[0]["reason"] == "sampled"
+    assert written[0]["spans"][0]["name"] == "create_notion_ticket"
+    assert written[0]["samples"] > 0
+    assert any("slow_handler" in stack for stack in written[0]["stacks"])
+
+
+def test_slow_threshold_keeps_only_slow_deliveries(tmp_path):
+    """Test that with a threshold only deliveries slower than it are written"""
+    directory = str(tmp_path / "profiles")
+    profiler = DeliveryProfiler(directory, slow_threshold=0.05, interval=0.001)
+
+    with profiler.trace("fast"):
+        pass
+    with profiler.trace("slow"):
+        slow_handler(0.06)
+
+    written = profiles(directory)
+    assert [profile["delivery_id"] for profile in written] == ["slow"]
+    assert written[0]["reason"] == "slow"
+    assert profiler.stats()["discarded"] == 1
+
+
+def test_nested_trace_joins_outer(tmp_path):
+    """Test that a handler asking for a trace inside a traced request reuses it"""
+    profiler = DeliveryProfiler(str(tmp_path / "profiles"), sample_rate=1)
+
+    with profiler.trace("d1") as outer:
+        with profiler.trace("d1") as inner:
+            assert inner is outer
+
+    assert len(profiles(str(tmp_path / "profiles"))) == 1
+
+
+def test_profiles_are_rotated(tmp_path):
+    """Test that only the newest `keep` profiles are kept"""
+    directory = str(tmp_path / "profiles")
+    profiler = DeliveryProfiler(directory, sample_rate=1, keep=3)
+
+    for number in range(5):
+        with profiler.trace(f"delivery-{number}"):
+            pass
+        time.sleep(0.002)
+
+    assert [profile["delivery_id"] for profile in profiles(directory)] == [
+        "delivery-2", "delivery-3", "delivery-4"
+    ]
+
+
+def test_settings_are_shared_between_processes(tmp_path):
+    """Test that triggers configured in one profiler reach another using the same settings file"""
+    settings_path = str(tmp_path / "gittion.db.profiling")
+    first = DeliveryProfiler(str(tmp_path / "profiles"), settings_path=settings_path, reload_interval=0)
+    second = DeliveryProfiler(str(tmp_path / "profiles"), settings_path=settings_path, reload_interval=0)
+
+    first.configure(sample_rate=1)
+    assert second.enabled is False
+    with second.trace("d1") as trace:
+        assert trace is not None
+    assert second.sample_rate == 1
+
+    # A profiler started later takes the saved triggers over its own
+    assert DeliveryProfiler(str(tmp_path / "profiles"), settings_path=settings_path).sample_rate == 1
+
+def test_admin_profiling_toggles_profiler(tmp_path, monkeypatch):
+    """Test that the admin endpoint turns profiling on and off at runtime"""
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'admin-secret')
+    monkeypatch.setattr(app_module, 'profiler', DeliveryProfiler(str(tmp_path / "profiles")))
+    headers = {'Authorization': 'Bearer admin-secret'}
+    app.config['TESTING'] = True
+
+    with app.test_client() as client:
+        assert client.get('/admin/profiling', headers=headers).get_json()["enabled"] is False
+
+        response = client.post('/admin/profiling', json={"sample_rate": 1}, headers=headers)
+        assert response.get_json()["enabled"] is True
+
+        with patch('app.verify_signature', return_value=True):
+            client.post('/webhook', data=b'{}', headers={
+                'X-GitHub-Event': 'push',
+                'X-GitHub-Delivery': 'delivery-1',
+                'X-Hub-Signature-256': 'sha256=mocked'
+            })
+
+        response = client.post('/admin/profiling', json={"sample_rate": "often"}, headers=headers)
+        assert response.status_code == 400
+
+    written = profiles(str(tmp_path / "profiles"))
+    assert [profile["delivery_id"] for profile in written] == ["delivery-1"]
+    assert written[0]["event"] == "push"
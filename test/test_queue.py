@@ -0,0 +1,176 @@
+import json
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app, process_send_job
+from storage import JobQueue, QueueWorkerPool
+from conftest import send_comment_payload
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue.db"))
+
+
+def test_queue_claims_jobs_in_order(queue):
+    """Test that jobs are claimed oldest first and removed when complete"""
+    first = queue.enqueue('send', {"n": 1})
+    queue.enqueue('send', {"n": 2})
+    
+    job = queue.claim()
+    assert job.id == first
+    assert job.payload == {"n": 1}
+    assert job.attempts == 1
+    
+    queue.complete(job)
+    assert queue.claim().payload == {"n": 2}
+    assert queue.claim() is None
+
+
+def test_queue_retry_backs_off_and_gives_up(queue):
+    """Test that failed jobs are rescheduled and eventually marked failed"""
+    queue.enqueue('send', {"n": 1})
+    
+    job = queue.claim()
+    assert queue.retry(job, "boom", max_attempts=2, base_delay=60) is True
+    assert queue.claim() is None  # Not runnable until the backoff passes
+    
+    with patch('storage.time.time', return_value=time.time() + 600):
+        job = queue.claim()
+    assert job.attempts == 2
+    assert queue.retry(job, "boom", max_attempts=2, base_delay=60) is False
+    assert queue.stats()['failed'] == 1
+
+
+def test_queue_reclaims_expired_lease(tmp_path):
+    """Test that a job whose worker died is picked up again"""
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=30)
+    queue.enqueue('send', {"n": 1})
+    assert queue.claim() is not None
+    assert queue.claim() is None
+    
+    with patch('storage.time.time', return_value=time.time() + 60):
+        job = queue.claim()
+    assert job.attempts == 2
+
+
+def test_worker_keeps_progress_between_attempts(queue):
+    """Test that a retried send job doesn't create a second Notion page"""
+    queue.enqueue('send', {
+        "issue_number": 42, "title": "Test Issue", "body": "Body",
+        "issue_url": "https://github.com/user/repo/issues/42",
+        "repo": "user/repo", "installation_id": 12345678
+    })
+    pool = QueueWorkerPool(queue, {'send': process_send_job}, MagicMock(), retry_delay=0)
+    
+    with patch('app.create_notion_ticket', return_value="page-id") as mock_create, \
+         patch('app.add_github_comment', side_effect=[Exception("GitHub down"), None]) as mock_comment:
+        assert pool.run_once() is True
+        assert pool.run_once() is True
+    
+    mock_create.assert_called_once()
+    assert mock_comment.call_count == 2
+    assert mock_comment.call_args.kwargs['notion_page_id'] == "page-id"
+    assert pool.stats()['processed'] == 1
+    assert pool.stats()['retried'] == 1
+
+
+@patch('app.verify_signature', return_value=True)
+def test_webhook_async_mode_enqueues(mock_verify, queue):
+    """Test that async mode acknowledges with 202 and queues the work"""
+    client = app.test_client()
+    
+    with patch('app.WEBHOOK_ASYNC', True), \
+         patch('app._job_queue', queue), \
+         patch('app.create_notion_ticket') as mock_create:
+        response = client.post(
+            '/webhook',
+            data=json.dumps(send_comment_payload()),
+            content_type='application/json',
+            headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=mocked'}
+        )
+    
+    assert response.status_code == 202
+    assert response.get_json()['status'] == "queued"
+    mock_create.assert_not_called()
+    
+    job = queue.claim()
+    assert job.kind == 'send'
+    assert job.payload['repo'] == "user/repo"
+    assert job.payload['installation_id'] == 12345678
+
+
+def test_failed_jobs_can_be_requeued_and_purged(queue):
+    """Test that dead letters keep their stage and error until requeued or purged"""
+    first = queue.enqueue('send', {"n": 1})
+    second = queue.enqueue('send', {"n": 2})
+    for _ in range(2):
+        job = queue.claim()
+        job.payload['stage'] = 'comment'
+        queue.retry(job, "GitHub down", max_attempts=1, base_delay=0)
+    
+    failed = queue.list_jobs('failed')
+    assert [job.id for job in failed] == [second, first]
+    assert failed[0].stage == 'comment'
+    assert failed[0].last_error == "GitHub down"
+    
+    assert queue.requeue([first]) == 1
+    job = queue.claim()
+    assert job.id == first
+    assert job.attempts == 1
+    assert job.payload['stage'] == 'comment'
+    
+    assert queue.purge(older_than=3600) == 0
+    assert queue.purge() == 1
+    assert queue.get(second) is None
+
+
+@patch('app.verify_signature', return_value=True)
+def test_sync_failure_is_persisted_for_retry(mock_verify, queue):
+    """Test that a send failing during its delivery is queued with the stage it failed in"""
+    client = app.test_client()
+    
+    with patch('app._job_queue', queue), \
+         patch('app.sync_issue_to_notion', return_value=("page-id", "created")), \
+         patch('app.add_github_comment', side_effect=Exception("GitHub down")):
+        response = client.post(
+            '/webhook',
+            data=json.dumps(send_comment_payload()),
+            content_type='application/json',
+            headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=mocked'}
+        )
+    
+    assert response.status_code == 202
+    assert response.get_json()['status'] == "retrying"
+    assert response.get_json()['stage'] == "comment"
+    job = queue.get(response.get_json()['job_id'])
+    assert job.attempts == 1
+    assert job.stage == 'comment'
+    assert job.last_error == "GitHub down"
+    assert job.payload['notion_page_id'] == "page-id"
+
+
+def test_dead_letters_cli(queue):
+    """Test listing, replaying and purging dead letters from the command line"""
+    job_id = queue.enqueue('send', {"repo": "user/repo", "issue_number": 42, "stage": "notion"})
+    job = queue.claim()
+    queue.retry(job, "Notion down", max_attempts=1, base_delay=0)
+    runner = app.test_cli_runner()
+    
+    with patch('app._job_queue', queue):
+        listed = runner.invoke(args=['dead-letters', 'list'])
+        shown = runner.invoke(args=['dead-letters', 'show', str(job_id)])
+        replayed = runner.invoke(args=['dead-letters', 'replay', str(job_id)])
+        purged = runner.invoke(args=['dead-letters', 'purge', '--all'])
+    
+    assert "user/repo#42" in listed.output
+    assert "stage=notion" in listed.output
+    assert json.loads(shown.output)['last_error'] == "Notion down"
+    assert "Requeued 1 jobs" in replayed.output
+    assert "Deleted 0 jobs" in purged.output
+    assert queue.claim().id == job_id
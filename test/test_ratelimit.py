@@ -0,0 +1,152 @@
+import time
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clients import ApiClient
+import pytest
+from deadline import Deadline, DeadlineExceeded
+from ratelimit import TokenBucket, RateBudgetTracker, RateLimitExceeded, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+    
+    def monotonic(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+
+def test_bucket_paces_bursts():
+    """Test that calls beyond the burst are spaced out at the configured rate"""
+    clock = FakeClock()
+    with patch('ratelimit.time', clock):
+        bucket = TokenBucket(rate=2, capacity=2)
+        waits = [round(bucket.acquire(), 3) for _ in range(4)]
+    
+    assert waits == [0.0, 0.0, 0.5, 0.5]
+    assert bucket.stats()['delayed'] == 2
+
+
+def test_bucket_pause_holds_tokens_until_retry_after():
+    """Test that a pause delays the next caller by the Retry-After period"""
+    clock = FakeClock()
+    with patch('ratelimit.time', clock):
+        bucket = TokenBucket(rate=3, capacity=3)
+        bucket.pause(2)
+        wait = bucket.acquire()
+    
+    assert wait == 2
+    assert bucket.stats()['throttled'] == 1
+
+
+def test_parse_retry_after():
+    """Test Retry-After parsing for seconds, missing and invalid values"""
+    assert parse_retry_after({'Retry-After': '4'}) == 4
+    assert parse_retry_after({}) == 1.0
+    assert parse_retry_after({'Retry-After': 'soon'}, default=2) == 2
+
+
+def test_client_retries_429_after_pausing():
+    """Test that a 429 is retried instead of being returned to the caller"""
+    limiter = TokenBucket(rate=100, capacity=100)
+    client = ApiClient("https://api.example.com", limiter=limiter, max_retries=3)
+    throttled = MagicMock(status_code=429, headers={'Retry-After': '0'})
+    ok = MagicMock(status_code=200, headers={})
+    
+    with patch.object(client.session, 'request', side_effect=[throttled, ok]) as mock_request:
+        response = client.post("/pages", json={})
+    
+    assert response is ok
+    assert mock_request.call_count == 2
+    assert limiter.stats()['acquired'] == 2
+    assert limiter.stats()['throttled'] == 1
+
+
+def test_client_gives_up_after_max_retries():
+    """Test that the last 429 is returned once retries are exhausted"""
+    client = ApiClient("https://api.example.com", limiter=TokenBucket(rate=100), max_retries=1)
+    throttled = MagicMock(status_code=429, headers={'Retry-After': '0'})
+    
+    with patch.object(client.session, 'request', return_value=throttled) as mock_request:
+        assert client.get("/pages").status_code == 429
+    
+    assert mock_request.call_count == 2
+
+
+def github_response(status_code=200, text='', **headers):
+    return MagicMock(status_code=status_code, headers=headers, text=text)
+
+
+def test_budget_tracks_headers_per_installation():
+    """Test that rate-limit headers are recorded per installation"""
+    tracker = RateBudgetTracker()
+    reset = str(int(time.time()) + 600)
+    
+    assert tracker.after_response(1, github_response(**{
+        'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4999', 'X-RateLimit-Reset': reset
+    })) is False
+    tracker.after_response(2, github_response(**{'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': reset}))
+    
+    snapshot = tracker.snapshot()
+    assert snapshot['1']['remaining'] == 4999
+    assert snapshot['1']['limit'] == 5000
+    assert snapshot['2']['remaining'] == 10
+
+
+def test_budget_delays_only_non_urgent_calls_when_low():
+    """Test that a low budget slows down non-urgent calls but not urgent ones"""
+    tracker = RateBudgetTracker(low_watermark=100, max_delay=30)
+    tracker.after_response(1, github_response(**{
+        'X-RateLimit-Remaining': '9', 'X-RateLimit-Reset': str(int(time.time()) + 100)
+    }))
+    
+    with patch('ratelimit.time.sleep') as mock_sleep:
+        tracker.before_request(1, urgent=True)
+        mock_sleep.assert_not_called()
+        tracker.before_request(1, urgent=False)
+    
+    assert 5 < mock_sleep.call_args[0][0] <= 10
+    assert tracker.snapshot()['1']['delayed'] == 1
+
+
+def test_budget_backs_off_on_secondary_limit():
+    """Test that a secondary rate limit blocks the installation and is retried"""
+    tracker = RateBudgetTracker(max_delay=30)
+    
+    assert tracker.after_response(1, github_response(403, **{'Retry-After': '5'})) is True
+    with patch('ratelimit.time.sleep') as mock_sleep:
+        tracker.before_request(1, urgent=True)
+    assert 4 < mock_sleep.call_args[0][0] <= 5
+    
+    # Without a Retry-After the backoff exceeds max_delay, so calls fail fast
+    assert tracker.after_response(2, github_response(429)) is True
+    with pytest.raises(RateLimitExceeded):
+        tracker.before_request(2)
+
+
+def test_budget_wait_longer_than_deadline_fails_fast():
+    """Test that a blocked installation raises instead of sleeping past the caller's deadline"""
+    tracker = RateBudgetTracker(max_delay=30)
+    tracker.after_response(1, github_response(403, **{'Retry-After': '5'}))
+
+    with patch('ratelimit.time.sleep') as mock_sleep:
+        with pytest.raises(DeadlineExceeded):
+            tracker.before_request(1, deadline=Deadline(2))
+    mock_sleep.assert_not_called()
+    assert tracker.snapshot()['1']['delayed'] == 0
+
+
+def test_budget_ignores_permission_errors():
+    """Test that a plain 403 is not treated as a rate limit"""
+    tracker = RateBudgetTracker()
+    
+    assert tracker.after_response(1, github_response(403, text="Resource not accessible")) is False
+    assert tracker.snapshot()['1']['secondary_hits'] == 0
@@ -0,0 +1,147 @@
+import json
+import time
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from app import app
+from clients import ApiClient
+from resilience import CircuitBreaker, Bulkhead, Dependency, UpstreamUnavailable
+from conftest import send_comment_payload
+
+
+def test_breaker_opens_at_failure_rate():
+    """Test that the breaker opens once enough calls in the window failed"""
+    breaker = CircuitBreaker(failure_rate=0.5, minimum_calls=4, open_for=30)
+    for success in (True, False, True):
+        breaker.allow()
+        breaker.record(success)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.allow()
+    breaker.record(False)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamUnavailable):
+        breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_half_open_probe():
+    """Test that after open_for one probe is let through, closing or reopening the breaker"""
+    breaker = CircuitBreaker(minimum_calls=1, open_for=0.01)
+    breaker.allow()
+    breaker.record(False)
+    time.sleep(0.02)
+
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(UpstreamUnavailable):
+        breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.02)
+    breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_bulkhead_rejects_when_full():
+    """Test that a call waits at most max_wait for a slot"""
+    bulkhead = Bulkhead(max_concurrent=1, max_wait=0.01)
+    bulkhead.acquire()
+
+    with pytest.raises(UpstreamUnavailable):
+        bulkhead.acquire()
+
+    bulkhead.release()
+    bulkhead.acquire()
+    assert bulkhead.stats() == {"max_concurrent": 1, "in_use": 1, "rejected": 1}
+
+
+def test_dependency_counts_server_errors_as_failures():
+    """Test that 5xx responses and exceptions feed the breaker while 429s don't"""
+    dependency = Dependency('test', CircuitBreaker(failure_rate=0.5, minimum_calls=4), Bulkhead())
+
+    dependency.call(lambda: MagicMock(status_code=429))
+    dependency.call(lambda: MagicMock(status_code=200))
+    dependency.call(lambda: MagicMock(status_code=503))
+    with pytest.raises(TimeoutError):
+        dependency.call(MagicMock(side_effect=TimeoutError()))
+
+    assert dependency.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamUnavailable, match="test"):
+        dependency.call(lambda: MagicMock(status_code=200))
+
+
+def test_slow_upstream_cannot_take_every_slot():
+    """Test that calls beyond the bulkhead fail fast instead of queueing behind a slow upstream"""
+    dependency = Dependency('slow', CircuitBreaker(), Bulkhead(max_concurrent=2, max_wait=0.01))
+    client = ApiClient("https://api.example.com", guard=lambda method, url: dependency)
+    release = threading.Event()
+
+    def slow_request(*args, **kwargs):
+        release.wait(5)
+        return MagicMock(status_code=200)
+
+    with patch.object(client.session, 'request', side_effect=slow_request):
+        threads = [threading.Thread(target=client.get, args=("/a",)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while dependency.bulkhead.stats()["in_use"] < 2:
+            time.sleep(0.001)
+
+        with pytest.raises(UpstreamUnavailable):
+            client.get("/a")
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+
+def test_token_endpoint_has_its_own_breaker():
+    """Test that GitHub token and REST calls go through separate breakers"""
+    assert app_module.github_dependency('POST', 'https://api.github.com/app/installations/1/access_tokens') \
+        is app_module.upstreams['github_token']
+    assert app_module.github_dependency('GET', 'https://api.github.com/repos/o/r/issues') \
+        is app_module.upstreams['github']
+
+
+def test_admin_upstreams(monkeypatch):
+    """Test that breaker and bulkhead state is reported per upstream"""
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'admin-secret')
+    app.config['TESTING'] = True
+
+    with app.test_client() as client:
+        response = client.get('/admin/upstreams', headers={'Authorization': 'Bearer admin-secret'})
+
+    body = response.get_json()
+    assert set(body) == {'github_token', 'github', 'notion'}
+    assert body['notion']['breaker']['state'] == 'closed'
+    assert body['notion']['bulkhead']['max_concurrent'] == app_module.NOTION_MAX_CONCURRENT
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.sync_issue_to_notion', side_effect=UpstreamUnavailable("notion: Circuit breaker is open"))
+def test_open_breaker_defers_delivery(mock_sync, mock_verify, client):
+    """Test that a delivery turned away by an open breaker is deferred, not failed"""
+    response = client.post('/webhook', data=json.dumps(send_comment_payload()), headers={
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': 'issue_comment',
+        'X-GitHub-Delivery': 'breaker-1',
+        'X-Hub-Signature-256': 'sha256=mocked'
+    })
+
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "deferred"
+    assert response.get_json()["stage"] == "notion"
+    job = app_module.get_job_queue().get(response.get_json()["job_id"])
+    assert job.attempts == 0
+    # Not due until the breaker probes again
+    assert app_module.get_job_queue().claim() is None
@@ -0,0 +1,85 @@
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+from storage import IdempotencyStore, IssuePageIndex, NotionSyncState
+
+
+def test_issue_index_upsert_and_get(tmp_path):
+    """Test that index entries are stored and replaced per issue"""
+    index = IssuePageIndex(str(tmp_path / "index.db"))
+    
+    assert index.get("user/repo", 1) is None
+    index.upsert("user/repo", 1, "page-1", "hash-1")
+    index.upsert("user/repo", 1, "page-1", "hash-2")
+    
+    assert index.get("user/repo", 1)['content_hash'] == "hash-2"
+    assert index.count() == 1
+
+
+def test_issue_index_restore_keeps_matching_hashes(tmp_path):
+    """Test that a rebuild keeps hashes only for entries pointing at the same page"""
+    index = IssuePageIndex(str(tmp_path / "index.db"))
+    index.upsert("user/repo", 1, "page-1", "hash-1")
+    index.upsert("user/repo", 2, "page-2", "hash-2")
+    
+    index.restore([("user/repo", 1, "page-1"), ("user/repo", 2, "page-other"), ("user/repo", 3, "page-3")])
+    
+    assert index.get("user/repo", 1)['content_hash'] == "hash-1"
+    assert index.get("user/repo", 2) == {**index.get("user/repo", 2), "page_id": "page-other", "content_hash": None}
+    assert index.get("user/repo", 3)['page_id'] == "page-3"
+
+
+def test_sync_state_cursor_and_status(tmp_path):
+    state = NotionSyncState(str(tmp_path / "sync.db"))
+    
+    assert state.get_cursor("notion-status") is None
+    state.save_cursor("notion-status", "2024-01-01T00:00:00.000Z")
+    assert state.get_cursor("notion-status") == "2024-01-01T00:00:00.000Z"
+    
+    assert state.get_status("page-1") is None
+    state.record_status("page-1", "Done")
+    assert state.get_status("page-1") == "Done"
+
+
+def test_sync_state_lease_has_one_owner(tmp_path):
+    """Test that only one process holds the sync lease until it runs out"""
+    state = NotionSyncState(str(tmp_path / "sync.db"))
+    state.save_cursor("notion-status", "cursor")
+    
+    assert state.lease("notion-status", "worker-1", 60)
+    assert state.lease("notion-status", "worker-1", 60)
+    assert not state.lease("notion-status", "worker-2", 60)
+    assert state.get_cursor("notion-status") == "cursor"
+    
+    state.lease("notion-status", "worker-1", -1)
+    assert state.lease("notion-status", "worker-2", 60)
+
+
+def test_idempotency_store_matches_any_key(tmp_path):
+    """Test that seeing either key again is reported as a duplicate"""
+    store = IdempotencyStore(str(tmp_path / "dedupe.db"), [60, 60])
+    
+    assert store.claim(("delivery-1", ("user/repo", 1))) is None
+    assert store.claim(("delivery-2", ("user/repo", 1))) == IdempotencyStore.PENDING
+    
+    store.finish(("delivery-1", ("user/repo", 1)), {"status": "success"})
+    assert store.claim(("delivery-1", ("user/repo", 2))) == {"status": "success"}
+    assert store.stats()['duplicates'] == 2
+    
+    store.release(("delivery-1", ("user/repo", 1)))
+    assert store.claim(("delivery-1", ("user/repo", 1))) is None
+
+
+def test_idempotency_store_is_shared_and_expires(tmp_path):
+    """Test that a claim made through one connection is seen by another until it expires"""
+    path = str(tmp_path / "dedupe.db")
+    first = IdempotencyStore(path, [60, 0.1])
+    second = IdempotencyStore(path, [60, 0.1])
+    
+    assert first.claim(("delivery-1", ("user/repo", 1))) is None
+    assert second.claim(("delivery-1", None)) == IdempotencyStore.PENDING
+    
+    time.sleep(0.15)
+    assert second.claim((None, ("user/repo", 1))) is None
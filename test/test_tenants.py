@@ -0,0 +1,142 @@
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Import the app to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from app import app
+from cache import LRUCache
+from notion_schema import NotionSchema
+from storage import TenantStore
+from tenants import Tenant, TenantDirectory
+from conftest import send_comment_payload
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TenantStore(str(tmp_path / "tenants.db"))
+
+
+def test_store_moves_generation_on_every_write(store):
+    """Test that saving and removing tenants are both visible through the generation file"""
+    assert store.generation() == 0
+    store.save(1, "token-1", "db-1", {"title": "Name"})
+    first = store.generation()
+    store.save(1, "token-1", "db-2")
+    second = store.generation()
+    store.remove(1)
+    
+    assert 0 < first < second < store.generation()
+    assert store.get(1) is None
+
+
+def test_directory_serves_lookups_from_cache(store):
+    """Test that repeated lookups, including of unknown installations, don't query the store"""
+    store.save(1, "token-1", "db-1", {"title": "Name"})
+    directory = TenantDirectory(store, Tenant(None, "env-token", "env-db"))
+    
+    with patch.object(store, 'get', wraps=store.get) as mock_get:
+        for _ in range(3):
+            tenant = directory.get(1)
+            assert directory.get(2) is directory.default
+    
+    assert mock_get.call_count == 2
+    assert tenant.notion_database_id == "db-1"
+    assert tenant.property('title') == "Name"
+    assert tenant.property('status') == "Status"
+
+
+def test_directory_picks_up_changes_from_other_processes(tmp_path):
+    """Test that a tenant saved through another connection is used without a restart"""
+    path = str(tmp_path / "tenants.db")
+    directory = TenantDirectory(TenantStore(path), Tenant(None, "env-token", "env-db"))
+    assert directory.get(1) is directory.default
+    
+    TenantStore(path).save(1, "token-1", "db-1")
+    
+    assert directory.get(1).notion_token == "token-1"
+    assert directory.stats()["invalidations"] == 1
+
+
+@patch('app.list_notion_block_ids', return_value=[])
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+@patch('app.notion_client.post')
+def test_send_writes_to_the_installations_workspace(mock_post, mock_comment, mock_verify, mock_list, client,
+                                                    monkeypatch):
+    """Test that a delivery uses its installation's token, database and property names"""
+    app_module.get_tenants().store.save(777, "tenant-token", "tenant-db", {"title": "Name"})
+    properties = {
+        "Name": {"type": "title", "title": {}},
+        "Status": {"type": "status", "status": {"options": [{"name": "Icebox"}]}},
+        "GitHub Issue": {"type": "url", "url": {}},
+        "Repository": {"type": "rich_text", "rich_text": {}}
+    }
+    schemas = LRUCache()
+    schemas.set("tenant-db", NotionSchema(lambda: properties))
+    monkeypatch.setattr(app_module, 'tenant_schemas', schemas)
+    mock_post.return_value = MagicMock(status_code=200, json=MagicMock(return_value={"id": "page-1"}))
+    
+    response = client.post('/webhook', data=json.dumps(send_comment_payload(installation_id=777)), headers={
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': 'issue_comment',
+        'X-Hub-Signature-256': 'sha256=mocked'
+    })
+    
+    assert response.status_code == 200
+    kwargs = mock_post.call_args.kwargs
+    assert kwargs['headers']['Authorization'] == "Bearer tenant-token"
+    assert kwargs['json']['parent'] == {"database_id": "tenant-db"}
+    assert "[#42]" in kwargs['json']['properties']['Name']['title'][0]['text']['content']
+    assert app_module.current_tenant() is app_module.default_tenant
+
+
+def test_queued_job_runs_as_its_tenant():
+    """Test that queue workers switch to the tenant of the job's installation"""
+    app_module.get_tenants().store.save(777, "tenant-token", "tenant-db")
+    seen = []
+    handler = app_module.tenant_job(lambda job: seen.append(app_module.current_tenant()))
+    
+    handler({"installation_id": 777})
+    handler({"installation_id": 1})
+    
+    assert seen[0].notion_database_id == "tenant-db"
+    assert seen[1] is app_module.default_tenant
+
+
+def test_status_sync_follows_each_database_once(monkeypatch):
+    """Test that every tenant database gets its own cursor and shared databases are synced once"""
+    store = app_module.get_tenants().store
+    store.save(1, "token-1", "db-1")
+    store.save(2, "token-2", "db-1")
+    store.save(3, "token-3", "db-3")
+    
+    monkeypatch.setattr(app_module.default_tenant, 'notion_database_id', None)
+    targets = app_module.notion_sync_targets()
+    assert [(name, tenant.installation_id) for name, tenant in targets] == [
+        ("notion-status:db-1", 1), ("notion-status:db-3", 3)
+    ]
+    
+    monkeypatch.setattr(app_module.default_tenant, 'notion_database_id', "env-db")
+    assert app_module.notion_sync_targets()[0] == ("notion-status", app_module.default_tenant)
+
+
+def test_tenants_cli():
+    """Test adding, listing and removing tenants from the command line"""
+    runner = app.test_cli_runner()
+    
+    saved = runner.invoke(args=['tenants', 'set', '777', '--database-id', 'tenant-db',
+                                '--notion-token', 'tenant-token', '--property', 'title=Name'])
+    listed = runner.invoke(args=['tenants', 'list'])
+    invalid = runner.invoke(args=['tenants', 'set', '778', '--database-id', 'db',
+                                  '--notion-token', 'token', '--property', 'owner=Owner'])
+    removed = runner.invoke(args=['tenants', 'remove', '777'])
+    
+    assert "Saved tenant 777" in saved.output
+    assert listed.output == '777\ttenant-db\t{"title": "Name"}\n'
+    assert invalid.exit_code != 0
+    assert "Removed tenant 777" in removed.output
+    assert app_module.tenant_for(777) is app_module.default_tenant
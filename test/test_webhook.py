@@ -8,14 +8,9 @@ from unittest.mock import patch, MagicMock
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import app, verify_signature
-
-
-@pytest.fixture
-def client():
-    app.config['TESTING'] = True
-    with app.test_client() as client:
-        yield client
+import app as app_module
+from app import app, verify_signature, prefilter_delivery
+from conftest import send_comment_payload
 
 
 def test_verify_signature_valid():
@@ -90,7 +85,7 @@ def test_webhook_issue_comment_no_command(mock_verify, client):
         '/webhook',
         data=json.dumps(payload),
         content_type='application/json',
-        headers={'X-GitHub-Event': 'issue_comment'}
+        headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=mocked'}
     )
     
     assert response.status_code == 200
@@ -118,7 +113,7 @@ def test_webhook_issue_comment_with_command(mock_handle, mock_verify, client):
         '/webhook',
         data=json.dumps(payload),
         content_type='application/json',
-        headers={'X-GitHub-Event': 'issue_comment'}
+        headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=mocked'}
     )
     
     # Verify that handle_issue_comment was called
@@ -136,8 +131,201 @@ def test_webhook_ignores_non_issue_comment_events(mock_verify, client):
         '/webhook',
         data=json.dumps({"test": "payload"}),
         content_type='application/json',
-        headers={'X-GitHub-Event': 'push'}
+        headers={'X-GitHub-Event': 'push', 'X-Hub-Signature-256': 'sha256=mocked'}
+    )
+    
+    assert response.status_code == 200
+    assert b'ignored' in response.data
+
+def post_comment(client, payload, delivery_id):
+    return client.post(
+        '/webhook',
+        data=json.dumps(payload),
+        content_type='application/json',
+        headers={'X-GitHub-Event': 'issue_comment', 'X-GitHub-Delivery': delivery_id,
+                 'X-Hub-Signature-256': 'sha256=mocked'}
     )
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_webhook_redelivery_is_deduplicated(mock_create, mock_comment, mock_verify, client):
+    """Test that a redelivered webhook is answered without creating another page"""
+    first = post_comment(client, send_comment_payload(), "delivery-1")
+    second = post_comment(client, send_comment_payload(), "delivery-1")
+    
+    assert first.get_json()['status'] == "success"
+    assert second.status_code == 200
+    assert second.get_json()['status'] == "duplicate"
+    assert second.get_json()['original']['notion_page_id'] == "test-page-id"
+    mock_create.assert_called_once()
+    mock_comment.assert_called_once()
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_webhook_repeated_command_is_deduplicated(mock_create, mock_comment, mock_verify, client):
+    """Test that a second `!send` on the same issue doesn't create another page"""
+    post_comment(client, send_comment_payload(42), "delivery-1")
+    repeated = post_comment(client, send_comment_payload(42), "delivery-2")
+    other_issue = post_comment(client, send_comment_payload(43), "delivery-3")
+    
+    assert repeated.get_json()['status'] == "duplicate"
+    assert other_issue.get_json()['status'] == "success"
+    assert mock_create.call_count == 2
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+@patch('app.update_notion_ticket')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_webhook_resend_after_edit_updates_ticket(mock_create, mock_update, mock_comment, mock_verify, client):
+    """Test that a `!send` after the issue was edited isn't answered as a duplicate"""
+    post_comment(client, send_comment_payload(42), "delivery-1")
+    edited = send_comment_payload(42)
+    edited['issue']['body'] = "Edited body"
+    response = post_comment(client, edited, "delivery-2")
+    
+    assert response.get_json()['action'] == "updated"
+    mock_update.assert_called_once()
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.add_github_comment')
+@patch('app.create_notion_ticket', side_effect=[Exception("Notion down"), "test-page-id"])
+def test_webhook_failed_delivery_is_retried_once(mock_create, mock_comment, mock_verify, client):
+    """Test that a redelivery of a failed delivery doesn't queue its work a second time"""
+    first = post_comment(client, send_comment_payload(), "delivery-1")
+    redelivery = post_comment(client, send_comment_payload(), "delivery-1")
+    
+    assert first.status_code == 202
+    assert first.get_json()['status'] == "retrying"
+    assert redelivery.get_json()['status'] == "duplicate"
+    assert redelivery.get_json()['original']['job_id'] == first.get_json()['job_id']
+    assert mock_create.call_count == 1
+    assert app_module.get_job_queue().stats()['queued'] == 1
+
+
+@pytest.mark.parametrize("event, body, status, reason", [
+    ('push', b'not json at all', "ignored", 'event'),
+    ('issue_comment', b'{"action":"edited","comment":{"body":"@git-tion !send"}}', "not a new comment", 'action'),
+    ('issue_comment', b'{"action":"created","comment":{"body":"Looks good"}}', "no command found", 'no_mention'),
+])
+@patch('app.verify_signature', return_value=True)
+@patch('app.handle_issue_comment')
+def test_webhook_filters_deliveries_before_parsing(mock_handle, mock_verify, event, body, status, reason, client):
+    """Test that irrelevant deliveries are answered from the headers and raw body"""
+    before = app_module.filtered_events[reason]
+    
+    response = client.post('/webhook', data=body, content_type='application/json',
+                           headers={'X-GitHub-Event': event, 'X-Hub-Signature-256': 'sha256=mocked'})
     
     assert response.status_code == 200
-    assert b'ignored' in response.data
\ No newline at end of file
+    assert response.get_json() == {"status": status}
+    assert app_module.filtered_events[reason] == before + 1
+    mock_handle.assert_not_called()
+
+
+def test_prefilter_leaves_ambiguous_deliveries_to_the_handler():
+    """Test that a delivery the scan can't rule out is parsed and handled"""
+    # "action" isn't the first key, so the scan can't tell whether it is a new comment
+    body = b'{"comment": {"body": "@git-tion !send"}, "action": "created"}'
+    
+    assert prefilter_delivery('issue_comment', body, True) is None
+
+
+@patch('app.verify_signature')
+def test_webhook_rejects_missing_signature_before_reading(mock_verify, client):
+    """Test that an unsigned delivery is refused without hashing its body"""
+    response = client.post('/webhook', data=b'{}', content_type='application/json',
+                           headers={'X-GitHub-Event': 'issue_comment'})
+    
+    assert response.status_code == 401
+    mock_verify.assert_not_called()
+
+
+@patch('app.WEBHOOK_MAX_BODY', 64)
+def test_webhook_rejects_oversized_body(client):
+    """Test that a body over WEBHOOK_MAX_BODY gets a 413"""
+    response = client.post('/webhook', data=b'x' * 65, content_type='application/json',
+                           headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=mocked'})
+    
+    assert response.status_code == 413
+
+
+@patch('app.add_github_comment')
+@patch('app.create_notion_ticket', return_value="test-page-id")
+def test_webhook_streams_and_verifies_real_signature(mock_create, mock_comment, client):
+    """Test a delivery signed with the real secret end to end"""
+    body = json.dumps(send_comment_payload()).encode()
+    signature = 'sha256=' + hmac.new(b'streamed-secret', body, hashlib.sha256).hexdigest()
+    
+    with patch('app.GITHUB_SECRET', 'streamed-secret'), patch('app.WEBHOOK_CHUNK_SIZE', 16):
+        response = client.post('/webhook', data=body, content_type='application/json',
+                               headers={'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': signature})
+    
+    assert response.status_code == 200
+    assert response.get_json()['notion_page_id'] == "test-page-id"
+
+
+def issues_payload(action, issue_number=42, body="Body"):
+    payload = send_comment_payload(issue_number)
+    del payload['comment']
+    payload['action'] = action
+    payload['issue']['body'] = body
+    return payload
+
+
+def post_issues_event(client, payload, delivery_id="delivery-1"):
+    return client.post(
+        '/webhook',
+        data=json.dumps(payload),
+        content_type='application/json',
+        headers={'X-GitHub-Event': 'issues', 'X-GitHub-Delivery': delivery_id,
+                 'X-Hub-Signature-256': 'sha256=mocked'}
+    )
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.update_notion_ticket')
+def test_issues_edited_updates_linked_ticket(mock_update, mock_verify, client):
+    """Test that editing a linked issue updates its Notion ticket"""
+    app_module.get_issue_index().upsert("user/repo", 42, "page-1", "old-hash")
+    
+    response = post_issues_event(client, issues_payload('edited', body="Edited body"))
+    
+    assert response.get_json() == {"status": "success", "notion_page_id": "page-1", "action": "updated"}
+    assert mock_update.call_args[0][2] == "Edited body"
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.update_notion_ticket')
+def test_issues_event_for_unlinked_issue(mock_update, mock_verify, client):
+    response = post_issues_event(client, issues_payload('edited'))
+    
+    assert response.get_json() == {"status": "not linked"}
+    mock_update.assert_not_called()
+
+
+@patch('app.verify_signature', return_value=True)
+@patch('app.set_notion_status')
+def test_issues_closed_sets_done_status(mock_set_status, mock_verify, client):
+    """Test that closing a linked issue moves its ticket to the done status once"""
+    app_module.get_issue_index().upsert("user/repo", 42, "page-1", "hash")
+    
+    first = post_issues_event(client, issues_payload('closed'), "delivery-1")
+    again = post_issues_event(client, issues_payload('closed'), "delivery-2")
+    
+    assert first.get_json()['notion_status'] == "Done"
+    assert again.get_json()['action'] == "unchanged"
+    mock_set_status.assert_called_once_with("page-1", "Done")
+
+
+@patch('app.verify_signature', return_value=True)
+def test_issues_opened_is_filtered(mock_verify, client):
+    response = client.post('/webhook', data=b'{"action":"opened","issue":{}}', content_type='application/json',
+                           headers={'X-GitHub-Event': 'issues', 'X-Hub-Signature-256': 'sha256=mocked'})
+    
+    assert response.get_json() == {"status": "ignored"}
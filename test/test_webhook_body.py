@@ -0,0 +1,63 @@
+import io
+import hmac
+import hashlib
+import pytest
+
+# Import the modules to test
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from webhook_body import SignedBody, BodyTooLarge, HEAD_SIZE
+from app import verify_signature
+
+
+def github_signature(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_signature_matches_the_whole_body():
+    """Test that the HMAC computed chunk by chunk equals the one over the full body"""
+    body = b'{"items": [' + b','.join([b'"issue body"'] * 1000) + b']}'
+    with SignedBody('secret', max_length=len(body), spool_size=1024) as signed:
+        signed.read_from(io.BytesIO(body), chunk_size=7)
+        assert signed.signature() == github_signature('secret', body)
+        assert len(signed.json()['items']) == 1000
+
+
+def test_needle_split_across_chunks_is_found():
+    """Test that the mention is found even when a chunk boundary cuts through it"""
+    body = b'x' * 10 + b'@git-tion !send' + b'y' * 10
+    for chunk_size in range(1, 20):
+        with SignedBody('secret', max_length=100, needle=b'@git-tion') as signed:
+            signed.read_from(io.BytesIO(body), chunk_size=chunk_size)
+            assert signed.found, chunk_size
+
+
+def test_needle_absent():
+    with SignedBody('secret', max_length=100, needle=b'@git-tion') as signed:
+        signed.read_from(io.BytesIO(b'@git-tio n'), chunk_size=3)
+        assert not signed.found
+
+
+def test_head_is_bounded():
+    """Test that only the first bytes of the body are kept in memory for scanning"""
+    with SignedBody('secret', max_length=10 * HEAD_SIZE, spool_size=1024) as signed:
+        signed.read_from(io.BytesIO(b'a' * 5 * HEAD_SIZE), chunk_size=1000)
+        assert signed.head == b'a' * HEAD_SIZE
+        assert signed.length == 5 * HEAD_SIZE
+
+
+def test_oversized_body_is_rejected_while_reading():
+    with SignedBody('secret', max_length=10) as signed:
+        with pytest.raises(BodyTooLarge):
+            signed.read_from(io.BytesIO(b'a' * 11), chunk_size=4)
+
+
+def test_verify_signature_accepts_signed_body(monkeypatch):
+    monkeypatch.setattr('app.GITHUB_SECRET', 'secret')
+    body = b'{"test": "payload"}'
+    with SignedBody('secret', max_length=100) as signed:
+        signed.update(body)
+        assert verify_signature(signed, github_signature('secret', body)) is True
+        assert verify_signature(signed, github_signature('other', body)) is False
+        assert verify_signature(signed, None) is False
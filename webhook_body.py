@@ -0,0 +1,81 @@
+import hmac
+import json
+import hashlib
+from tempfile import SpooledTemporaryFile
+
+# Leading bytes kept in memory for the checks made before the body is parsed
+HEAD_SIZE = 4096
+
+
+class BodyTooLarge(Exception):
+    """Raised when a webhook body passes the configured size limit"""
+
+
+class SignedBody:
+    """A webhook body read in chunks, with its HMAC computed as it arrives.
+
+    The body is written to a temporary file that moves to disk once it
+    passes `spool_size`, so concurrent large deliveries don't each hold
+    their whole body in memory. The first bytes and whether `needle`
+    occurs anywhere are recorded on the way through, for filtering
+    deliveries without parsing them.
+    """
+
+    def __init__(self, secret, max_length, needle=b'', spool_size=1024 * 1024):
+        self.max_length = max_length
+        self.length = 0
+        self.head = b''
+        self.needle = needle
+        self.found = not needle
+        self._tail = b''
+        self._hmac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        self._file = SpooledTemporaryFile(max_size=spool_size)
+
+    def update(self, chunk):
+        """Add the next chunk of the body; raises BodyTooLarge past `max_length`"""
+        self.length += len(chunk)
+        if self.length > self.max_length:
+            raise BodyTooLarge(f"Webhook body is larger than {self.max_length} bytes")
+        self._hmac.update(chunk)
+        self._file.write(chunk)
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[:HEAD_SIZE - len(self.head)]
+        if not self.found:
+            # Keep the end of the previous chunk so a needle split across chunks is found
+            window = self._tail + chunk
+            self.found = self.needle in window
+            self._tail = window[max(0, len(window) - len(self.needle) + 1):]
+
+    def read_from(self, stream, chunk_size=64 * 1024):
+        """Read a file-like stream to its end"""
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return self
+            self.update(chunk)
+
+    def signature(self):
+        """The X-Hub-Signature-256 value GitHub sends for this body"""
+        return 'sha256=' + self._hmac.hexdigest()
+
+    def chunks(self, chunk_size=64 * 1024):
+        """The body again, from the start, in chunks"""
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def json(self):
+        self._file.seek(0)
+        return json.load(self._file)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()